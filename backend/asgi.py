@@ -0,0 +1,196 @@
+'''
+This module serves the API as an ASGI application, for running many connections per process with
+an ASGI server, e.g. `gunicorn -c gunicorn.conf.py asgi:app` with the settings in gunicorn.conf.py.
+
+Requests are answered from the in-memory city index by the same CitiesApi as the Flask app in base,
+so the endpoints, responses and validation errors are the same. The index never checks the data
+version while answering a request. Instead a background task checks it on a worker thread once per
+refresh interval, so no request waits on the database and the event loop is never blocked by it.
+
+The index is loaded when the server sends the lifespan startup event, or on the first request if
+the server does not support lifespan events.
+
+Classes:
+    CitiesAsgiApp
+        ASGI application answering the /cities endpoints.
+
+Notes:
+    Responses allow requests from any origin, like the Flask app does with Flask-CORS.
+'''
+
+import asyncio
+import json
+import logging
+import math
+from functools import partial
+from urllib.parse import parse_qsl
+
+from cities_api import create_cities_api
+from city_index import DEFAULT_REFRESH_INTERVAL
+
+ALLOWED_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class CitiesAsgiApp:
+    '''
+    ASGI application answering the /cities endpoints and the /health endpoint.
+
+        Parameters:
+            create_api (Callable[[], CitiesApi]): Creates the API, called once on a worker thread.
+            The index of the API should not refresh itself, see create_cities_api.
+            refresh_interval (float): The number of seconds between checks of the data version
+    '''
+
+    def __init__(self, create_api=partial(create_cities_api, refresh_interval=math.inf),
+                 refresh_interval: float = DEFAULT_REFRESH_INTERVAL):
+        self._create_api = create_api
+        self._refresh_interval = refresh_interval
+        self._api = None
+        self._startup_lock = None
+        self._refresh_task = None
+
+    async def __call__(self, scope: dict, receive, send) -> None:
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, send)
+        else:
+            raise ValueError(f"Unsupported scope type: {scope['type']}")
+
+    async def startup(self) -> None:
+        '''
+        Loads the index and starts checking the data version in the background. Does nothing if
+        the application has already started.
+
+            Returns:
+                None
+        '''
+
+        # Created here rather than in __init__ so it belongs to the running event loop
+        if self._startup_lock is None:
+            self._startup_lock = asyncio.Lock()
+
+        async with self._startup_lock:
+            if self._api is not None:
+                return
+
+            # Loading reads every city from the database, keep the event loop free meanwhile
+            self._api = await asyncio.to_thread(self._create_api)
+            self._refresh_task = asyncio.create_task(self._refresh_periodically())
+
+    async def shutdown(self) -> None:
+        '''
+        Stops checking the data version.
+
+            Returns:
+                None
+        '''
+
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
+
+    async def _refresh_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self._refresh_interval)
+            try:
+                if await asyncio.to_thread(self._api.city_index.refresh):
+                    logging.info('Reloaded the city index, data version %s',
+                                 self._api.city_index.version)
+            except Exception:
+                # Keep serving the loaded data and try again at the next interval
+                logging.exception('Checking the data version failed')
+
+    async def _lifespan(self, receive, send) -> None:
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    await self.startup()
+                except Exception as error:
+                    logging.exception('Loading the city index failed')
+                    await send({'type': 'lifespan.startup.failed', 'message': repr(error)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _http(self, scope: dict, send) -> None:
+        method = scope['method']
+        headers = _decode_headers(scope['headers'])
+
+        if method == 'OPTIONS':
+            # CORS preflight, the API only has simple GET requests
+            response_headers = {
+                'Access-Control-Allow-Methods': ', '.join(ALLOWED_METHODS),
+                'Access-Control-Max-Age': '86400',
+            }
+            if 'access-control-request-headers' in headers:
+                response_headers['Access-Control-Allow-Headers'] = (
+                    headers['access-control-request-headers'])
+            await _send_response(send, 204, response_headers, b'')
+            return
+
+        if method not in ALLOWED_METHODS:
+            await _send_response(send, 405, {'Allow': ', '.join(ALLOWED_METHODS)}, b'')
+            return
+
+        await self.startup()
+
+        if scope['path'] == '/health':
+            status, response_headers, body = 200, {'Content-Type': 'application/json'}, (
+                json.dumps(self._api.health()).encode('utf-8'))
+        else:
+            # The first value of each parameter is used, like request.args.get in Flask
+            args = {}
+            for name, value in parse_qsl(scope['query_string'].decode('latin-1'),
+                                         keep_blank_values=True):
+                args.setdefault(name, value)
+
+            # The index answers from memory without waiting on the database, so the query runs on
+            # the event loop rather than paying for a thread hand-off on every request
+            status, response_headers, body = self._api.handle(scope['path'], args, headers)
+
+        await _send_response(send, status, response_headers, b'' if method == 'HEAD' else body,
+                             content_length=len(body))
+
+
+def _decode_headers(raw_headers: list) -> dict:
+    '''
+    Returns the headers of an ASGI request by lowercase name, joining repeated headers.
+    '''
+
+    headers = {}
+    for name, value in raw_headers:
+        name, value = name.decode('latin-1').lower(), value.decode('latin-1')
+        headers[name] = f"{headers[name]}, {value}" if name in headers else value
+
+    return headers
+
+
+async def _send_response(send, status: int, headers: dict, body: bytes,
+                         content_length: int = None) -> None:
+    '''
+    Sends a response with the CORS header every response of the API has.
+    '''
+
+    headers = {**headers, 'Access-Control-Allow-Origin': '*'}
+    if status not in (204, 304):
+        headers['Content-Length'] = str(len(body) if content_length is None else content_length)
+
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                    for name, value in headers.items()],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+app = CitiesAsgiApp()
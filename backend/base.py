@@ -1,21 +1,46 @@
-from flask import Flask, request
+from flask import Flask, Response, request
 from flask_cors import CORS
-from get_cities import get_cities
-from get_database import get_database
+from cities_api import CitiesApi, create_cities_api
 
-api = Flask(__name__)
-CORS(api)
 
+def create_app(cities_api: CitiesApi = None) -> Flask:
+    '''
+    Creates the Flask app serving the API. Called by flask run.
 
-@api.route('/cities')
-def my_profile():
-    min_temp = request.args.get('minTemp')
-    max_temp = request.args.get('maxTemp')
-    month = request.args.get('month')
-    rainy_days = request.args.get('rainyDays')
+        Parameters:
+            cities_api (Optional[CitiesApi]): The API to serve, by default one for the project
+            database, which loads all cities into memory once at startup. The index reloads itself
+            when the data is updated, and popular searches are served from memory until the data
+            version changes.
 
-    dbname = get_database()
+        Returns:
+            api (Flask): The app
+    '''
 
-    response = get_cities(min_temp, max_temp, month, rainy_days, dbname)
+    if cities_api is None:
+        cities_api = create_cities_api()
 
-    return response
+    api = Flask(__name__)
+    CORS(api)
+
+    def cities_response() -> Response:
+        status, headers, body = cities_api.handle(request.path, request.args, request.headers)
+        return Response(body, status=status, headers=headers)
+
+    @api.route('/cities')
+    def my_profile():
+        return cities_response()
+
+    @api.route('/cities/months')
+    def cities_for_months():
+        return cities_response()
+
+    @api.route('/cities/ranked')
+    def ranked_cities():
+        return cities_response()
+
+    @api.route('/health')
+    def health():
+        return cities_api.health()
+
+    return api
@@ -0,0 +1,9 @@
+"""
+A benchmark harness measuring the latency, throughput and memory of the /cities queries.
+
+The harness fills a database with synthetic cities, replays a mix of searches against get_cities,
+the in-memory city index, the Flask app or a running server, and compares the results with a
+stored baseline. It runs offline against mongomock or against a local MongoDB server.
+
+Run it as a module from the backend directory, e.g. python -m benchmark.run --cities 1000 10000.
+"""
@@ -0,0 +1,240 @@
+"""
+This module measures the latency, throughput and memory of a benchmark target and compares the
+results with a baseline.
+
+Functions:
+    measure(send: Callable, queries: List[Query], concurrency: int, warmup: int) -> dict
+        Replays searches against a target and measures their latency and throughput.
+
+    summarize(latencies: list, elapsed: float, errors: int) -> dict
+        Summarizes the latencies of a run.
+
+    measure_memory(build: Callable) -> tuple
+        Calls a function and measures the memory it allocates.
+
+    peak_rss() -> Optional[int]
+        Returns the peak resident memory of this process.
+
+    baseline_mismatches(benchmark: dict, baseline: dict) -> List[str]
+        Lists the differences in configuration and machine between a benchmark and a baseline.
+
+    compare_with_baseline(results: dict, baseline: dict, tolerance: float) -> List[str]
+        Lists the metrics that are worse than the baseline.
+"""
+
+import threading
+import time
+import tracemalloc
+from typing import Callable, List, Optional
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, where the peak resident memory is not reported
+    resource = None
+
+# The latency percentiles reported for every run
+PERCENTILES = [50, 95, 99]
+
+# For each metric compared with the baseline, whether higher values are better
+COMPARED_METRICS = {
+    'p50_ms': False,
+    'p95_ms': False,
+    'p99_ms': False,
+    'requests_per_second': True,
+    'memory_bytes': False,
+}
+
+# The machine details that have to match for results to be compared with a baseline
+COMPARED_MACHINE_DETAILS = ['python', 'platform', 'cpus']
+
+
+def summarize(latencies: list, elapsed: float, errors: int = 0) -> dict:
+    """
+    Summarizes the latencies of a run.
+
+    Parameters:
+        latencies (list[float]): The seconds each successful request took.
+        elapsed (float): The seconds the whole run took.
+        errors (int): The number of failed requests.
+
+    Returns:
+        dict: The number of requests and errors, the requests per second and the p50, p95, p99,
+            mean and maximum latency in milliseconds.
+    """
+
+    milliseconds = np.asarray(latencies, dtype=float) * 1000
+    summary = {
+        'requests': len(latencies) + errors,
+        'errors': errors,
+        'requests_per_second': len(latencies) / elapsed if elapsed > 0 else 0.0,
+    }
+
+    if len(milliseconds):
+        for percentile, value in zip(PERCENTILES, np.percentile(milliseconds, PERCENTILES)):
+            summary[f'p{percentile}_ms'] = float(value)
+        summary['mean_ms'] = float(milliseconds.mean())
+        summary['max_ms'] = float(milliseconds.max())
+
+    return summary
+
+
+def measure(send: Callable, queries: list, concurrency: int = 1, warmup: int = 0) -> dict:
+    """
+    Replays searches against a target and measures their latency and throughput. The searches are
+    split between concurrent clients, each sending its next search once the previous one has been
+    answered.
+
+    Parameters:
+        send (Callable[[Query], None]): Sends one search to the target, raising on failure.
+        queries (List[Query]): The searches to replay.
+        concurrency (int): The number of concurrent clients.
+        warmup (int): The number of searches sent first without being measured, e.g. to fill
+            caches the way a server that has been running for a while has them filled.
+
+    Returns:
+        dict: The summary of the run, see summarize.
+    """
+
+    for query in queries[:warmup]:
+        send(query)
+
+    measured = queries[warmup:]
+    latencies, errors = [], []
+    lock = threading.Lock()
+    start_together = threading.Barrier(concurrency + 1)
+
+    def client(client_queries):
+        client_latencies, client_errors = [], 0
+        start_together.wait()
+        for query in client_queries:
+            start = time.perf_counter()
+            try:
+                send(query)
+            except Exception:
+                client_errors += 1
+                continue
+            client_latencies.append(time.perf_counter() - start)
+
+        with lock:
+            latencies.extend(client_latencies)
+            errors.append(client_errors)
+
+    threads = [threading.Thread(target=client, args=(measured[index::concurrency],))
+               for index in range(concurrency)]
+    for thread in threads:
+        thread.start()
+
+    start_together.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    return summarize(latencies, elapsed, sum(errors))
+
+
+def measure_memory(build: Callable) -> tuple:
+    """
+    Calls a function and measures the memory it allocates, e.g. to load a city index.
+
+    Parameters:
+        build (Callable[[], Any]): The function.
+
+    Returns:
+        tuple[Any, int]: What the function returned and the peak number of bytes allocated while
+            it ran, including NumPy arrays.
+    """
+
+    tracemalloc.start()
+    try:
+        result = build()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return result, peak
+
+
+def peak_rss() -> Optional[int]:
+    """
+    Returns the peak resident memory of this process.
+
+    Returns:
+        Optional[int]: The number of bytes, or None where it cannot be measured.
+    """
+
+    if resource is None:
+        return None
+
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def baseline_mismatches(benchmark: dict, baseline: dict) -> List[str]:
+    """
+    Lists the differences in configuration and machine between a benchmark and a baseline. Results
+    are only comparable if there are none, since e.g. the number of CPUs changes the throughput.
+
+    Parameters:
+        benchmark (dict): The benchmark, as returned by run_benchmark.
+        baseline (dict): The baseline, in the same format.
+
+    Returns:
+        List[str]: A description of every difference.
+    """
+
+    mismatches = []
+
+    config, baseline_config = benchmark.get('config', {}), baseline.get('config', {})
+    for key in sorted(set(config) | set(baseline_config)):
+        if config.get(key) != baseline_config.get(key):
+            mismatches.append(f"config {key}: {config.get(key)} vs {baseline_config.get(key)} in "
+                              f"the baseline")
+
+    machine, baseline_machine = benchmark.get('machine', {}), baseline.get('machine', {})
+    for key in COMPARED_MACHINE_DETAILS:
+        if machine.get(key) != baseline_machine.get(key):
+            mismatches.append(f"machine {key}: {machine.get(key)} vs {baseline_machine.get(key)} "
+                              f"in the baseline")
+
+    return mismatches
+
+
+def compare_with_baseline(results: dict, baseline: dict, tolerance: float = 0.25) -> List[str]:
+    """
+    Lists the metrics that are worse than the baseline by more than the tolerance, and the runs
+    with more errors than the baseline. Runs and metrics missing from either side are not compared.
+
+    Parameters:
+        results (dict[str, dict]): The summary of each run, keyed by run name.
+        baseline (dict[str, dict]): The summaries of the baseline, in the same format.
+        tolerance (float): How much worse a metric may be, as a share of the baseline value.
+
+    Returns:
+        List[str]: A description of every regression.
+    """
+
+    regressions = []
+    for name, summary in results.items():
+        expected_summary = baseline.get(name, {})
+
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            value = summary.get(metric)
+            expected = expected_summary.get(metric)
+            if value is None or not expected:
+                continue
+
+            change = value / expected - 1
+            if (-change if higher_is_better else change) > tolerance:
+                regressions.append(f"{name} {metric}: {value:.6g} vs {expected:.6g} in the "
+                                   f"baseline ({change:+.0%})")
+
+        # Any new failure is a regression, most baselines have none to compare a share with
+        errors, expected_errors = summary.get('errors'), expected_summary.get('errors')
+        if errors is not None and expected_errors is not None and errors > expected_errors:
+            regressions.append(f"{name} errors: {errors} vs {expected_errors} in the baseline")
+
+    return regressions
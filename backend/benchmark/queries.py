@@ -0,0 +1,124 @@
+"""
+This module generates mixes of searches to replay against the API.
+
+Searches are drawn from a pool of distinct searches with Zipf distributed popularity, so a few
+searches are repeated often, like the default search of the site, and most are rare. Months are
+weighted towards the winter and summer holidays, temperature windows towards warm weather, and the
+mix spreads over the /cities, /cities/months and /cities/ranked endpoints.
+
+Classes:
+    Query
+        A request to one of the /cities endpoints.
+
+Functions:
+    generate_queries(count: int, distinct: int, seed: int, endpoints: Optional[dict]) -> List[Query]
+        Generates a mix of searches.
+"""
+
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+
+from get_cities import VALID_MONTHS
+
+# The share of searches sent to each endpoint
+ENDPOINT_WEIGHTS = {
+    '/cities': 0.7,
+    '/cities/months': 0.2,
+    '/cities/ranked': 0.1,
+}
+
+# How popular each month is, January to December
+MONTH_WEIGHTS = [8, 7, 9, 7, 6, 10, 12, 11, 7, 6, 6, 11]
+
+# The minimum temperatures searched for, and how often each is searched for
+MIN_TEMPERATURES = [-5, 0, 5, 10, 15, 18, 20, 22, 25, 28]
+MIN_TEMPERATURE_WEIGHTS = [1, 2, 3, 6, 10, 12, 14, 12, 8, 4]
+
+# The widths of the temperature windows searched for
+TEMPERATURE_WIDTHS = [3, 5, 8, 10, 15]
+TEMPERATURE_WIDTH_WEIGHTS = [2, 5, 5, 3, 1]
+
+# The maximum numbers of rainy days searched for
+RAINY_DAYS = [3, 5, 8, 10, 15, 31]
+RAINY_DAYS_WEIGHTS = [2, 4, 5, 5, 3, 2]
+
+# Most searches keep the default safety, some accept countries with higher travel advisories
+MAX_SAFETY = [None, '3', '4']
+MAX_SAFETY_WEIGHTS = [8, 1, 1]
+
+# The exponent of the Zipf distribution of the popularity of the distinct searches
+POPULARITY_EXPONENT = 1.0
+
+
+class Query(NamedTuple):
+    """
+    A request to one of the /cities endpoints.
+
+    Attributes:
+        path (str): The path of the endpoint, e.g. '/cities'.
+        args (dict[str, str]): The query parameters, as sent to the API.
+    """
+
+    path: str
+    args: dict
+
+
+def _weighted(rng: np.random.Generator, values: list, weights: list):
+    probabilities = np.asarray(weights, dtype=float) / sum(weights)
+    return values[rng.choice(len(values), p=probabilities)]
+
+
+def _random_query(rng: np.random.Generator, path: str) -> Query:
+    min_temp = _weighted(rng, MIN_TEMPERATURES, MIN_TEMPERATURE_WEIGHTS)
+    args = {
+        'minTemp': str(min_temp),
+        'maxTemp': str(min_temp + _weighted(rng, TEMPERATURE_WIDTHS, TEMPERATURE_WIDTH_WEIGHTS)),
+        'rainyDays': str(_weighted(rng, RAINY_DAYS, RAINY_DAYS_WEIGHTS)),
+    }
+
+    max_safety = _weighted(rng, MAX_SAFETY, MAX_SAFETY_WEIGHTS)
+    if max_safety is not None:
+        args['maxSafety'] = max_safety
+
+    first_month = _weighted(rng, list(range(12)), MONTH_WEIGHTS)
+    if path == '/cities/months':
+        # A trip of two or three consecutive months, e.g. December and January
+        span = int(rng.integers(2, 4))
+        args['months'] = ','.join(VALID_MONTHS[(first_month + offset) % 12]
+                                  for offset in range(span))
+        args['mode'] = _weighted(rng, ['all', 'any'], [3, 1])
+    else:
+        args['month'] = VALID_MONTHS[first_month]
+
+    return Query(path, args)
+
+
+def generate_queries(count: int, distinct: int = 200, seed: int = 0,
+                     endpoints: Optional[dict] = None) -> List[Query]:
+    """
+    Generates a mix of searches. The same arguments always generate the same mix.
+
+    Parameters:
+        count (int): The number of searches.
+        distinct (int): The number of distinct searches the mix is drawn from.
+        seed (int): The seed of the random number generator.
+        endpoints (Optional[dict[str, float]]): The share of searches sent to each endpoint,
+            ENDPOINT_WEIGHTS by default.
+
+    Returns:
+        List[Query]: The searches, in the order to send them.
+    """
+
+    if endpoints is None:
+        endpoints = ENDPOINT_WEIGHTS
+
+    rng = np.random.default_rng(seed)
+    paths = list(endpoints)
+    pool = [_random_query(rng, _weighted(rng, paths, list(endpoints.values())))
+            for _ in range(distinct)]
+
+    popularity = 1 / np.arange(1, distinct + 1) ** POPULARITY_EXPONENT
+    picks = rng.choice(distinct, size=count, p=popularity / popularity.sum())
+
+    return [pool[pick] for pick in picks]
@@ -0,0 +1,219 @@
+"""
+Benchmarks the /cities searches on synthetic databases of one or more sizes and compares the
+results with a stored baseline.
+
+For every size, the database is filled with synthetic cities, see synthetic, and the same mix of
+searches, see queries, is replayed against every target, see targets. Each run reports the p50,
+p95 and p99 latency, the requests per second and the memory allocated to load the target.
+
+Example usage:
+    # Call from command line to benchmark get_cities, the city index and the Flask app offline:
+    # yarn benchmark-backend
+    # Without yarn, run the module from the backend directory:
+    # python -m benchmark.run --cities 1000 10000 100000 --targets index flask
+    # Store the results as the new baseline:
+    # python -m benchmark.run --save-baseline
+    # Compare with the stored baseline after changing the code:
+    # python -m benchmark.run
+    # Benchmark a local MongoDB server and a server started with yarn serve-backend, which has to
+    # use the same database (MONGODB_DB=vacation_finder_benchmark):
+    # python -m benchmark.run --mongo-uri mongodb://localhost:27017 --url http://localhost:8000
+
+Notes:
+    The exit status is 1 if any metric is worse than the baseline by more than the tolerance, or a
+    run has more errors than in the baseline. Baselines are specific to a machine and are not part
+    of the repository: store one with --save-baseline before changing the code. A baseline recorded
+    with a different configuration, Python version, platform or number of CPUs is not compared.
+    get_cities runs every search against the database, which mongomock answers in Python, so it is
+    slow above ten thousand cities.
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import time
+
+import mongomock
+from pymongo import MongoClient
+
+from benchmark.harness import (baseline_mismatches, compare_with_baseline, measure,
+                               measure_memory, peak_rss)
+from benchmark.queries import ENDPOINT_WEIGHTS, generate_queries
+from benchmark.synthetic import populate_database
+from benchmark.targets import TARGETS, make_target
+
+DEFAULT_BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+# The database filled with synthetic cities on a MongoDB server, it is dropped and refilled
+BENCHMARK_DATABASE = 'vacation_finder_benchmark'
+
+DEFAULT_CITY_COUNTS = [1000, 10000]
+DEFAULT_TARGETS = ['get_cities', 'index', 'flask']
+
+
+def run_benchmark(city_counts: list, target_names: list, query_count: int, distinct: int,
+                  warmup: int, concurrency: int, seed: int, mongo_uri: str = None,
+                  url: str = None) -> dict:
+    """
+    Benchmarks the targets on a synthetic database of each size.
+
+    Parameters:
+        city_counts (list[int]): The numbers of cities to benchmark with.
+        target_names (list[str]): The targets, see targets.
+        query_count (int): The number of searches measured per run.
+        distinct (int): The number of distinct searches in the mix.
+        warmup (int): The number of searches sent before measuring.
+        concurrency (int): The number of concurrent clients.
+        seed (int): The seed of the synthetic cities and the search mix.
+        mongo_uri (str): The URI of a MongoDB server to use instead of mongomock.
+        url (str): The base URL of a running server, for the http target.
+
+    Returns:
+        dict: The configuration of the benchmark and the summary of each run, keyed by
+            "<target>/<number of cities>".
+    """
+
+    if mongo_uri:
+        dbname = MongoClient(mongo_uri)[BENCHMARK_DATABASE]
+    else:
+        dbname = mongomock.MongoClient()[BENCHMARK_DATABASE]
+
+    results = {}
+    for city_count in city_counts:
+        start = time.perf_counter()
+        populate_database(dbname, city_count, seed)
+        logging.info('Generated %d cities in %.1f s', city_count, time.perf_counter() - start)
+
+        for target_name in target_names:
+            target, memory_bytes = measure_memory(
+                lambda name=target_name: make_target(name, dbname, url))
+
+            # Every target gets the same mix, limited to the endpoints it answers
+            endpoints = {path: weight for path, weight in ENDPOINT_WEIGHTS.items()
+                         if path in target.paths}
+            queries = generate_queries(warmup + query_count, distinct, seed, endpoints)
+
+            summary = measure(target.send, queries, concurrency, warmup)
+            # A server allocates its memory in its own process
+            summary['memory_bytes'] = None if target_name == 'http' else memory_bytes
+
+            name = f'{target_name}/{city_count}'
+            results[name] = summary
+            logging.info('Finished %s', name)
+
+    return {
+        'config': {
+            'city_counts': city_counts,
+            'queries': query_count,
+            'distinct': distinct,
+            'warmup': warmup,
+            'concurrency': concurrency,
+            'seed': seed,
+            'database': 'mongodb' if mongo_uri else 'mongomock',
+        },
+        'machine': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'peak_rss_bytes': peak_rss(),
+        },
+        'results': results,
+    }
+
+
+def format_report(results: dict) -> str:
+    """
+    Formats the summaries of the runs as a table.
+
+    Parameters:
+        results (dict[str, dict]): The summary of each run, keyed by run name.
+
+    Returns:
+        str: The table.
+    """
+
+    columns = ['p50_ms', 'p95_ms', 'p99_ms', 'requests_per_second', 'memory_bytes', 'errors']
+    lines = [f"{'run':<20}" + ''.join(f'{column:>21}' for column in columns)]
+
+    for name, summary in results.items():
+        cells = []
+        for column in columns:
+            value = summary.get(column)
+            if value is None:
+                cells.append(f"{'-':>21}")
+            elif column == 'memory_bytes':
+                cells.append(f'{value / 2 ** 20:>18.1f} MB')
+            else:
+                cells.append(f'{value:>21.2f}' if isinstance(value, float) else f'{value:>21}')
+        lines.append(f'{name:<20}' + ''.join(cells))
+
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description='Benchmark the /cities searches')
+    parser.add_argument('--cities', type=int, nargs='+', default=DEFAULT_CITY_COUNTS,
+                        help='Numbers of synthetic cities to benchmark with, e.g. 1000 1000000')
+    parser.add_argument('--targets', nargs='+', choices=TARGETS, default=DEFAULT_TARGETS,
+                        help='What to send the searches to')
+    parser.add_argument('--queries', type=int, default=300,
+                        help='Number of searches measured per run')
+    parser.add_argument('--distinct', type=int, default=200,
+                        help='Number of distinct searches in the mix')
+    parser.add_argument('--warmup', type=int, default=30,
+                        help='Number of searches sent before measuring')
+    parser.add_argument('--concurrency', type=int, default=1,
+                        help='Number of concurrent clients')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Seed of the synthetic cities and the search mix')
+    parser.add_argument('--mongo-uri',
+                        help=f'Use the {BENCHMARK_DATABASE} database of a MongoDB server instead '
+                             f'of mongomock. The database is dropped and refilled.')
+    parser.add_argument('--url', help='Base URL of a running server, for the http target')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE_PATH,
+                        help='Path of the baseline to compare with')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='Store the results as the baseline instead of comparing with it')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='How much worse than the baseline a metric may be, e.g. 0.25 for 25%%')
+    parser.add_argument('--output', help='Path to write the results to as JSON')
+    args = parser.parse_args(sys.argv[1:])
+
+    benchmark = run_benchmark(args.cities, args.targets, args.queries, args.distinct, args.warmup,
+                              args.concurrency, args.seed, args.mongo_uri, args.url)
+    print(format_report(benchmark['results']))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(benchmark, file, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as file:
+            json.dump(benchmark, file, indent=2)
+        logging.info('Stored the baseline in %s', args.baseline)
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as file:
+            baseline = json.load(file)
+
+        # Results from another configuration or machine differ without any regression
+        mismatches = baseline_mismatches(benchmark, baseline)
+        if mismatches:
+            logging.warning('Not comparing with %s, it was recorded with a different %s. Store a '
+                            'new baseline with --save-baseline.', args.baseline,
+                            '; '.join(mismatches))
+            sys.exit(0)
+
+        regressions = compare_with_baseline(benchmark['results'], baseline['results'],
+                                            args.tolerance)
+        for regression in regressions:
+            logging.warning('Regression: %s', regression)
+        if regressions:
+            sys.exit(1)
+        logging.info('No regressions compared with %s', args.baseline)
+    else:
+        logging.info('No baseline at %s, store one with --save-baseline', args.baseline)
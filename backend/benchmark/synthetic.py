@@ -0,0 +1,127 @@
+"""
+This module generates synthetic cities shaped like the documents of the cities collection.
+
+Each city gets a latitude, and its monthly temperatures follow a seasonal curve around a yearly
+mean that falls with the distance from the equator, so temperature windows match a realistic share
+of cities in every month. Rainy days vary by city and month, a small share of cities has no rain
+data, and each country has one safety value, mostly safe.
+
+Functions:
+    generate_cities(count: int, seed: int) -> Iterator[dict]
+        Generates synthetic city documents.
+
+    populate_database(dbname: Database, count: int, seed: int, batch_size: int) -> int
+        Replaces the cities of a database with synthetic ones.
+"""
+
+import math
+from typing import Iterator
+
+import numpy as np
+from pymongo.database import Database
+
+from data_version import bump_data_version
+from get_cities import MONTH_KEYS, SAFETY_LEVELS
+from indexes import ensure_indexes
+from month_tables import COUNTRY_SAFETY_COLLECTION, MONTH_TABLES_COLLECTION
+
+# Roughly the number of countries with cities in the real collection
+COUNTRY_COUNT = 200
+
+# The share of countries with each safety value, most countries have a low travel advisory
+SAFETY_WEIGHTS = [0.55, 0.3, 0.1, 0.05]
+
+# The share of cities without rain data, like cities without a nearby weather station
+MISSING_RAIN_SHARE = 0.05
+
+DEFAULT_BATCH_SIZE = 10000
+
+
+def _country_name(index: int) -> str:
+    return f"Country {index:03d}"
+
+
+def _country_safety(rng: np.random.Generator) -> dict:
+    safety = rng.choice(SAFETY_LEVELS, size=COUNTRY_COUNT, p=SAFETY_WEIGHTS)
+    return {_country_name(index): int(value) for index, value in enumerate(safety)}
+
+
+def generate_cities(count: int, seed: int = 0) -> Iterator[dict]:
+    """
+    Generates synthetic city documents. The same count and seed always generate the same cities.
+
+    Parameters:
+        count (int): The number of cities.
+        seed (int): The seed of the random number generator.
+
+    Returns:
+        Iterator[dict]: The documents, with the city, country, months and safety fields of the
+            cities collection.
+    """
+
+    rng = np.random.default_rng(seed)
+    country_safety = _country_safety(rng)
+
+    for index in range(count):
+        latitude = rng.uniform(-60, 70)
+        # Warmest around the equator, and the seasons are reversed in the southern hemisphere
+        mean = 28 - 0.45 * abs(latitude) + rng.normal(0, 3)
+        amplitude = 0.3 * abs(latitude) + rng.uniform(0, 3)
+        phase = 0 if latitude >= 0 else math.pi
+        wetness = rng.uniform(0, 15)
+        has_rain = rng.random() >= MISSING_RAIN_SHARE
+
+        months = {}
+        for month_index, key in enumerate(MONTH_KEYS):
+            season = -math.cos(2 * math.pi * (month_index - 0.5) / 12 + phase)
+            rain = min(max(wetness + rng.normal(0, 3), 0), 31) if has_rain else None
+            months[key] = {
+                'temperature': round(mean + amplitude * season + rng.normal(0, 1), 1),
+                'rain': None if rain is None else round(rain, 2),
+            }
+
+        country = _country_name(int(rng.integers(COUNTRY_COUNT)))
+        yield {
+            'city': f"City {index}",
+            'country': country,
+            'months': months,
+            'safety': country_safety[country],
+        }
+
+
+def populate_database(dbname: Database, count: int, seed: int = 0,
+                      batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    """
+    Replaces the cities and country safety values of a database with synthetic ones, indexed like
+    the project database, and bumps the data version so that city indexes reload them.
+
+    Parameters:
+        dbname (Database): The database to fill. Its cities are dropped, never pass the project
+            database.
+        count (int): The number of cities.
+        seed (int): The seed of the random number generator.
+        batch_size (int): The maximum number of cities inserted at once.
+
+    Returns:
+        int: The new data version.
+    """
+
+    dbname.drop_collection("cities")
+    dbname.drop_collection(COUNTRY_SAFETY_COLLECTION)
+    dbname.drop_collection(MONTH_TABLES_COLLECTION)
+
+    batch = []
+    for city in generate_cities(count, seed):
+        batch.append(city)
+        if len(batch) == batch_size:
+            dbname["cities"].insert_many(batch)
+            batch = []
+    if batch:
+        dbname["cities"].insert_many(batch)
+    ensure_indexes(dbname["cities"])
+
+    country_safety = _country_safety(np.random.default_rng(seed))
+    dbname[COUNTRY_SAFETY_COLLECTION].insert_many(
+        [{'_id': country, 'safety': safety} for country, safety in country_safety.items()])
+
+    return bump_data_version(dbname)
@@ -0,0 +1,150 @@
+"""
+This module defines what the benchmark sends searches to.
+
+Targets:
+    get_cities
+        Calls get_cities and get_cities_for_months, which query the database for every search.
+
+    index
+        Calls the in-memory city index the API answers from, without the response cache.
+
+    flask
+        Sends requests to the Flask app through its test client, including the response cache,
+        content negotiation and compression.
+
+    http
+        Sends HTTP requests to a running server, e.g. one started with yarn serve-backend. The
+        server reads its own database, so it should be pointed at the benchmark database.
+
+Classes:
+    Target
+        Something the benchmark sends searches to.
+
+Functions:
+    make_target(name: str, dbname: Optional[Database], url: Optional[str]) -> Target
+        Creates a target.
+"""
+
+import urllib.request
+from typing import Callable, NamedTuple, Optional, Tuple
+from urllib.parse import urlencode
+
+from pymongo.database import Database
+
+from base import create_app
+from benchmark.queries import Query
+from cities_api import CitiesApi
+from city_index import CityIndex
+from get_cities import get_cities, get_cities_for_months, parse_months
+
+TARGETS = ['get_cities', 'index', 'flask', 'http']
+
+# Like a browser, clients of the flask and http targets accept compressed responses
+REQUEST_HEADERS = {'Accept-Encoding': 'gzip'}
+
+HTTP_TIMEOUT = 30
+
+
+class Target(NamedTuple):
+    """
+    Something the benchmark sends searches to.
+
+    Attributes:
+        name (str): The name of the target, one of TARGETS.
+        paths (Tuple[str, ...]): The endpoints the target can answer.
+        send (Callable[[Query], None]): Sends one search, raising if it is not answered.
+    """
+
+    name: str
+    paths: Tuple[str, ...]
+    send: Callable[[Query], None]
+
+
+def _get_cities_target(dbname: Database) -> Target:
+    def send(query: Query) -> None:
+        args = query.args
+        if query.path == '/cities':
+            get_cities(args['minTemp'], args['maxTemp'], args['month'], args['rainyDays'], dbname,
+                       args.get('maxSafety'))
+        else:
+            get_cities_for_months(args['minTemp'], args['maxTemp'], parse_months(args['months']),
+                                  args['rainyDays'], dbname, args.get('mode'),
+                                  args.get('maxSafety'))
+
+    return Target('get_cities', ('/cities', '/cities/months'), send)
+
+
+def _index_target(dbname: Database) -> Target:
+    city_index = CityIndex(dbname)
+
+    def send(query: Query) -> None:
+        args = query.args
+        if query.path == '/cities':
+            city_index.get_cities(args['minTemp'], args['maxTemp'], args['month'],
+                                  args['rainyDays'], args.get('maxSafety'))
+        elif query.path == '/cities/months':
+            city_index.get_cities_for_months(args['minTemp'], args['maxTemp'],
+                                             parse_months(args['months']), args['rainyDays'],
+                                             args.get('mode'), args.get('maxSafety'))
+        else:
+            city_index.get_ranked_cities(args['minTemp'], args['maxTemp'], args['month'],
+                                         args['rainyDays'], args.get('maxSafety'))
+
+    return Target('index', ('/cities', '/cities/months', '/cities/ranked'), send)
+
+
+def _flask_target(dbname: Database) -> Target:
+    api = CitiesApi(CityIndex(dbname))
+    client = create_app(api).test_client()
+
+    def send(query: Query) -> None:
+        response = client.get(query.path, query_string=query.args, headers=REQUEST_HEADERS)
+        if response.status_code != 200:
+            raise RuntimeError(f"{query.path} answered {response.status_code}")
+
+    return Target('flask', tuple(api.paths), send)
+
+
+def _http_target(url: str) -> Target:
+    def send(query: Query) -> None:
+        request = urllib.request.Request(f"{url.rstrip('/')}{query.path}?{urlencode(query.args)}",
+                                         headers=REQUEST_HEADERS)
+        # urlopen raises for error statuses
+        with urllib.request.urlopen(request, timeout=HTTP_TIMEOUT) as response:
+            response.read()
+
+    return Target('http', ('/cities', '/cities/months', '/cities/ranked'), send)
+
+
+def make_target(name: str, dbname: Optional[Database] = None, url: Optional[str] = None) -> Target:
+    """
+    Creates a target. Targets answering from memory load the cities of the database here.
+
+    Parameters:
+        name (str): The name of the target, one of TARGETS.
+        dbname (Optional[Database]): The database holding the cities, for every target but http.
+        url (Optional[str]): The base URL of the server, for the http target.
+
+    Returns:
+        Target: The target.
+
+    Raises:
+        ValueError: If the name is not a known target or what it needs is missing.
+    """
+
+    if name == 'http':
+        if not url:
+            raise ValueError("The http target needs the URL of a running server.")
+        return _http_target(url)
+
+    if dbname is None:
+        raise ValueError(f"The {name} target needs a database.")
+
+    if name == 'get_cities':
+        return _get_cities_target(dbname)
+    if name == 'index':
+        return _index_target(dbname)
+    if name == 'flask':
+        return _flask_target(dbname)
+
+    raise ValueError(f"Unknown target: {name}. Please choose one of {', '.join(TARGETS)}.")
@@ -0,0 +1,113 @@
+"""
+Test cases for measuring benchmark runs and comparing them with a baseline
+"""
+
+import pytest
+
+from benchmark.harness import (baseline_mismatches, compare_with_baseline, measure,
+                               measure_memory, summarize)
+from benchmark.queries import Query
+
+
+def test_summarize():
+    """
+    Tests that the percentiles are reported in milliseconds and failed requests are counted.
+    """
+
+    summary = summarize([i / 1000 for i in range(1, 101)], elapsed=2.0, errors=1)
+
+    assert summary['requests'] == 101
+    assert summary['errors'] == 1
+    assert summary['requests_per_second'] == 50
+    assert summary['p50_ms'] == pytest.approx(50.5)
+    assert summary['p99_ms'] == pytest.approx(99.01)
+    assert summary['max_ms'] == pytest.approx(100)
+
+
+@pytest.mark.parametrize('concurrency', [1, 3])
+def test_measure(concurrency):
+    """
+    Tests that every search is sent once, the warmup searches before the measured ones, and that
+    failures are counted as errors.
+    """
+
+    sent = []
+
+    def send(query):
+        sent.append(query)
+        if query.args.get('fail'):
+            raise RuntimeError('failed')
+
+    queries = ([Query('/cities', {'warmup': '1'})] * 2 + [Query('/cities', {})] * 8
+               + [Query('/cities', {'fail': '1'})])
+
+    summary = measure(send, queries, concurrency=concurrency, warmup=2)
+
+    assert len(sent) == len(queries)
+    assert sent[:2] == queries[:2]
+    assert summary['requests'] == 9
+    assert summary['errors'] == 1
+
+
+def test_measure_memory():
+    """
+    Tests that the memory allocated by the measured function is reported.
+    """
+
+    result, peak = measure_memory(lambda: bytearray(1_000_000))
+
+    assert len(result) == 1_000_000
+    assert peak >= 1_000_000
+
+
+def test_compare_with_baseline():
+    """
+    Tests that only metrics worse than the baseline by more than the tolerance are reported, in
+    the right direction for each metric.
+    """
+
+    baseline = {'index/1000': {'p95_ms': 1.0, 'requests_per_second': 1000, 'memory_bytes': 100}}
+
+    assert not compare_with_baseline(
+        {'index/1000': {'p95_ms': 1.2, 'requests_per_second': 2000, 'memory_bytes': None},
+         'flask/1000': {'p95_ms': 9.0}}, baseline, tolerance=0.25)
+
+    regressions = compare_with_baseline(
+        {'index/1000': {'p95_ms': 0.5, 'requests_per_second': 500, 'memory_bytes': 200}},
+        baseline, tolerance=0.25)
+
+    assert len(regressions) == 2
+    assert regressions[0].startswith('index/1000 requests_per_second')
+    assert regressions[1].startswith('index/1000 memory_bytes')
+
+
+def test_more_errors_than_baseline_is_a_regression():
+    """
+    Tests that a run with more errors than the baseline is reported even if the baseline had none.
+    """
+
+    baseline = {'index/1000': {'p95_ms': 1.0, 'errors': 0}}
+
+    assert not compare_with_baseline({'index/1000': {'p95_ms': 1.0, 'errors': 0}}, baseline)
+    assert compare_with_baseline({'index/1000': {'p95_ms': 1.0, 'errors': 2}}, baseline) == [
+        'index/1000 errors: 2 vs 0 in the baseline']
+
+
+def test_baseline_mismatches():
+    """
+    Tests that differences in configuration and machine are reported, but not in peak memory.
+    """
+
+    benchmark = {'config': {'queries': 300, 'seed': 0},
+                 'machine': {'python': '3.10.0', 'platform': 'Linux', 'cpus': 4,
+                             'peak_rss_bytes': 100}}
+
+    assert not baseline_mismatches(benchmark, {**benchmark, 'machine': {
+        **benchmark['machine'], 'peak_rss_bytes': 200}})
+
+    mismatches = baseline_mismatches(benchmark, {
+        'config': {'queries': 100, 'seed': 0},
+        'machine': {**benchmark['machine'], 'cpus': 1}})
+
+    assert mismatches == ['config queries: 300 vs 100 in the baseline',
+                          'machine cpus: 4 vs 1 in the baseline']
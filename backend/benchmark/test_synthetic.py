@@ -0,0 +1,65 @@
+"""
+Test cases for generating synthetic cities and search mixes
+"""
+
+import mongomock
+
+from benchmark.queries import generate_queries
+from benchmark.synthetic import generate_cities, populate_database
+from city_index import CityIndex
+from get_cities import MONTH_KEYS, get_cities, parse_months
+
+
+def test_cities_are_reproducible():
+    """
+    Tests that the same seed generates the same cities, with every month of the cities collection.
+    """
+
+    cities = list(generate_cities(50, seed=1))
+
+    assert cities == list(generate_cities(50, seed=1))
+    assert cities != list(generate_cities(50, seed=2))
+    assert len({city['city'] for city in cities}) == 50
+    assert all(list(city['months']) == MONTH_KEYS for city in cities)
+    assert all(city['safety'] in [1, 2, 3, 4] for city in cities)
+
+
+def test_populated_database_answers_searches():
+    """
+    Tests that the synthetic cities match searches and that the index loads the new data version.
+    """
+
+    dbname = mongomock.MongoClient().db
+    assert populate_database(dbname, 200, batch_size=64) == 1
+    assert dbname.cities.count_documents({}) == 200
+
+    index = CityIndex(dbname)
+    assert index.version == 1
+
+    matched = get_cities('15', '30', 'July', '31', dbname, '4')
+    assert sum(len(cities) for cities in matched.values()) > 0
+    assert index.get_cities('15', '30', 'July', '31', '4') == matched
+
+    # Refilling replaces the cities rather than adding to them
+    assert populate_database(dbname, 100) == 2
+    assert dbname.cities.count_documents({}) == 100
+
+
+def test_query_mix():
+    """
+    Tests that the search mix is reproducible, repeats popular searches and only uses the given
+    endpoints with valid parameters.
+    """
+
+    queries = generate_queries(500, distinct=50, seed=3,
+                               endpoints={'/cities': 0.5, '/cities/months': 0.5})
+
+    assert queries == generate_queries(500, distinct=50, seed=3,
+                                       endpoints={'/cities': 0.5, '/cities/months': 0.5})
+    assert {query.path for query in queries} == {'/cities', '/cities/months'}
+    assert len({repr(query) for query in queries}) <= 50
+
+    for query in queries:
+        assert float(query.args['minTemp']) < float(query.args['maxTemp'])
+        if query.path == '/cities/months':
+            assert 2 <= len(parse_months(query.args['months'])) <= 3
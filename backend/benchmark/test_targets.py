@@ -0,0 +1,61 @@
+"""
+Test cases for the targets the benchmark sends searches to
+"""
+
+import mongomock
+import pytest
+
+from benchmark.queries import Query, generate_queries
+from benchmark.synthetic import populate_database
+from benchmark.targets import make_target
+
+
+@pytest.fixture(name='dbname', scope='module')
+def fixture_dbname():
+    """
+    A database of synthetic cities.
+    """
+
+    dbname = mongomock.MongoClient().db
+    populate_database(dbname, 100)
+    return dbname
+
+
+@pytest.mark.parametrize('name', ['get_cities', 'index', 'flask'])
+def test_targets_answer_the_query_mix(dbname, name):
+    """
+    Tests that every target answers every search of the mix for its endpoints.
+    """
+
+    target = make_target(name, dbname)
+    endpoints = {path: 1 for path in target.paths}
+
+    for query in generate_queries(50, distinct=20, endpoints=endpoints):
+        target.send(query)
+
+
+def test_flask_target_raises_on_errors(dbname):
+    """
+    Tests that responses other than 200 fail the search.
+    """
+
+    target = make_target('flask', dbname)
+
+    with pytest.raises(RuntimeError):
+        target.send(Query('/cities', {'minTemp': 'a', 'maxTemp': '5', 'month': 'July',
+                                      'rainyDays': '5'}))
+
+
+def test_targets_need_their_inputs():
+    """
+    Tests that a target without what it sends searches to is rejected.
+    """
+
+    with pytest.raises(ValueError):
+        make_target('http')
+
+    with pytest.raises(ValueError):
+        make_target('index')
+
+    with pytest.raises(ValueError):
+        make_target('wrk', mongomock.MongoClient().db)
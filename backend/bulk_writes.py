@@ -0,0 +1,57 @@
+'''
+Helpers for sending many write operations to MongoDB in as few round trips as possible.
+
+Functions:
+    write_in_batches(collection: Collection, operations: Iterable, batch_size: int, label: str)
+    -> dict
+        Sends write operations to a collection with unordered bulk writes of up to batch_size
+        operations each, and logs the result of every batch.
+'''
+
+import logging
+from itertools import islice
+from typing import Iterable
+
+from pymongo.collection import Collection
+
+DEFAULT_BATCH_SIZE = 500
+
+
+def write_in_batches(collection: Collection, operations: Iterable,
+                     batch_size: int = DEFAULT_BATCH_SIZE, label: str = 'documents') -> dict:
+    '''
+    Sends write operations to a collection with unordered bulk writes of up to batch_size
+    operations each, and logs the number of matched, modified and upserted documents per batch.
+
+        Parameters:
+            collection (Collection): The collection to write to
+            operations (Iterable): pymongo write operations, e.g. UpdateOne
+            batch_size (int): The maximum number of operations per bulk write
+            label (str): Describes what is being written, used in log messages
+
+        Returns:
+            totals (dict[str, int]): The total number of batches and of matched, modified and
+            upserted documents
+    '''
+
+    totals = {'batches': 0, 'matched': 0, 'modified': 0, 'upserted': 0}
+    operations = iter(operations)
+
+    while True:
+        batch = list(islice(operations, batch_size))
+        if not batch:
+            break
+
+        result = collection.bulk_write(batch, ordered=False)
+
+        totals['batches'] += 1
+        totals['matched'] += result.matched_count
+        totals['modified'] += result.modified_count
+        totals['upserted'] += result.upserted_count
+
+        logging.info(
+            "Wrote batch %s of %s %s: %s matched, %s modified, %s upserted", totals['batches'],
+            len(batch), label, result.matched_count, result.modified_count,
+            result.upserted_count)
+
+    return totals
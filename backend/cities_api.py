@@ -0,0 +1,195 @@
+'''
+This module answers the requests of the /cities endpoints independently of the web framework, so
+the Flask app in base and the ASGI app in asgi serve the same responses and validation errors.
+
+Requests are answered from the in-memory city index, so answering a request does not wait on the
+database. The data version is checked by the index, see CityIndex.snapshot.
+
+Classes:
+    CitiesApi
+        Answers the requests of the /cities endpoints from a city index.
+
+Functions:
+    create_cities_api(refresh_interval: float) -> CitiesApi
+        Creates the API for the project database, making sure its indexes exist.
+'''
+
+import json
+import logging
+from typing import Mapping
+
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_accept_header, parse_etags
+
+from city_index import DEFAULT_REFRESH_INTERVAL, CityIndex
+from get_cities import parse_max_safety, parse_mode, parse_months
+from get_database import get_database, get_pool_stats
+from indexes import ensure_indexes, explain_get_cities
+from ranking import parse_limit
+from response_cache import ResponseCache, normalize_conditions, normalize_query
+from response_encoding import (COLUMNAR_MIMETYPE, COLUMNAR_SHAPE, IDENTITY_CODING, JSON_MIMETYPE,
+                               choose_encoding, choose_shape, columnar_cities, encode_body,
+                               make_etag, to_columns)
+
+
+class CitiesApi:
+    '''
+    Answers the requests of the /cities endpoints from a city index. Responses are negotiated and
+    cached as described in response_encoding.
+
+        Parameters:
+            city_index (CityIndex): The index the cities are read from
+            response_cache (Optional[ResponseCache]): The cache of encoded responses
+    '''
+
+    def __init__(self, city_index: CityIndex, response_cache: ResponseCache = None):
+        self.city_index = city_index
+        self.response_cache = response_cache if response_cache is not None else ResponseCache()
+        self._routes = {
+            '/cities': self._cities_query,
+            '/cities/months': self._months_query,
+            '/cities/ranked': self._ranked_query,
+        }
+
+    @property
+    def paths(self) -> list:
+        '''
+        The paths of the endpoints the API answers.
+        '''
+
+        return list(self._routes)
+
+    def handle(self, path: str, args: Mapping, headers: Mapping) -> tuple:
+        '''
+        Answers a GET request to one of the /cities endpoints.
+
+            Parameters:
+                path (str): The path of the request, e.g. '/cities'
+                args (Mapping[str, str]): The query parameters of the request
+                headers (Mapping[str, str]): The headers of the request, looked up by lowercase
+                name
+
+            Returns:
+                response (tuple[int, dict[str, str], bytes]): The status, headers and body of the
+                response. Invalid queries get a 400 with the validation error as JSON.
+        '''
+
+        route = self._routes.get(path)
+        if route is None:
+            return self._error(404, f"Not found: {path}")
+
+        try:
+            key, compute, to_columnar = route(args)
+            shape = choose_shape(parse_accept_header(headers.get('accept'), MIMEAccept),
+                                 args.get('format'))
+        except ValueError as error:
+            return self._error(400, str(error))
+
+        coding = choose_encoding(parse_accept_header(headers.get('accept-encoding')))
+
+        # The ETag, the cache key and the body all come from the same snapshot, so a reload while
+        # the request is answered cannot label new data with the version of the old data
+        snapshot = self.city_index.snapshot()
+        version = snapshot.version
+        etag = make_etag(version, key, shape, coding)
+
+        response_headers = {
+            'ETag': f'"{etag}"',
+            # Clients may keep the response but have to revalidate it, which is answered with a 304
+            'Cache-Control': 'no-cache',
+            'Vary': 'Accept, Accept-Encoding',
+        }
+
+        if parse_etags(headers.get('if-none-match')).contains(etag):
+            return 304, response_headers, b''
+
+        def encode():
+            payload = compute(snapshot)
+            return encode_body(to_columnar(payload) if shape == COLUMNAR_SHAPE else payload,
+                               coding)
+
+        try:
+            body, body_coding = self.response_cache.get_or_compute(
+                (key, shape, coding), version, encode)
+        except ValueError as error:
+            # e.g. a cursor that was not returned by a previous page
+            return self._error(400, str(error))
+
+        response_headers['Content-Type'] = (
+            COLUMNAR_MIMETYPE if shape == COLUMNAR_SHAPE else JSON_MIMETYPE)
+        if body_coding != IDENTITY_CODING:
+            response_headers['Content-Encoding'] = body_coding
+
+        return 200, response_headers, body
+
+    def health(self) -> dict:
+        '''
+        Returns the status of the API, for use in health checks.
+
+            Returns:
+                health (dict): The status, the data version of the index and the statistics of the
+                database connection pool
+        '''
+
+        return {
+            'status': 'ok',
+            'data_version': self.city_index.version,
+            'pool': get_pool_stats()
+        }
+
+    @staticmethod
+    def _error(status: int, message: str) -> tuple:
+        body = json.dumps({'error': message}).encode('utf-8')
+        return status, {'Content-Type': JSON_MIMETYPE}, body
+
+    def _cities_query(self, args: Mapping) -> tuple:
+        query = normalize_query(args.get('minTemp'), args.get('maxTemp'), args.get('month'),
+                                args.get('rainyDays')) + (parse_max_safety(args.get('maxSafety')),)
+
+        return (query, lambda snapshot: self.city_index.query(*query, snapshot=snapshot),
+                columnar_cities)
+
+    def _months_query(self, args: Mapping) -> tuple:
+        # Either a comma separated list of months or a date range, e.g. startDate=2024-12-20
+        months = parse_months(args.get('months'), args.get('startDate'), args.get('endDate'))
+        min_temp, max_temp, rainy_days = normalize_conditions(
+            args.get('minTemp'), args.get('maxTemp'), args.get('rainyDays'))
+        query = (min_temp, max_temp, tuple(months), rainy_days, parse_mode(args.get('mode')),
+                 parse_max_safety(args.get('maxSafety')))
+
+        return (('months',) + query,
+                lambda snapshot: self.city_index.query_months(*query, snapshot=snapshot),
+                columnar_cities)
+
+    def _ranked_query(self, args: Mapping) -> tuple:
+        query = normalize_query(args.get('minTemp'), args.get('maxTemp'), args.get('month'),
+                                args.get('rainyDays')) + (
+            parse_max_safety(args.get('maxSafety')), parse_limit(args.get('limit')),
+            args.get('cursor'))
+
+        return (('ranked',) + query,
+                lambda snapshot: self.city_index.rank(*query, snapshot=snapshot),
+                lambda page: {**page, 'cities': to_columns(page['cities'])})
+
+
+def create_cities_api(refresh_interval: float = DEFAULT_REFRESH_INTERVAL) -> CitiesApi:
+    '''
+    Creates the API for the project database. The indexes of the cities collection are created if
+    they are missing and all cities are loaded into memory.
+
+        Parameters:
+            refresh_interval (float): The minimum number of seconds between checks of the data
+            version while answering requests
+
+        Returns:
+            api (CitiesApi): The API
+    '''
+
+    dbname = get_database()
+
+    # Make sure the cities collection is indexed and report whether queries use the indexes
+    ensure_indexes(dbname["cities"])
+    logging.info("get_cities query plan: %s", explain_get_cities(dbname, 'jan'))
+
+    # Load all cities into memory once. The index reloads itself when the data is updated.
+    return CitiesApi(CityIndex(dbname, refresh_interval))
@@ -0,0 +1,430 @@
+'''
+This module defines an in-memory index of the cities collection that can answer the same queries as
+get_cities without a round trip to the database.
+
+The month tables (see month_tables) are loaded once into NumPy arrays partitioned by the safety
+value of each city's country and sorted by temperature within each partition. A query only reads
+the partitions of the safety values it accepts, and in each one answers the temperature range with
+two binary searches and a vectorized rain mask over the cities in the range. The index keeps track
+of the data version it was loaded from and reloads itself when the version in the database changes.
+
+Queries over several months match each month against the same snapshot and combine the matches by
+city, so comparing travel windows takes one request instead of one per month. Ranked queries score
+the cities of the accepted partitions and only sort the best ones, see ranking.
+
+Classes:
+    CityIndex
+        Columnar in-memory copy of the cities collection.
+'''
+
+import threading
+import time
+from collections import defaultdict
+from functools import reduce
+
+import numpy as np
+from pymongo.database import Database
+
+from data_version import get_data_version
+from get_cities import (DEFAULT_MATCH_MODE, DEFAULT_MAX_SAFETY, parse_conditions,
+                        parse_max_safety, parse_mode, parse_query)
+from month_tables import (CITY_PROJECTION, build_month_tables, load_country_safety,
+                          load_month_tables)
+from ranking import (DEFAULT_LIMIT, decode_cursor, encode_cursor, parse_limit, score_cities,
+                     select_top_k)
+
+# How often, in seconds, the data version in the database is checked for changes
+DEFAULT_REFRESH_INTERVAL = 60
+
+
+class _MonthTable:
+    '''
+    A month table converted to NumPy arrays, partitioned by safety and sorted by temperature within
+    each partition.
+    '''
+
+    __slots__ = ('cities', 'countries', 'temperatures', 'rains', 'safety', 'positions',
+                 'safety_starts')
+
+    def __init__(self, table: dict):
+        self.cities = table['cities']
+        self.countries = table['countries']
+        self.temperatures = np.asarray(table['temperatures'], dtype=float)
+        self.rains = np.asarray(table['rains'], dtype=float)
+        self.safety = np.asarray(table['safety'], dtype=float)
+        self.positions = np.asarray(table['positions'], dtype=np.int64)
+        self.safety_starts = table['safety_starts']
+
+    def partitions(self, max_safety: int):
+        '''
+        Returns the start and end of the partition of every safety value up to max_safety.
+        '''
+
+        starts = self.safety_starts
+        return zip(starts[:max_safety], starts[1:max_safety + 1])
+
+    def match(self, min_temp: float, max_temp: float, rainy_days: float,
+              max_safety: int) -> np.ndarray:
+        '''
+        Returns the rows of the cities matching a query, in no particular order.
+        '''
+
+        # Each safety partition is sorted by temperature, so its cities in range are a contiguous
+        # slice. The partitions of unsafe countries are never read.
+        matches = []
+        for partition_start, partition_end in self.partitions(max_safety):
+            temperatures = self.temperatures[partition_start:partition_end]
+            start = partition_start + np.searchsorted(temperatures, min_temp, side='left')
+            end = partition_start + np.searchsorted(temperatures, max_temp, side='right')
+            matches.append(np.flatnonzero(self.rains[start:end] <= rainy_days) + start)
+
+        return np.concatenate(matches) if matches else np.empty(0, dtype=np.int64)
+
+
+class _Snapshot:
+    '''
+    An immutable copy of the month tables at a given data version. A new snapshot is built on
+    every reload so that queries running concurrently always see consistent arrays.
+    '''
+
+    __slots__ = ('version', 'months')
+
+    def __init__(self, version: int, tables: dict):
+        self.version = version
+        self.months = {month: _MonthTable(table) for month, table in tables.items()}
+
+
+class CityIndex:
+    '''
+    Columnar in-memory copy of the cities collection. The data is loaded when the index is created
+    and reloaded whenever the data version in the database changes.
+
+        Parameters:
+            dbname (Database): The database to load the cities from
+            refresh_interval (float): The minimum number of seconds between checks of the data
+            version in the database
+            clock (Callable[[], float]): Returns the current time in seconds, used to decide when
+            the data version should be checked again
+    '''
+
+    def __init__(self, dbname: Database, refresh_interval: float = DEFAULT_REFRESH_INTERVAL,
+                 clock=time.monotonic):
+        self._dbname = dbname
+        self._refresh_interval = refresh_interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._last_checked = None
+
+        self.load()
+
+    @property
+    def version(self) -> int:
+        '''
+        The data version the index was loaded from.
+        '''
+
+        return self._snapshot.version
+
+    def snapshot(self) -> _Snapshot:
+        '''
+        Reloads the index if it is stale and returns the data it holds. Answering several queries,
+        or labelling a response with its data version, from the same snapshot keeps them consistent
+        even if the index is reloaded in between.
+
+            Returns:
+                snapshot (_Snapshot): The loaded data and its data version, in snapshot.version
+        '''
+
+        self.refresh_if_stale()
+        return self._snapshot
+
+    def load(self) -> None:
+        '''
+        Loads all cities from the database into the index, replacing any previously loaded data.
+
+            Returns:
+                None
+        '''
+
+        # Read the version before the data, so that if the data changes in between the next refresh
+        # sees a newer version and loads it again
+        version = get_data_version(self._dbname)
+
+        # Use the tables precomputed by the update-data script if they are up to date, otherwise
+        # build them from the cities collection
+        tables = load_month_tables(self._dbname, version)
+        if tables is None:
+            documents = list(self._dbname["cities"].find({}, CITY_PROJECTION))
+            tables = build_month_tables(documents, load_country_safety(self._dbname))
+
+        self._snapshot = _Snapshot(version, tables)
+        self._last_checked = self._clock()
+
+    def refresh_if_stale(self) -> bool:
+        '''
+        Reloads the index if the data version in the database has changed. The database is checked
+        at most once per refresh interval.
+
+            Returns:
+                reloaded (bool): True if the index was reloaded, otherwise False
+        '''
+
+        if self._clock() - self._last_checked < self._refresh_interval:
+            return False
+
+        return self.refresh()
+
+    def refresh(self) -> bool:
+        '''
+        Reloads the index if the data version in the database has changed, without waiting for the
+        refresh interval, e.g. from a background task of a server that never refreshes the index
+        while answering requests.
+
+            Returns:
+                reloaded (bool): True if the index was reloaded, otherwise False
+        '''
+
+        # Only one thread needs to check the version, the others keep using the current snapshot
+        if not self._lock.acquire(blocking=False):
+            return False
+
+        try:
+            self._last_checked = self._clock()
+            if get_data_version(self._dbname) == self._snapshot.version:
+                return False
+            self.load()
+            return True
+        finally:
+            self._lock.release()
+
+    def get_cities(self, min_temp: str, max_temp: str, month: str, rainy_days: str,
+                   max_safety: str = None) -> dict:
+        '''
+        Returns all cities where the temperature is in between a provided range. Takes the same
+        parameters, raises the same errors and returns the same result as get_cities.
+
+            Parameters:
+                min_temp (str): A string representing the minimum temperature
+                max_temp (str): A string representing the maximum temperature
+                month (str): A string representing the month (e.g., 'January', 'February', etc.)
+                rainy_days (str): A string representing the maximum number of rainy days
+                max_safety (str): A string representing the highest safety value, by default
+                only countries with a safety of 1 or 2 are returned
+
+            Returns:
+                cities (dict[list[dict[str: str, str: float]]]): All safe cities where the
+                temperature for the provided month is between min_temp and max_temp and the average
+                number of rainy days is less than or equal to rainy_days, grouped by country.
+        '''
+
+        float_min_temp, float_max_temp, shortened_month, float_rainy_days = parse_query(
+            min_temp, max_temp, month, rainy_days)
+
+        return self.query(float_min_temp, float_max_temp, shortened_month, float_rainy_days,
+                          parse_max_safety(max_safety))
+
+    def query(self, min_temp: float, max_temp: float, month: str, rainy_days: float,
+              max_safety: int = DEFAULT_MAX_SAFETY, snapshot: _Snapshot = None) -> dict:
+        '''
+        Returns all cities matching a query that has already been validated by parse_query.
+
+            Parameters:
+                min_temp (float): The minimum temperature
+                max_temp (float): The maximum temperature
+                month (str): The month key used in the database (e.g. 'jan')
+                rainy_days (float): The maximum number of rainy days
+                max_safety (int): The highest safety value cities may have
+                snapshot (Optional[_Snapshot]): The snapshot to answer from, by default the
+                current one, see snapshot
+
+            Returns:
+                cities (dict[list[dict[str: str, str: float]]]): All safe cities matching the query,
+                grouped by country.
+        '''
+
+        if snapshot is None:
+            snapshot = self.snapshot()
+
+        table = snapshot.months[month]
+        matches = table.match(min_temp, max_temp, rainy_days, max_safety)
+
+        # Return cities in the same order as the cities collection
+        matches = matches[np.argsort(table.positions[matches], kind='stable')]
+
+        cities_by_country = defaultdict(list)
+
+        for row in matches:
+            cities_by_country[table.countries[row]].append({
+                'city': table.cities[row],
+                'temperature': float(table.temperatures[row]),
+                'rain': float(table.rains[row])
+            })
+
+        return dict(cities_by_country)
+
+    def get_cities_for_months(self, min_temp: str, max_temp: str, months: list, rainy_days: str,
+                              mode: str = None, max_safety: str = None) -> dict:
+        '''
+        Returns the cities matching a query in all or any of several months. Takes the same
+        parameters, raises the same errors and returns the same result as get_cities_for_months.
+
+            Parameters:
+                min_temp (str): A string representing the minimum temperature
+                max_temp (str): A string representing the maximum temperature
+                months (list[str]): The month keys used in the database (e.g. 'jan')
+                rainy_days (str): A string representing the maximum number of rainy days
+                mode (str): 'all' if every month has to match, 'any' if one month is enough
+                max_safety (str): A string representing the highest safety value
+
+            Returns:
+                cities (dict[list[dict]]): The matching cities grouped by country, with the
+                temperature and rain of every month they match in.
+        '''
+
+        float_min_temp, float_max_temp, float_rainy_days = parse_conditions(
+            min_temp, max_temp, rainy_days)
+
+        return self.query_months(float_min_temp, float_max_temp, months, float_rainy_days,
+                                 parse_mode(mode), parse_max_safety(max_safety))
+
+    def query_months(self, min_temp: float, max_temp: float, months: list, rainy_days: float,
+                     mode: str = DEFAULT_MATCH_MODE, max_safety: int = DEFAULT_MAX_SAFETY,
+                     snapshot: _Snapshot = None) -> dict:
+        '''
+        Returns the cities matching a multi-month query that has already been validated. Every
+        month is matched once against the same snapshot and the matches are combined by city.
+
+            Parameters:
+                min_temp (float): The minimum temperature
+                max_temp (float): The maximum temperature
+                months (list[str]): The month keys used in the database (e.g. 'jan')
+                rainy_days (float): The maximum number of rainy days
+                mode (str): 'all' if every month has to match, 'any' if one month is enough
+                max_safety (int): The highest safety value cities may have
+                snapshot (Optional[_Snapshot]): The snapshot to answer from, by default the
+                current one, see snapshot
+
+            Returns:
+                cities (dict[list[dict]]): The matching cities grouped by country, with the
+                temperature and rain of every month they match in.
+        '''
+
+        if snapshot is None:
+            snapshot = self.snapshot()
+
+        # The matches of each month, sorted by position in the cities collection
+        month_matches = []
+        for month in months:
+            table = snapshot.months[month]
+            rows = table.match(min_temp, max_temp, rainy_days, max_safety)
+            rows = rows[np.argsort(table.positions[rows], kind='stable')]
+            month_matches.append((month, table, rows, table.positions[rows]))
+
+        combine = np.intersect1d if mode == 'all' else np.union1d
+        positions = reduce(combine, (matched for _, _, _, matched in month_matches))
+
+        # Find the row of every matching city in the table of each month, if it matches that month
+        cities = [None] * len(positions)
+        city_months = [{} for _ in positions]
+        for month, table, rows, matched in month_matches:
+            if not len(matched):
+                continue
+
+            found = np.minimum(np.searchsorted(matched, positions), len(matched) - 1)
+            for index in np.flatnonzero(matched[found] == positions):
+                row = rows[found[index]]
+                cities[index] = (table.countries[row], table.cities[row])
+                city_months[index][month] = {
+                    'temperature': float(table.temperatures[row]),
+                    'rain': float(table.rains[row])
+                }
+
+        cities_by_country = defaultdict(list)
+
+        for (country, city), matched_months in zip(cities, city_months):
+            cities_by_country[country].append({'city': city, 'months': matched_months})
+
+        return dict(cities_by_country)
+
+    def get_ranked_cities(self, min_temp: str, max_temp: str, month: str, rainy_days: str,
+                          max_safety: str = None, limit: str = None, cursor: str = None) -> dict:
+        '''
+        Returns a page of the cities that best match a search, validating the parameters like
+        get_cities.
+
+            Parameters:
+                min_temp (str): A string representing the minimum temperature
+                max_temp (str): A string representing the maximum temperature
+                month (str): A string representing the month (e.g., 'January', 'February', etc.)
+                rainy_days (str): A string representing the maximum number of rainy days
+                max_safety (str): A string representing the highest safety value
+                limit (str): A string representing the number of cities per page
+                cursor (str): The cursor of the previous page, or None for the first page
+
+            Returns:
+                page (dict): See rank
+        '''
+
+        float_min_temp, float_max_temp, shortened_month, float_rainy_days = parse_query(
+            min_temp, max_temp, month, rainy_days)
+
+        return self.rank(float_min_temp, float_max_temp, shortened_month, float_rainy_days,
+                         parse_max_safety(max_safety), parse_limit(limit), cursor)
+
+    def rank(self, min_temp: float, max_temp: float, month: str, rainy_days: float,
+             max_safety: int = DEFAULT_MAX_SAFETY, limit: int = DEFAULT_LIMIT,
+             cursor: str = None, snapshot: _Snapshot = None) -> dict:
+        '''
+        Returns a page of the cities that best match a validated search. Every city of a country
+        up to max_safety is scored, so cities just outside the temperature range or with a few
+        more rainy days than asked for can still be returned, after the closer matches.
+
+            Parameters:
+                min_temp (float): The minimum temperature
+                max_temp (float): The maximum temperature
+                month (str): The month key used in the database (e.g. 'jan')
+                rainy_days (float): The maximum number of rainy days
+                max_safety (int): The highest safety value cities may have
+                limit (int): The maximum number of cities to return
+                cursor (str): The cursor of the previous page, or None for the first page
+                snapshot (Optional[_Snapshot]): The snapshot to answer from, by default the
+                current one, see snapshot
+
+            Returns:
+                page (dict): 'cities', the best cities with their country, temperature, rain,
+                safety and score, best first, and 'cursor', the cursor of the next page or None if
+                this is the last page
+
+            Raises:
+                ValueError: If the cursor is not valid, or was returned before the data was
+                updated
+        '''
+
+        if snapshot is None:
+            snapshot = self.snapshot()
+        after = decode_cursor(cursor, snapshot.version)
+        table = snapshot.months[month]
+
+        # The partitions of the accepted safety values are at the start of the table
+        end = table.safety_starts[max_safety]
+        scores = score_cities(table.temperatures[:end], table.rains[:end], table.safety[:end],
+                              min_temp, max_temp, rainy_days)
+        rows = select_top_k(scores, table.positions[:end], limit + 1, after)
+
+        cities = [{
+            'city': table.cities[row],
+            'country': table.countries[row],
+            'temperature': float(table.temperatures[row]),
+            'rain': float(table.rains[row]),
+            'safety': float(table.safety[row]),
+            'score': float(scores[row]),
+        } for row in rows[:limit]]
+
+        # One more city than the limit is selected to know whether there is a next page
+        next_cursor = None
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            next_cursor = encode_cursor(snapshot.version, scores[last], table.positions[last])
+
+        return {'cities': cities, 'cursor': next_cursor}
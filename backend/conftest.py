@@ -0,0 +1,27 @@
+'''
+Fixtures shared by the test cases of the backend and of the data scripts
+'''
+
+import pytest
+
+
+class FakeClock:
+    '''
+    A clock that only moves forward when told to or when something sleeps.
+    '''
+
+    def __init__(self):
+        self.now = 0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture(name='clock')
+def fixture_clock():
+    return FakeClock()
@@ -0,0 +1,8 @@
+"""
+Scripts and helpers that collect the temperature, safety and rain data of each city and store it in
+the database.
+
+Run the scripts as modules from the backend directory, e.g. python -m data.update_database --rain.
+Importing any module of this package is cheap: database connections, API clients and environment
+variables are only loaded the first time a function needs them.
+"""
@@ -3,30 +3,62 @@ This module provides functions to retrieve rainfall data for weather stations us
 and save the data to a database and CSV file.
 
 Functions:
-    read_stations(filename: str) -> list
-        Reads a CSV file containing weather station information, and returns a list of dictionaries
-        where each dictionary represents a weather station.
-
     get_rain_data(params: dict) -> list
-        Retrieves rainfall data from the NOAA API, given a dictionary of parameters. If the request
-        fails, it will retry up to 3 times before raising an error.
+        Retrieves every page of rainfall data from the NOAA API, given a dictionary of parameters.
+        Failed requests are retried with backoff by the NOAA client.
         API documentation: https://www.ncdc.noaa.gov/cdo-web/webservices/v2#data
 
-    count_rainy_days(max_date: datetime, min_date: datetime, station_id: str) -> tuple
+    get_station_years(max_date: datetime, min_date: datetime) -> list
+        Returns the years of rainfall data used for a weather station.
+
+    plan_rain_requests(stations: list, stations_per_request: int) -> list
+        Returns the parameters of the requests needed to get up to 20 years of rainfall data for
+        many weather stations, sharing each request between several stations.
+
+    sum_rain_by_year(all_params: list, all_data: list) -> dict
+        Splits the responses of the planned requests into rainy days and total precipitation per
+        station, year and month.
+
+    aggregate_rainy_days(sums_by_year: dict, max_date: datetime, min_date: datetime) -> tuple
+        Averages the number of rainy days and total precipitation for each month of a weather
+        station from its sums per year.
+
+    load_rain_sums(sums_collection: Collection, station_ids: list) -> dict
+        Loads the sums per year stored for weather stations by previous runs.
+
+    save_rain_sums(sums_collection: Collection, sums: dict) -> None
+        Stores the sums per year of weather stations for later runs.
+
+    count_rainy_days(max_date: datetime, min_date: datetime, station_id: str,
+                     max_workers: int) -> tuple
         Counts the number of rainy days and total precipitation for each month, given a weather
         station's maximum and minimum dates of observation, and the station ID. Returns a tuple
         containing two dictionaries: one containing the average number of rainy days per month over
         the past 20 years, and the other containing the average total precipitation per month over
         the past 20 years.
 
-    update_db_with_rain(city: str, country: str, rainy_days: dict, total_precipitation: dict, 
-                        name: str, id: str) -> None
-        Saves rainfall data for a weather station to a MongoDB database and a CSV file, given the
-        city name, country, dictionaries of average rainy days and total precipitation per month,
-        the station name, and the station ID.
-    
-    add_rain_to_db() -> None
-        Main function that updates the average monthly rainfall values in the database.
+    fetch_rain_for_stations(stations: list, max_workers: int, stations_per_request: int,
+                            sums_collection: Optional[Collection]) -> Iterator[tuple]
+        Counts the rainy days and total precipitation of many weather stations, sending the
+        requests of all stations and years concurrently and only requesting years that have not
+        been summed yet.
+
+    build_rain_update(station_data: StationRecord, days_rainy: dict) -> UpdateOne
+        Builds a single update that sets the average number of rainy days of every month for the
+        city of a weather station.
+
+    read_rain_rows(filename: str) -> dict
+        Reads the rainfall data saved for each weather station by previous runs.
+
+    add_rain_to_db(flush_every: int, max_workers: int, incremental: bool, resume: bool,
+                   restart: bool, cities_collection: Optional[Collection]) -> None
+        Main function that updates the average monthly rainfall values in the database, resuming
+        from the checkpoint of an unfinished run if requested.
+
+Classes:
+    RainWriter
+        Saves rainfall data for weather stations to a MongoDB database with bulk writes and to a
+        CSV file, keyed by station, and checkpoints the saved stations.
 
 Example usage:
     # Should be called through update-data script
@@ -35,65 +67,49 @@ Example usage:
 """
 
 
-import requests
 import os
 import csv
-import time
-from dotenv import load_dotenv
+from collections import defaultdict
+from typing import Optional
 from datetime import datetime
-from retry import retry
-
-import sys
-sys.path.insert(0, '..')  # Add parent directory to sys.path
+from pymongo import UpdateOne
+from pymongo.collection import Collection
 
+from bulk_writes import write_in_batches
+from data.checkpoint import CHECKPOINT_DIRECTORY, JobCheckpoint, atomic_write
+from data.noaa_client import fetch_all, get_noaa_client, map_bounded
+from data.records import StationRecord, iter_stations
 from get_database import get_database
 
-load_dotenv()
-
-NCEI_TOKEN = os.getenv('NCEI_TOKEN')
+# The CSV files of weather stations and their rain data
+RAIN_CSV_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rain", "csv")
+STATIONS_CSV_PATH = os.path.join(RAIN_CSV_DIRECTORY, "stations_improved.csv")
+RAIN_CSV_PATH = os.path.join(RAIN_CSV_DIRECTORY, "rain_improved.csv")
 
 MONTH_NAMES = ["jan", "feb", "mar", "apr", "may",
                "jun", "jul", "aug", "sep", "oct", "nov", "dec"]
 
-def read_stations(filename: str)-> list:
-    """
-    Read a CSV file containing weather station information and return a list of dictionaries
-    representing each station.
+# Number of stations to accumulate before writing their rain data to the database
+DEFAULT_FLUSH_EVERY = 50
 
-    Parameters:
-        filename (str): The path to the CSV file to read.
+# Number of NOAA API requests in flight at once. The client's rate limiter keeps the requests
+# within the API quota, so this only needs to be large enough to hide the latency of each request.
+DEFAULT_MAX_WORKERS = 8
 
-    Returns:
-        list: A list of dictionaries representing each station in the CSV file. Each dictionary has
-        the following keys:
-            mindate: The earliest date for which the station has data.
-            maxdate: The latest date for which the station has data.
-            name: The name of the station.
-            city: The city in which the station is located.
-            country: The country in which the station is located.
-            id: The unique identifier for the station.
-    """
+# Number of stations whose data is asked for in the same request
+STATIONS_PER_REQUEST = 25
 
-    stations = []
-    with open(filename, newline="", encoding='UTF-8') as csvfile:
-        reader = csv.reader(csvfile)
-        next(reader)  # skip header row
-        for row in reader:
-            stations.append({
-                "mindate": datetime.strptime(row[0], "%Y-%m-%d"),
-                "maxdate": datetime.strptime(row[1], "%Y-%m-%d"),
-                "name": row[2],
-                "city": row[3],
-                "country": row[4],
-                "id": row[5],
-            })
-    return stations
+# Checkpoint of the stations saved by an unfinished run
+RAIN_CHECKPOINT_PATH = os.path.join(CHECKPOINT_DIRECTORY, "rain_checkpoint.json")
+
+# Collection storing the rainy days and total precipitation per month of each year of each station
+RAIN_SUMS_COLLECTION = "rain_sums"
 
 
-@retry(tries=3, delay=5, backoff=2, jitter=(1, 3), logger=None)
 def get_rain_data(params: dict) -> list:
     """
     Retrieves data from the NOAA API for percipitation and returns a list of the results.
+    Failed requests are retried by the shared NOAA client, and every page of results is retrieved.
 
     Parameters:
         params (dict): A dictionary of parameters to pass to the API endpoint.
@@ -105,80 +121,157 @@ def get_rain_data(params: dict) -> list:
             value: A float representing the amount of percipitation in millimeters.
     
     Raises:
-        ValueError: If the response status code is not 200 (i.e. the request failed).
+        ValueError: If the request failed.
     """
 
-    url = "https://www.ncdc.noaa.gov/cdo-web/api/v2/data"
+    return get_noaa_client().get_all_results("data", params)
 
-    response = requests.get(url, params=params, headers={
-        'token': NCEI_TOKEN}, timeout=20)
 
-    if response.status_code != 200:
-        raise ValueError("Failed to get rainfall data.")
-
-    return response.json().get("results", [])
-
-
-def count_rainy_days(max_date: datetime, min_date: datetime, station_id: str) -> tuple:
+def get_station_years(max_date: datetime, min_date: datetime) -> list:
     """
-    Calculates the average number of rainy days and total precipitation per month for a given
-    weather station ID, averaged over 20 years. If there is not 20 years of data then use as many
-    that is available. Assume no rain on any day that has no data.
+    Returns the years of data used for a weather station: up to 20 full years before max_date.
 
     Parameters:
         max_date (datetime): the latest date to include in the calculations
         min_date (datetime): the earliest date to include in the calculations
-        station_id (str): the weather station ID to retrieve data from
 
     Returns:
-        tuple: A tuple of two dictionaries, containing the average number of rainy days and total
-        precipitation per month, respectively. The keys of both dictionaries are the abbreviated
-        month names (e.g. "jan", "feb", etc.).
+        list: The years to get data for, newest year first.
     """
 
-    rainy_days_per_month = {month: 0 for month in MONTH_NAMES}
-    total_precipitation_per_month = {month: 0 for month in MONTH_NAMES}
+    years = []
 
     for year_offset in range(1, 21):
         year = max_date.year - year_offset
-        year_start = datetime(year, 1, 1)
-        year_end = datetime(year, 12, 31)
 
         # min_date is the earliest date that data could be available
         # To ensure a full year of data, add 1 to the min_date
         if min_date.year + 1 > year:
             break
 
-        params = {
-            "stationid": station_id,
-            "datasetid": "GHCND",
-            "startdate": year_start.date().isoformat(),
-            "enddate": year_end.date().isoformat(),
-            "datatypeid": "PRCP",
-            "limit": 1000,
-            "units": "metric",
-            "includemetadata": False,
-        }
+        years.append(year)
 
-        time.sleep(0.2)
+    return years
 
-        try:
-            data = get_rain_data(params)
-        except requests.exceptions.ReadTimeout:
-            print("Request timed out. Retrying after waiting for 5 seconds.")
-            time.sleep(5)
-            data = get_rain_data(params)
+
+def plan_rain_requests(stations: list, stations_per_request: int = STATIONS_PER_REQUEST,
+                       known_years: Optional[dict] = None) -> list:
+    """
+    Returns the parameters of the requests needed to get the percipitation data of every year used
+    for each weather station.
+
+    The CDO API limits daily data such as GHCND to a date range of one year per request, so every
+    request covers one calendar year. Instead of one request per station and year, each request
+    asks for the same year of up to stations_per_request stations. A year of one station is at most
+    366 observations, so this fills the 1000 result pages that would otherwise be mostly empty.
+    Requests are paged through by the NOAA client, so none of the results are truncated.
+
+    Parameters:
+        stations (list[StationRecord]): The weather stations.
+        stations_per_request (int): The maximum number of stations per request.
+        known_years (Optional[dict]): For each station ID, the years that have already been
+            summed and do not need to be requested again.
+
+    Returns:
+        list: A list of dictionaries of parameters for the data endpoint, newest year first.
+    """
+
+    known_years = known_years or {}
+    station_ids_by_year = defaultdict(list)
+
+    for station in stations:
+        station_known_years = known_years.get(station.id, ())
+        for year in get_station_years(station.maxdate, station.mindate):
+            if year not in station_known_years:
+                station_ids_by_year[year].append(station.id)
+
+    all_params = []
+
+    for year in sorted(station_ids_by_year, reverse=True):
+        station_ids = station_ids_by_year[year]
+        for start in range(0, len(station_ids), stations_per_request):
+            all_params.append({
+                "stationid": station_ids[start:start + stations_per_request],
+                "datasetid": "GHCND",
+                "startdate": datetime(year, 1, 1).date().isoformat(),
+                "enddate": datetime(year, 12, 31).date().isoformat(),
+                "datatypeid": "PRCP",
+                "units": "metric",
+            })
+
+    return all_params
+
+
+def sum_rain_by_year(all_params: list, all_data: list) -> dict:
+    """
+    Splits the responses of the requests returned by plan_rain_requests into the number of rainy
+    days and total precipitation of each month of each year for each weather station. A day is
+    rainy if it has at least 1 mm of precipitation.
+
+    Parameters:
+        all_params (list): The parameters of each request.
+        all_data (list): The list of observations returned for each request.
+
+    Returns:
+        dict: For each station ID, a dictionary from year to a dictionary with the keys
+        "rainy_days" and "precipitation", each a dictionary from abbreviated month name to the sum
+        for that month.
+    """
+
+    sums = defaultdict(dict)
+
+    for params, data in zip(all_params, all_data):
+        station_ids = params["stationid"]
+        year = int(params["startdate"][:4])
+
+        # Every station that was asked for has a year of data, even if no observations came back
+        for station_id in station_ids:
+            sums[station_id].setdefault(year, {
+                "rainy_days": {month: 0 for month in MONTH_NAMES},
+                "precipitation": {month: 0 for month in MONTH_NAMES},
+            })
 
         for observation in data:
             # Note: if no data is available for a certain day then assume 0
+            station_id = observation.get("station", station_ids[0])
             date = datetime.strptime(observation["date"], "%Y-%m-%dT%H:%M:%S")
             month_name = date.strftime("%b").lower()
             precipitation = observation["value"]
+            year_sums = sums[station_id][year]
             if precipitation is not None and float(precipitation) >= 1.0:
-                rainy_days_per_month[month_name] += 1
+                year_sums["rainy_days"][month_name] += 1
             if precipitation is not None:
-                total_precipitation_per_month[month_name] += float(
-                    precipitation)
+                year_sums["precipitation"][month_name] += float(precipitation)
+
+    return dict(sums)
+
+
+def aggregate_rainy_days(sums_by_year: dict, max_date: datetime, min_date: datetime) -> tuple:
+    """
+    Calculates the average number of rainy days and total precipitation per month of a weather
+    station from its sums for each year, as returned by sum_rain_by_year. Only the years returned
+    by get_station_years are used, any other years in sums_by_year are ignored.
+
+    Parameters:
+        sums_by_year (dict): The rainy days and precipitation of each month of each year.
+        max_date (datetime): the latest date to include in the calculations
+        min_date (datetime): the earliest date to include in the calculations
+
+    Returns:
+        tuple: A tuple of two dictionaries, containing the average number of rainy days and total
+        precipitation per month, respectively. The keys of both dictionaries are the abbreviated
+        month names (e.g. "jan", "feb", etc.).
+    """
+
+    rainy_days_per_month = {month: 0 for month in MONTH_NAMES}
+    total_precipitation_per_month = {month: 0 for month in MONTH_NAMES}
+
+    for year in get_station_years(max_date, min_date):
+        if year not in sums_by_year:
+            continue
+        for month in MONTH_NAMES:
+            rainy_days_per_month[month] += sums_by_year[year]["rainy_days"][month]
+            total_precipitation_per_month[month] += sums_by_year[year]["precipitation"][month]
 
     for month in MONTH_NAMES:
         try:
@@ -194,62 +287,317 @@ def count_rainy_days(max_date: datetime, min_date: datetime, station_id: str) ->
     return rainy_days_per_month, total_precipitation_per_month
 
 
-def update_db_with_rain(station_data: dict, days_rainy: dict, total_rain: dict) -> None:
+def load_rain_sums(sums_collection: Collection, station_ids: list) -> dict:
     """
-    Adds rainfall data for a given weather station to the database and a CSV file.
+    Loads the rainy days and total precipitation per month that have been stored for each year of
+    the given weather stations.
 
     Parameters:
-        station_data (dict): A dictionary representing the weather station, which must contain keys
-            'city', 'country', 'name', and 'id' with string values.
+        sums_collection (Collection): The collection the sums are stored in.
+        station_ids (list): The IDs of the weather stations.
+
+    Returns:
+        dict: The stored sums in the format returned by sum_rain_by_year.
+    """
+
+    sums = defaultdict(dict)
+
+    for document in sums_collection.find({"station_id": {"$in": station_ids}}):
+        sums[document["station_id"]][document["year"]] = {
+            "rainy_days": document["rainy_days"],
+            "precipitation": document["precipitation"],
+        }
+
+    return dict(sums)
+
+
+def save_rain_sums(sums_collection: Collection, sums: dict) -> None:
+    """
+    Stores the rainy days and total precipitation per month of each year of weather stations, so
+    that later runs do not have to request those years again.
+
+    Parameters:
+        sums_collection (Collection): The collection to store the sums in.
+        sums (dict): The sums in the format returned by sum_rain_by_year.
+
+    Returns:
+        None
+    """
+
+    updates = [
+        UpdateOne(
+            {"station_id": station_id, "year": year},
+            {"$set": {"rainy_days": year_sums["rainy_days"],
+                      "precipitation": year_sums["precipitation"]}},
+            upsert=True
+        )
+        for station_id, sums_by_year in sums.items()
+        for year, year_sums in sums_by_year.items()
+    ]
+
+    write_in_batches(sums_collection, updates, label='station years')
+
+
+def count_rainy_days(max_date: datetime, min_date: datetime, station_id: str,
+                     max_workers: int = DEFAULT_MAX_WORKERS) -> tuple:
+    """
+    Calculates the average number of rainy days and total precipitation per month for a given
+    weather station ID, averaged over 20 years. If there is not 20 years of data then use as many
+    that is available. Assume no rain on any day that has no data. The years are requested
+    concurrently.
+
+    Parameters:
+        max_date (datetime): the latest date to include in the calculations
+        min_date (datetime): the earliest date to include in the calculations
+        station_id (str): the weather station ID to retrieve data from
+        max_workers (int): the maximum number of requests in flight at once
+
+    Returns:
+        tuple: A tuple of two dictionaries, containing the average number of rainy days and total
+        precipitation per month, respectively. The keys of both dictionaries are the abbreviated
+        month names (e.g. "jan", "feb", etc.).
+    """
+
+    station = {"maxdate": max_date, "mindate": min_date, "id": station_id}
+    all_params = plan_rain_requests([station])
+    all_data = fetch_all(get_noaa_client(), "data", all_params, max_workers)
+    sums = sum_rain_by_year(all_params, all_data)
+
+    return aggregate_rainy_days(sums.get(station_id, {}), max_date, min_date)
+
+
+def fetch_rain_for_stations(stations: list, max_workers: int = DEFAULT_MAX_WORKERS,
+                            stations_per_request: int = STATIONS_PER_REQUEST,
+                            sums_collection: Optional[Collection] = None):
+    """
+    Calculates the average number of rainy days and total precipitation per month for many weather
+    stations. Stations are handled in groups of stations_per_request, and the requests of every
+    group share one pool of workers, so the run is only limited by the API quota rather than by the
+    latency of each request.
+
+    If a collection for the sums of each year is given, only the years that are not stored in it
+    yet are requested, and the sums of the newly requested years are stored. The averages are then
+    calculated from the stored sums, so a yearly refresh only needs the newest year of each
+    station.
+
+    Parameters:
+        stations (list[StationRecord]): The weather stations, as yielded by iter_stations.
+        max_workers (int): the maximum number of requests in flight at once
+        stations_per_request (int): the maximum number of stations per request
+        sums_collection (Optional[Collection]): the collection the sums of each year are stored in
+
+    Yields:
+        tuple: The station, its average number of rainy days per month and its average total
+        precipitation per month, in the same order as stations.
+    """
+
+    client = get_noaa_client()
+    groups = [stations[start:start + stations_per_request]
+              for start in range(0, len(stations), stations_per_request)]
+
+    planned = []
+    for group in groups:
+        known_sums = {}
+        if sums_collection is not None:
+            known_sums = load_rain_sums(sums_collection, [station.id for station in group])
+        planned.append((group, known_sums,
+                        plan_rain_requests(group, stations_per_request, known_sums)))
+
+    # The requests of every group share one pool, and stop being sent as soon as one fails
+    results = map_bounded(lambda params: client.get_all_results("data", params),
+                          (params for _, _, all_params in planned for params in all_params),
+                          max_workers)
+
+    try:
+        for group, known_sums, all_params in planned:
+            new_sums = sum_rain_by_year(all_params, [next(results) for _ in all_params])
+            if sums_collection is not None and new_sums:
+                save_rain_sums(sums_collection, new_sums)
+
+            for station in group:
+                sums_by_year = {**known_sums.get(station.id, {}),
+                                **new_sums.get(station.id, {})}
+                rainy_days, total_precipitation = aggregate_rainy_days(
+                    sums_by_year, station.maxdate, station.mindate)
+                yield station, rainy_days, total_precipitation
+    finally:
+        results.close()
+
+
+def build_rain_update(station_data: StationRecord, days_rainy: dict) -> UpdateOne:
+    """
+    Builds a single update that sets the average number of rainy days of every month for the city
+    of a weather station.
+
+    Parameters:
+        station_data (StationRecord): The weather station.
         days_rainy (dict): A dictionary with keys representing the abbreviated month names (e.g.,
             'jan') and values representing the average number of rainy days for each month over a
             span of up to 20 years.
-        total_rain (dict): A dictionary with keys representing the abbreviated month names
-            (e.g., 'jan') and values representing the average total precipitation in millimeters for
-            each month over a span of up to 20 years.
 
     Returns:
-        None
+        UpdateOne: An update of the city's document with one $set covering all months.
     """
 
-    city = station_data['city']
-    country = station_data['country']
-    name = station_data['name']
-    station_id = station_data['id']
+    return UpdateOne(
+        {'city': station_data.city, 'country': station_data.country},
+        {'$set': {f"months.{month}.rain": days_rainy[month] for month in days_rainy}}
+    )
 
-    dbname = get_database()
-    cities_collection = dbname["cities"]
 
-    for month in days_rainy:
-        cities_collection.update_one(
-            {'city': city, 'country': country},
-            {'$set': {f"months.{month}.rain": days_rainy[month]}}
-        )
+def read_rain_rows(filename: str) -> dict:
+    """
+    Reads the rainfall data saved for each weather station by previous runs.
+
+    Parameters:
+        filename (str): The path to the CSV file of rainfall data.
+
+    Returns:
+        dict: The rows of the file keyed by station ID, in the order of the file. Empty if the
+        file does not exist.
+    """
+
+    if not os.path.exists(filename):
+        return {}
+
+    with open(filename, newline="", encoding='UTF-8') as csvfile:
+        return {row[3]: row for row in csv.reader(csvfile) if row}
+
 
-    # Currently only average number of rainy days is written to the database, but store average
-    # total rainfall per month in a csv file just in case it is needed later, that way we won't have
-    # to make all the API calls again
-    with open('rain/csv/rain_improved.csv', mode='a', newline='', encoding='UTF-8') as csv_file:
-        writer = csv.writer(csv_file)
-        writer.writerow([city, country, name, station_id,
-                        days_rainy, total_rain])
+class RainWriter:
+    """
+    Saves rainfall data for weather stations to the database and a CSV file. Database updates are
+    accumulated and sent as a bulk write every flush_every stations and when the writer is closed.
 
+    Every write is keyed by station, so saving a station again replaces its data instead of adding
+    a duplicate. The CSV file is rewritten atomically on each flush, and the checkpoint is only
+    updated once the database and CSV file have been written, so a job that crashes can be resumed
+    from the checkpoint without losing or duplicating any rows.
 
-def add_rain_to_db() -> None:
+    Parameters:
+        cities_collection (Collection): The collection to write the rainy days to.
+        csv_path (str): The path of the CSV file to save the rainfall data of each station to.
+        checkpoint (JobCheckpoint): The checkpoint recording which stations have been saved.
+        flush_every (int): The number of stations to accumulate before writing to the database.
     """
-    Main function that updates the average number of rainy days in the database.
+
+    def __init__(self, cities_collection: Collection, csv_path: str, checkpoint: JobCheckpoint,
+                 flush_every: int = DEFAULT_FLUSH_EVERY):
+        self._cities_collection = cities_collection
+        self._csv_path = csv_path
+        self._checkpoint = checkpoint
+        self._flush_every = flush_every
+        self._rows = read_rain_rows(csv_path)
+        self._updates = []
+        self._station_ids = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # Save what was collected so far even if a later station failed
+        self.flush()
+
+    def add(self, station_data: StationRecord, days_rainy: dict, total_rain: dict) -> None:
+        """
+        Adds the rainfall data of a weather station, writing to the database if enough stations
+        have been accumulated.
 
         Parameters:
+            station_data (StationRecord): The weather station.
+            days_rainy (dict): A dictionary with keys representing the abbreviated month names
+                (e.g., 'jan') and values representing the average number of rainy days for each
+                month over a span of up to 20 years.
+            total_rain (dict): A dictionary with keys representing the abbreviated month names
+                (e.g., 'jan') and values representing the average total precipitation in
+                millimeters for each month over a span of up to 20 years.
+
+        Returns:
+            None
+        """
+
+        self._updates.append(build_rain_update(station_data, days_rainy))
+        self._station_ids.append(station_data.id)
+
+        # Currently only average number of rainy days is written to the database, but store
+        # average total rainfall per month in a csv file just in case it is needed later, that way
+        # we won't have to make all the API calls again
+        self._rows[station_data.id] = [station_data.city, station_data.country,
+                                       station_data.name, station_data.id, str(days_rainy),
+                                       str(total_rain)]
+
+        if len(self._updates) >= self._flush_every:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Writes all accumulated updates to the database in one bulk write, rewrites the CSV file and
+        records the written stations in the checkpoint.
+
+        Returns:
             None
+        """
+
+        if not self._updates:
+            return
+
+        write_in_batches(self._cities_collection, self._updates, len(self._updates),
+                         label='cities')
+        atomic_write(self._csv_path,
+                     lambda csv_file: csv.writer(csv_file).writerows(self._rows.values()))
+        self._checkpoint.mark_completed(self._station_ids)
+        self._updates = []
+        self._station_ids = []
+
+
+def add_rain_to_db(flush_every: int = DEFAULT_FLUSH_EVERY,
+                   max_workers: int = DEFAULT_MAX_WORKERS, incremental: bool = True,
+                   resume: bool = False, restart: bool = False,
+                   cities_collection: Optional[Collection] = None) -> None:
+    """
+    Main function that updates the average number of rainy days in the database. Progress is
+    checkpointed, so a run that fails part way through can be resumed from the last saved station.
+
+        Parameters:
+            flush_every (int): The number of stations to accumulate before writing to the database
+            max_workers (int): The maximum number of NOAA API requests in flight at once
+            incremental (bool): If True, only request the years of each station that have not been
+                summed by a previous run. If False, request every year again.
+            resume (bool): Skip the stations saved by an unfinished previous run
+            restart (bool): Discard the checkpoint of an unfinished previous run and start over
+            cities_collection (Optional[Collection]): The collection to write the rainy days to,
+                the cities collection of the database by default
 
         Returns:
             None
+
+        Raises:
+            UnfinishedJobError: If a previous run did not finish and neither resume nor restart is
+            set.
     """
 
-    all_stations = read_stations("rain/csv/stations_improved.csv")
+    checkpoint = JobCheckpoint(RAIN_CHECKPOINT_PATH)
+    checkpoint.start(resume, restart)
 
-    for station in all_stations:
-        print('Getting info for the following station:', station)
-        rainy_days, total_precipitation = count_rainy_days(station["maxdate"], station["mindate"],
-                                                           station["id"])
-        update_db_with_rain(station, rainy_days, total_precipitation)
+    stations = [station for station in iter_stations(STATIONS_CSV_PATH)
+                if station.id not in checkpoint.completed]
+    if checkpoint.completed:
+        print(f'Resuming rain update, {len(checkpoint.completed)} stations already saved')
+
+    dbname = get_database()
+    if cities_collection is None:
+        cities_collection = dbname["cities"]
+    sums_collection = dbname[RAIN_SUMS_COLLECTION]
+    sums_collection.create_index([("station_id", 1), ("year", 1)], unique=True)
+
+    if not incremental and not checkpoint.completed:
+        sums_collection.delete_many({})
+
+    with RainWriter(cities_collection, RAIN_CSV_PATH, checkpoint,
+                    flush_every) as rain_writer:
+        for station, rainy_days, total_precipitation in fetch_rain_for_stations(
+                stations, max_workers, sums_collection=sums_collection):
+            print('Got info for the following station:', station)
+            rain_writer.add(station, rainy_days, total_precipitation)
+
+    checkpoint.finish()
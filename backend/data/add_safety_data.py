@@ -9,10 +9,17 @@ Functions:
     get_html_table_data(url: str, headers: List[str]) -> pd.DataFrame
         Scrapes an HTML table from the given URL and returns it as a pandas DataFrame
 
-    update_city_safety(collection: Collection, country: str, safety: int) -> None
-        Updates the safety advisory value for a given country in the database.
+    match_countries(advisory_countries: Iterable[str], countries: Iterable[str]) -> tuple
+        Matches the country names of the advisories to the country names of the cities.
 
-    add_safety_to_db() -> None
+    build_safety_updates(safety_by_country: dict, countries: Iterable[str]) -> tuple
+        Builds one update per safety value that sets it for every matched country.
+
+    save_country_safety(collection: Collection, safety_by_country: dict) -> None
+        Replaces the country safety table with the safety value of every advisory country.
+
+    add_safety_to_db(cities_collection: Optional[Collection],
+                     country_safety_collection: Optional[Collection]) -> None
         Main function that updates the safety advisory values in the database.
 
 Example usage:
@@ -21,23 +28,28 @@ Example usage:
     # yarn update-data --safety
 
 Notes:
-    This module requires the get_database module to be imported.
+    This module requires the get_database and bulk_writes modules to be imported.
     The logging level is set to INFO to write to the console.
     Uses the BeautifulSoup and pandas libraries.
-    The database collection name is hardcoded as "cities".
+    The cities are updated in the "cities" collection unless another collection is given.
+    All countries are updated with a single bulk write of at most one UpdateMany per safety value.
+    Advisory countries that match no city are logged as warnings.
+    The safety value of every country is also stored in the country_safety collection, which the
+    month tables are partitioned by, unless another collection is given.
     This module requires an internet connection to scrape the travel advisory table from the 
     Government of Canada website.
 """
 
 import logging
-import sys
-from typing import Collection, List
-sys.path.insert(0, '..')  # Add parent directory to sys.path
+from typing import Collection, Iterable, List, Optional
 
 import pandas as pd
 from bs4 import BeautifulSoup
 import requests
+from pymongo import ReplaceOne, UpdateMany
 from get_database import get_database
+from bulk_writes import write_in_batches
+from month_tables import COUNTRY_SAFETY_COLLECTION
 
 
 def get_html_table_data(url: str, headers: List[str]) -> pd.DataFrame:
@@ -69,33 +81,91 @@ def get_html_table_data(url: str, headers: List[str]) -> pd.DataFrame:
         return None
 
 
-def update_city_safety(collection: Collection, country: str, safety: int):
+def match_countries(advisory_countries: Iterable[str], countries: Iterable[str]) -> tuple:
     '''
-    Updates the safety advisory value for a given country in the database.
+    Matches the country names of the advisories to the country names of the cities, ignoring case
+    and surrounding whitespace.
 
         Parameters:
-            collection (Collection): The pymongo Collection to update.
-            country (str): The name of the country to update.
-            safety (int): The safety advisory value to set for the country.
+            advisory_countries (Iterable[str]): The country names of the advisories.
+            countries (Iterable[str]): The distinct country names of the cities.
+
+        Returns:
+            matches (tuple[dict[str, str], list[str]]): The city country name of each matched
+            advisory country, and the advisory countries that match no city.
+    '''
+
+    countries_by_key = {country.strip().casefold(): country for country in countries if country}
+    matched, unmatched = {}, []
+
+    for advisory_country in advisory_countries:
+        country = countries_by_key.get(advisory_country.strip().casefold())
+        if country is None:
+            unmatched.append(advisory_country)
+        else:
+            matched[advisory_country] = country
+
+    return matched, unmatched
+
+
+def build_safety_updates(safety_by_country: dict, countries: Iterable[str]) -> tuple:
+    '''
+    Builds the updates that set the safety value of every city whose country has an advisory. The
+    countries are grouped by safety value, so there is at most one UpdateMany per value.
+
+        Parameters:
+            safety_by_country (dict[str, int]): The safety value of each advisory country.
+            countries (Iterable[str]): The distinct country names of the cities.
+
+        Returns:
+            updates (tuple[List[UpdateMany], list[str]]): The updates, and the advisory countries
+            that match no city.
+    '''
+
+    matched, unmatched = match_countries(safety_by_country, countries)
+
+    countries_by_safety = {}
+    for advisory_country, country in matched.items():
+        countries_by_safety.setdefault(safety_by_country[advisory_country], []).append(country)
+
+    updates = [UpdateMany({'country': {'$in': sorted(countries)}}, {'$set': {'safety': safety}})
+               for safety, countries in sorted(countries_by_safety.items())]
+
+    return updates, unmatched
+
+
+def save_country_safety(collection: Collection, safety_by_country: dict):
+    '''
+    Replaces the country safety table with the safety value of every advisory country, including
+    countries that have no cities yet.
+
+        Parameters:
+            collection (Collection): The country safety collection.
+            safety_by_country (dict[str, int]): The safety value of each advisory country.
 
         Returns:
             None
     '''
 
-    result = collection.update_many(
-        {'country': country},
-        {'$set': {'safety': safety}}
-    )
-    logging.info(
-        "Updated %s cities for %s safety advisory", result.modified_count, country)
+    write_in_batches(collection, (
+        ReplaceOne({'_id': country}, {'_id': country, 'safety': safety}, upsert=True)
+        for country, safety in safety_by_country.items()), label='country safety values')
 
+    # Countries that no longer have an advisory are removed
+    collection.delete_many({'_id': {'$nin': list(safety_by_country)}})
 
-def add_safety_to_db():
+
+def add_safety_to_db(cities_collection: Optional[Collection] = None,
+                     country_safety_collection: Optional[Collection] = None):
     '''
     Main function that updates the safety advisory values in the database.
 
         Parameters:
-            None
+            cities_collection (Optional[Collection]): The collection to update, the cities
+            collection of the database by default
+            country_safety_collection (Optional[Collection]): The collection to store the safety
+            value of every country in, the country_safety collection of the database of the cities
+            by default
 
         Returns:
             None
@@ -127,9 +197,27 @@ def add_safety_to_db():
     # Remove rows with missing safety values
     table_data = table_data.dropna(subset=['safety'])
 
-    dbname = get_database()
-    cities_collection = dbname["cities"]
-
-    # Update city safety values in the database
-    for _, row in table_data.iterrows():
-        update_city_safety(cities_collection, row['Country'], row['safety'])
+    if cities_collection is None:
+        cities_collection = get_database()["cities"]
+
+    # Only countries that have cities can be updated
+    safety_by_country = {country: int(safety)
+                         for country, safety in zip(table_data['Country'], table_data['safety'])}
+    countries = cities_collection.distinct('country')
+    updates, unmatched = build_safety_updates(safety_by_country, countries)
+
+    # The country safety table uses the spelling of the cities, so the month tables can join it
+    matched, _ = match_countries(safety_by_country, countries)
+    if country_safety_collection is None:
+        country_safety_collection = cities_collection.database[COUNTRY_SAFETY_COLLECTION]
+    save_country_safety(country_safety_collection,
+                        {matched.get(country, country): safety
+                         for country, safety in safety_by_country.items()})
+
+    if unmatched:
+        logging.warning("No cities found for the safety advisories of %s", ', '.join(unmatched))
+
+    # Update city safety values in the database with a single bulk write
+    totals = write_in_batches(cities_collection, updates, label='safety levels')
+    logging.info("Updated safety of %s cities in %s countries", totals['modified'],
+                 len(safety_by_country) - len(unmatched))
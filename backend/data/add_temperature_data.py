@@ -2,17 +2,17 @@
 A module for adding city temperature data to a MongoDB database.
 
 Functions:
-    convert_temp_to_float(temp_string: str) -> float
-        Converts a temperature string to a float in Celsius.
+    convert_temps_to_float(temp_strings: pd.Series) -> pd.Series
+        Converts a Series of temperature strings to floats in Celsius.
 
     fetch_city_data() -> pd.DataFrame
         Fetches city temperature data from a Wikipedia page and returns it as a Pandas DataFrame.
 
-    build_city_dict(row: pd.Series) -> Dict[str, Any]
-        Builds a dictionary representing a city's data in the format expected by the database.
+    build_city_updates(city_data: pd.DataFrame) -> List[UpdateOne]
+        Builds an upsert of each city's temperature data in the format expected by the database.
 
-    add_temperature_to_db() -> None
-        Adds city temperature data to the database.
+    add_temperature_to_db(batch_size: int, cities_collection: Optional[Collection]) -> None
+        Adds city temperature data to the database using batched bulk writes.
 
 Example usage:
     # Should be called through update-data script
@@ -20,41 +20,40 @@ Example usage:
     # yarn update-data --temperature
 
 Notes:
-    This module requires the get_database module to be imported.
+    This module requires the get_database and bulk_writes modules to be imported.
     The Wikipedia page used to fetch the data is hardcoded as WIKI_URL.
     MONTH_NAMES is a list of month names used to extract temperature data from the DataFrame.
-    The database collection name is hardcoded as "cities".
+    The cities are written to the "cities" collection unless another collection is given.
 '''
 
-from typing import Dict, Any
-import sys
-sys.path.insert(0, '..') # Add parent directory to sys.path
+from typing import List, Optional
 
 from get_database import get_database
+from bulk_writes import DEFAULT_BATCH_SIZE, write_in_batches
 import pandas as pd
+from pymongo import UpdateOne
+from pymongo.collection import Collection
 
 WIKI_URL = "https://en.wikipedia.org/wiki/List_of_cities_by_average_temperature"
 MONTH_NAMES = ["Jan", "Feb", "Mar", "Apr", "May",
                "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
 
 
-def convert_temp_to_float(temp_string: str) -> float:
+def convert_temps_to_float(temp_strings: pd.Series) -> pd.Series:
     '''
-    Returns the temperature as a float in celsius.
+    Returns the temperatures as floats in celsius.
 
         Parameters:
-            temp_string (str): A string representing the temperature. The string has the format 
+            temp_strings (Series): Strings representing the temperatures. Each string has the format
             °C (°F).
 
         Returns:
-            temperature (float): The temperature as a float in celsius.
+            temperatures (Series): The temperatures as floats in celsius, NaN where a temperature
+            could not be parsed.
     '''
 
-    try:
-        celsius = temp_string.split(' ')[0].replace("−", "-")
-        return float(celsius)
-    except (ValueError, AttributeError):
-        return float("nan")
+    celsius = temp_strings.astype(str).str.split(' ').str[0].str.replace("−", "-")
+    return pd.to_numeric(celsius, errors='coerce')
 
 
 def fetch_city_data() -> pd.DataFrame:
@@ -71,62 +70,67 @@ def fetch_city_data() -> pd.DataFrame:
     return pd.read_html(WIKI_URL)[0]
 
 
-def build_city_dict(row: pd.Series) -> Dict[str, Any]:
+def build_city_updates(city_data: pd.DataFrame) -> List[UpdateOne]:
     '''
-    Takes a row from the city data DataFrame and returns a dictionary representing the city's data 
-    in the format expected by the database.
+    Takes the city data DataFrame and returns an upsert for each city that sets its temperature
+    for every month in the format expected by the database.
 
         Parameters:
-            row (Series): A row from the city data DataFrame.
+            city_data (DataFrame): The Pandas DataFrame of the Wikipedia page.
 
         Returns:
-            city_dict (Dict[str, Any]): The city's data in the following format:
+            updates (List[UpdateOne]): An upsert for each city, matching on city and country and
+            setting the following fields:
             {
                 city: str
                 country: str
-                months: {
-                    "jan": {
-                        "temperature": float
-                },
-                    <insert other months here>,
-                    "dec": {
-                        "temperature": float
-                }
+                months.jan.temperature: float
+                <insert other months here>
+                months.dec.temperature: float
             }
+            Only the temperature of each month is set so that rain data already in the database
+            is kept.
     '''
 
-    city = row['City']
-    country = row['Country']
-    months = {}
+    # Convert whole columns at once rather than row by row
+    temperatures = {
+        month_name.lower()[:3]: convert_temps_to_float(city_data[month_name]).tolist()
+        for month_name in MONTH_NAMES
+    }
+    month_keys = list(temperatures)
+
+    updates = []
+
+    for city, country, *month_temperatures in zip(city_data['City'], city_data['Country'],
+                                                  *temperatures.values()):
+        fields = {"city": city, "country": country}
+        for month, temperature in zip(month_keys, month_temperatures):
+            fields[f"months.{month}.temperature"] = temperature
 
-    for month_name in MONTH_NAMES:
-        month_data = {"temperature": convert_temp_to_float(row[month_name])}
-        months[month_name.lower()[:3]] = month_data
+        updates.append(UpdateOne({"city": city, "country": country}, {"$set": fields},
+                                 upsert=True))
 
-    return {"city": city, "country": country, "months": months}
+    return updates
 
 
-def add_temperature_to_db():
+def add_temperature_to_db(batch_size: int = DEFAULT_BATCH_SIZE,
+                          cities_collection: Optional[Collection] = None):
     '''
-    Adds city temperature data to the database.
+    Adds city temperature data to the database using batched bulk writes.
 
         Parameters:
-            None
+            batch_size (int): The maximum number of cities to write per bulk write
+            cities_collection (Optional[Collection]): The collection to write the cities to,
+            the cities collection of the database by default
 
         Returns:
             None
     '''
 
-    dbname = get_database()
-    cities_collection = dbname["cities"]
+    if cities_collection is None:
+        cities_collection = get_database()["cities"]
 
     city_data = fetch_city_data()
 
-    for _, row in city_data.iterrows():
-        city_dict = build_city_dict(row)
-
-        cities_collection.update_one(
-            {"city": city_dict["city"], "country": city_dict["country"]},
-            {"$set": city_dict},
-            upsert=True,
-        )
+    write_in_batches(cities_collection, build_city_updates(city_data), batch_size,
+                     label='cities')
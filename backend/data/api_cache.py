@@ -0,0 +1,226 @@
+"""
+This module provides a persistent cache of raw responses from the remote APIs used by the data
+scripts (NOAA and OpenCage), so that re-running a script after a crash or a change to how the data
+is scored does not spend any API quota on data that has already been retrieved.
+
+Responses are stored in a SQLite database, compressed, under a key derived from the endpoint and
+the canonicalized request parameters. Entries can expire after a time to live, can be invalidated
+per endpoint, and the cache can be put in offline mode where it only serves stored responses.
+
+Classes:
+    ApiCache
+        A persistent, content addressed cache of API responses.
+
+    CacheMissError
+        Raised in offline mode when a response is not in the cache.
+
+Functions:
+    make_key(endpoint: str, params: dict) -> str
+        Returns the cache key of a request.
+
+    get_api_cache() -> ApiCache
+        Returns the cache shared by all data scripts, configured from the environment.
+
+Notes:
+    The shared cache is configured with the following optional environment variables:
+    API_CACHE_PATH (defaults to cache/api_cache.sqlite3 next to this module), API_CACHE_TTL in
+    seconds (defaults to never expiring) and API_CACHE_OFFLINE (set to 1 to only use the cache).
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Callable, Optional
+
+from dotenv import load_dotenv
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache",
+                            "api_cache.sqlite3")
+
+
+class CacheMissError(Exception):
+    """
+    Raised in offline mode when a response is not in the cache.
+    """
+
+
+def make_key(endpoint: str, params: dict) -> str:
+    """
+    Returns the cache key of a request. Parameters are canonicalized so that the same request
+    always has the same key, regardless of the order the parameters were given in.
+
+    Parameters:
+        endpoint (str): The name of the endpoint, e.g. "noaa/data".
+        params (dict): The parameters of the request.
+
+    Returns:
+        str: A SHA-256 hex digest of the endpoint and parameters.
+    """
+
+    canonical = json.dumps([endpoint, params], sort_keys=True, separators=(",", ":"),
+                           default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ApiCache:
+    """
+    A persistent, content addressed cache of API responses stored in a SQLite database. Can be
+    shared between threads.
+
+    Parameters:
+        path (str): The path of the SQLite database file, or ":memory:".
+        ttl (Optional[float]): The number of seconds a response is kept for, or None to keep
+            responses until they are invalidated.
+        offline (bool): If True, never call the API and raise CacheMissError for responses that
+            are not in the cache.
+        clock (Callable[[], float]): Returns the current time in seconds since the epoch.
+    """
+
+    def __init__(self, path: str = DEFAULT_PATH, ttl: Optional[float] = None,
+                 offline: bool = False, clock: Callable[[], float] = time.time):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self.ttl = ttl
+        self.offline = offline
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, endpoint TEXT NOT NULL, params TEXT NOT NULL, "
+            "created REAL NOT NULL, body BLOB NOT NULL)"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS responses_endpoint ON responses (endpoint)")
+        self._connection.commit()
+
+    def get(self, endpoint: str, params: dict) -> Optional[Any]:
+        """
+        Returns the cached response of a request, or None if it is not cached or has expired.
+
+        Parameters:
+            endpoint (str): The name of the endpoint, e.g. "noaa/data".
+            params (dict): The parameters of the request.
+
+        Returns:
+            Optional[Any]: The cached response.
+        """
+
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT created, body FROM responses WHERE key = ?",
+                (make_key(endpoint, params),)
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        created, body = row
+        if self.ttl is not None and created + self.ttl < self._clock():
+            return None
+
+        return json.loads(zlib.decompress(body))
+
+    def put(self, endpoint: str, params: dict, response: Any) -> None:
+        """
+        Stores the response of a request, replacing any previous response.
+
+        Parameters:
+            endpoint (str): The name of the endpoint, e.g. "noaa/data".
+            params (dict): The parameters of the request.
+            response (Any): The response, which must be JSON serializable.
+
+        Returns:
+            None
+        """
+
+        body = zlib.compress(json.dumps(response).encode("utf-8"))
+
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses (key, endpoint, params, created, body) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (make_key(endpoint, params), endpoint,
+                 json.dumps(params, sort_keys=True, default=str), self._clock(), body)
+            )
+            self._connection.commit()
+
+    def cached(self, endpoint: str, params: dict, fetch: Callable[[], Any]) -> Any:
+        """
+        Returns the cached response of a request, or calls fetch to get it and stores it.
+
+        Parameters:
+            endpoint (str): The name of the endpoint, e.g. "noaa/data".
+            params (dict): The parameters of the request.
+            fetch (Callable[[], Any]): Sends the request and returns its response.
+
+        Returns:
+            Any: The cached or fetched response.
+
+        Raises:
+            CacheMissError: If the cache is offline and the response is not cached.
+        """
+
+        response = self.get(endpoint, params)
+        if response is not None:
+            return response
+
+        if self.offline:
+            raise CacheMissError(f"No cached response for {endpoint} with params {params}.")
+
+        response = fetch()
+        self.put(endpoint, params, response)
+        return response
+
+    def invalidate(self, endpoint: Optional[str] = None) -> int:
+        """
+        Removes the cached responses of an endpoint, or of every endpoint.
+
+        Parameters:
+            endpoint (Optional[str]): The name of the endpoint, or None for all endpoints.
+
+        Returns:
+            int: The number of responses removed.
+        """
+
+        with self._lock:
+            if endpoint is None:
+                cursor = self._connection.execute("DELETE FROM responses")
+            else:
+                cursor = self._connection.execute(
+                    "DELETE FROM responses WHERE endpoint = ?", (endpoint,))
+            self._connection.commit()
+
+        return cursor.rowcount
+
+
+_api_cache = None
+_api_cache_lock = threading.Lock()
+
+
+def get_api_cache() -> ApiCache:
+    """
+    Returns the cache shared by all data scripts, creating it on first use from the environment.
+
+    Returns:
+        ApiCache: The shared cache.
+    """
+
+    global _api_cache
+
+    with _api_cache_lock:
+        if _api_cache is None:
+            load_dotenv()
+            ttl = os.getenv('API_CACHE_TTL')
+            _api_cache = ApiCache(
+                path=os.getenv('API_CACHE_PATH') or DEFAULT_PATH,
+                ttl=float(ttl) if ttl else None,
+                offline=os.getenv('API_CACHE_OFFLINE') == '1',
+            )
+
+    return _api_cache
@@ -0,0 +1,155 @@
+"""
+This module provides durable checkpoints for long running data jobs, so that a job that crashes
+part way through (e.g. because the API quota ran out) can be resumed without redoing the work that
+was already saved.
+
+A checkpoint records the keys of the items a job has completed in a JSON file. The file is always
+replaced atomically, so a crash while it is being written leaves the previous checkpoint intact.
+
+Classes:
+    JobCheckpoint
+        The completed items of a job, stored in a JSON file.
+
+    UnfinishedJobError
+        Raised when a job is started while a checkpoint of an unfinished run exists.
+
+Functions:
+    atomic_write(path: str, write: Callable[[TextIO], None]) -> None
+        Writes a text file by writing a temporary file and renaming it over the original.
+"""
+
+import json
+import os
+import tempfile
+from datetime import datetime
+from typing import Callable, Iterable, TextIO
+
+CHECKPOINT_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache")
+
+
+class UnfinishedJobError(Exception):
+    """
+    Raised when a job is started while a checkpoint of an unfinished run exists, and it was not
+    specified whether to resume or restart the job.
+    """
+
+
+def atomic_write(path: str, write: Callable[[TextIO], None]) -> None:
+    """
+    Writes a text file by writing a temporary file in the same directory and renaming it over the
+    original, so that readers see either the old or the new file and never a partial one.
+
+    Parameters:
+        path (str): The path of the file to write.
+        write (Callable[[TextIO], None]): Writes the content to the open temporary file.
+
+    Returns:
+        None
+    """
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    file_descriptor, temporary_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+
+    try:
+        with os.fdopen(file_descriptor, "w", newline="", encoding="UTF-8") as file:
+            write(file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary_path, path)
+    except BaseException:
+        os.remove(temporary_path)
+        raise
+
+
+class JobCheckpoint:
+    """
+    The keys of the items a job has completed, stored in a JSON file.
+
+    Parameters:
+        path (str): The path of the checkpoint file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.completed = set()
+        self.started = None
+
+    def exists(self) -> bool:
+        """
+        Returns whether a checkpoint of an unfinished run is stored.
+
+        Returns:
+            bool: True if the checkpoint file exists.
+        """
+
+        return os.path.exists(self.path)
+
+    def start(self, resume: bool = False, restart: bool = False) -> None:
+        """
+        Starts a run of the job, loading the stored checkpoint if the run is resumed.
+
+        Parameters:
+            resume (bool): Continue from the stored checkpoint, if there is one.
+            restart (bool): Discard the stored checkpoint and start from the first item.
+
+        Returns:
+            None
+
+        Raises:
+            UnfinishedJobError: If a checkpoint is stored and neither resume nor restart is set.
+        """
+
+        if self.exists() and not restart:
+            if not resume:
+                raise UnfinishedJobError(
+                    f"An unfinished run was checkpointed in {self.path}. "
+                    "Resume it with --resume or discard it with --restart.")
+
+            with open(self.path, encoding="UTF-8") as file:
+                data = json.load(file)
+            self.completed = set(data["completed"])
+            self.started = data["started"]
+            return
+
+        self.completed = set()
+        self.started = datetime.now().isoformat(timespec="seconds")
+        self.save()
+
+    def mark_completed(self, keys: Iterable[str]) -> None:
+        """
+        Records that items have been completed and saves the checkpoint. Should only be called
+        once the results of the items have been saved.
+
+        Parameters:
+            keys (Iterable[str]): The keys of the completed items.
+
+        Returns:
+            None
+        """
+
+        self.completed.update(keys)
+        self.save()
+
+    def save(self) -> None:
+        """
+        Atomically writes the checkpoint to its file.
+
+        Returns:
+            None
+        """
+
+        data = {"started": self.started, "completed": sorted(self.completed)}
+        atomic_write(self.path, lambda file: json.dump(data, file))
+
+    def finish(self) -> None:
+        """
+        Removes the checkpoint once the job has completed every item, so that the next run starts
+        from the beginning.
+
+        Returns:
+            None
+        """
+
+        if self.exists():
+            os.remove(self.path)
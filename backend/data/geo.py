@@ -0,0 +1,132 @@
+"""
+This module provides NumPy versions of the distance and scoring calculations used to pick the
+weather station of each city. Every function works on whole arrays at once, so all city and station
+pairs can be rescored without a Python loop, e.g. after changing the scoring formula.
+
+Functions:
+    haversine_distances(lat1: ArrayLike, lon1: ArrayLike, lat2: ArrayLike,
+                        lon2: ArrayLike) -> np.ndarray
+        Calculates the great circle distances between two sets of locations, broadcasting their
+        shapes.
+
+    distance_matrix(city_coordinates: ArrayLike, station_coordinates: ArrayLike) -> np.ndarray
+        Calculates the distance from every city to every station.
+
+    score_stations(distances: ArrayLike, coverage: ArrayLike, min_distance: float) -> np.ndarray
+        Scores stations by their data coverage divided by their distance to the city.
+
+    best_stations(scores: np.ndarray) -> np.ndarray
+        Returns the index of the station with the highest score for each city.
+
+Notes:
+    Distances are in kilometers and use the same Earth radius as calculate_distance in
+    rain/get_stations.py, so both give the same results.
+"""
+
+from typing import Union
+
+import numpy as np
+
+ArrayLike = Union[float, list, np.ndarray]
+
+# Earth radius in km, see https://en.wikipedia.org/wiki/Earth_radius
+EARTH_RADIUS_KM = 6378
+
+# Stations closer than this are scored as if they were this far away, so that a station at the
+# exact coordinates of a city does not get an infinite score. It is kept well below the distances
+# between stations so that closer stations still score higher, e.g. at 0.2 km versus 0.9 km.
+MIN_DISTANCE_KM = 0.001
+
+
+def haversine_distances(lat1: ArrayLike, lon1: ArrayLike, lat2: ArrayLike,
+                        lon2: ArrayLike) -> np.ndarray:
+    """
+    Calculates the great circle distances between two sets of locations using the Haversine
+    formula. The arguments are broadcast against each other like any NumPy operation.
+
+    Parameters:
+        lat1 (ArrayLike): The latitudes of the first locations, in decimal degrees.
+        lon1 (ArrayLike): The longitudes of the first locations, in decimal degrees.
+        lat2 (ArrayLike): The latitudes of the second locations, in decimal degrees.
+        lon2 (ArrayLike): The longitudes of the second locations, in decimal degrees.
+
+    Returns:
+        np.ndarray: The distances between the locations, in kilometers.
+
+    References:
+        [1] Haversine formula: https://en.wikipedia.org/wiki/Haversine_formula
+    """
+
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(value, dtype=float))
+                              for value in (lat1, lon1, lat2, lon2))
+
+    a = np.sin((lat2 - lat1) / 2) ** 2 + \
+        np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    # Rounding can push a slightly above 1 for antipodal points
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def distance_matrix(city_coordinates: ArrayLike, station_coordinates: ArrayLike) -> np.ndarray:
+    """
+    Calculates the distance from every city to every station.
+
+    Parameters:
+        city_coordinates (ArrayLike): The latitude and longitude of each city, with shape
+            (cities, 2).
+        station_coordinates (ArrayLike): The latitude and longitude of each station, with shape
+            (stations, 2).
+
+    Returns:
+        np.ndarray: The distances in kilometers, with shape (cities, stations).
+    """
+
+    cities = np.asarray(city_coordinates, dtype=float).reshape(-1, 2)
+    stations = np.asarray(station_coordinates, dtype=float).reshape(-1, 2)
+
+    return haversine_distances(cities[:, 0, np.newaxis], cities[:, 1, np.newaxis],
+                               stations[np.newaxis, :, 0], stations[np.newaxis, :, 1])
+
+
+def score_stations(distances: ArrayLike, coverage: ArrayLike,
+                   min_distance: float = MIN_DISTANCE_KM) -> np.ndarray:
+    """
+    Scores stations by their data coverage divided by their distance to the city, so that close
+    stations with few gaps in their data score highest.
+
+    Parameters:
+        distances (ArrayLike): The distances of the stations to the city in kilometers. Can be a
+            distance matrix with one row per city.
+        coverage (ArrayLike): The fraction of days each station has data for, broadcast against
+            distances.
+        min_distance (float): Distances below this are raised to it before dividing.
+
+    Returns:
+        np.ndarray: The score of each station, with the shape of distances.
+    """
+
+    return np.asarray(coverage, dtype=float) / np.maximum(np.asarray(distances, dtype=float),
+                                                          min_distance)
+
+
+def best_stations(scores: np.ndarray) -> np.ndarray:
+    """
+    Returns the index of the station with the highest score for each city. Stations with a NaN
+    score, e.g. because their coordinates are missing, are never chosen.
+
+    Parameters:
+        scores (np.ndarray): The scores with shape (cities, stations), or (stations,) for a single
+            city.
+
+    Returns:
+        np.ndarray: The index of the best station of each city, or -1 for cities without any
+        station that has a score. A scalar array for a single city.
+    """
+
+    scores = np.asarray(scores, dtype=float)
+    if scores.shape[-1] == 0:
+        return np.full(scores.shape[:-1], -1)
+
+    valid = ~np.isnan(scores)
+    best = np.argmax(np.where(valid, scores, -np.inf), axis=-1)
+
+    return np.where(valid.any(axis=-1), best, -1)
@@ -0,0 +1,287 @@
+"""
+This module provides the geocoding shared by the station discovery scripts. The coordinates and
+bounds of each city are stored in its document in the cities collection, so a geocoding provider is
+only called for cities that have never been geocoded.
+
+Providers implement a small interface, so the OpenCage API can be swapped for another service or
+for a static table of locations, e.g. in tests or to run the scripts without an API key.
+
+Classes:
+    Location
+        The coordinates and bounding box of a place.
+
+    GeocodingProvider
+        The interface of a geocoding service.
+
+    OpenCageProvider
+        Geocodes places with the OpenCage API.
+
+    StaticProvider
+        Geocodes places from a fixed table of locations.
+
+    Geocoder
+        Looks up the location of cities, storing the results in the cities collection.
+
+Functions:
+    get_geocoder() -> Geocoder
+        Returns the geocoder shared by the station discovery scripts.
+
+Notes:
+    The location of a city is stored in the 'location' field of its document. A location of None
+    means that the provider could not find the city, so it is not looked up again.
+"""
+
+import os
+import threading
+from typing import Iterable, NamedTuple, Optional, Tuple
+
+from dotenv import load_dotenv
+from pymongo import UpdateOne
+from pymongo.collection import Collection
+
+from bulk_writes import write_in_batches
+from data.api_cache import ApiCache, get_api_cache
+from data.noaa_client import TokenBucket
+from get_database import get_database
+
+# The free OpenCage plan allows one request per second
+OPENCAGE_REQUESTS_PER_SECOND = 1
+
+
+class Location(NamedTuple):
+    """
+    The coordinates and bounding box of a place, in decimal degrees.
+
+    Attributes:
+        lat (float): The latitude of the place.
+        lng (float): The longitude of the place.
+        bounds (Optional[Tuple[float, float, float, float]]): The northeast latitude, northeast
+            longitude, southwest latitude and southwest longitude of the place, if known.
+    """
+
+    lat: float
+    lng: float
+    bounds: Optional[Tuple[float, float, float, float]] = None
+
+    def to_document(self) -> dict:
+        """
+        Returns the location in the format stored in the cities collection.
+
+        Returns:
+            dict: The 'lat', 'lng' and 'bounds' of the location.
+        """
+
+        return {'lat': self.lat, 'lng': self.lng,
+                'bounds': list(self.bounds) if self.bounds else None}
+
+    @classmethod
+    def from_document(cls, document: Optional[dict]) -> Optional['Location']:
+        """
+        Creates a location from the format stored in the cities collection.
+
+        Parameters:
+            document (Optional[dict]): The stored location.
+
+        Returns:
+            Optional[Location]: The location, or None if none is stored.
+        """
+
+        if not document:
+            return None
+
+        bounds = document.get('bounds')
+        return cls(document['lat'], document['lng'], tuple(bounds) if bounds else None)
+
+
+class GeocodingProvider:
+    """
+    The interface of a geocoding service. Subclasses must implement geocode, and can override
+    geocode_many if the service can geocode several places in one request.
+    """
+
+    def geocode(self, query: str) -> Optional[Location]:
+        """
+        Finds the location of a place.
+
+        Parameters:
+            query (str): The place to find, e.g. "Algiers, Algeria".
+
+        Returns:
+            Optional[Location]: The location, or None if the place could not be found.
+        """
+
+        raise NotImplementedError
+
+    def geocode_many(self, queries: Iterable[str]) -> list:
+        """
+        Finds the location of several places.
+
+        Parameters:
+            queries (Iterable[str]): The places to find.
+
+        Returns:
+            list[Optional[Location]]: The location of each place, in the same order.
+        """
+
+        return [self.geocode(query) for query in queries]
+
+
+class OpenCageProvider(GeocodingProvider):
+    """
+    Geocodes places with the OpenCage API, respecting its rate limit.
+    API documentation: https://opencagedata.com/api
+
+    Parameters:
+        api_key (str): The OpenCage API key.
+        cache (Optional[ApiCache]): A cache of raw responses, shared with earlier runs.
+        requests_per_second (float): The maximum number of requests per second.
+    """
+
+    def __init__(self, api_key: str, cache: Optional[ApiCache] = None,
+                 requests_per_second: float = OPENCAGE_REQUESTS_PER_SECOND):
+        self._api_key = api_key
+        self._cache = cache
+        self._limiter = TokenBucket(requests_per_second, 1)
+        self._client = None
+        self._lock = threading.Lock()
+
+    def _geocode_raw(self, query: str) -> list:
+        with self._lock:
+            if self._client is None:
+                # Imported here so the other providers work without the opencage package
+                from opencage.geocoder import OpenCageGeocode
+                self._client = OpenCageGeocode(self._api_key)
+
+        self._limiter.acquire()
+        return self._client.geocode(query)
+
+    def geocode(self, query: str) -> Optional[Location]:
+        if self._cache is not None:
+            results = self._cache.cached("opencage/geocode", {"query": query},
+                                         lambda: self._geocode_raw(query))
+        else:
+            results = self._geocode_raw(query)
+
+        if not results:
+            return None
+
+        try:
+            geometry = results[0]['geometry']
+        except KeyError:
+            return None
+
+        bounds = results[0].get('bounds')
+        if bounds:
+            bounds = (bounds['northeast']['lat'], bounds['northeast']['lng'],
+                      bounds['southwest']['lat'], bounds['southwest']['lng'])
+
+        return Location(geometry['lat'], geometry['lng'], bounds or None)
+
+
+class StaticProvider(GeocodingProvider):
+    """
+    Geocodes places from a fixed table of locations.
+
+    Parameters:
+        locations (dict[str, Location]): The location of each query.
+    """
+
+    def __init__(self, locations: dict):
+        self._locations = locations
+        self.queries = []
+
+    def geocode(self, query: str) -> Optional[Location]:
+        self.queries.append(query)
+        return self._locations.get(query)
+
+
+class Geocoder:
+    """
+    Looks up the location of cities. Locations are read from the cities collection, and only cities
+    that have never been geocoded are sent to the provider. New locations are stored in the cities
+    collection for later runs.
+
+    Parameters:
+        provider (GeocodingProvider): The geocoding service to use on a cache miss.
+        cities_collection (Collection): The cities collection the locations are stored in.
+    """
+
+    def __init__(self, provider: GeocodingProvider, cities_collection: Collection):
+        self._provider = provider
+        self._cities_collection = cities_collection
+
+    def locate(self, city: str, country: str) -> Optional[Location]:
+        """
+        Returns the location of a city.
+
+        Parameters:
+            city (str): The name of the city.
+            country (str): The name of the country.
+
+        Returns:
+            Optional[Location]: The location, or None if the city could not be geocoded.
+        """
+
+        return self.locate_many([(city, country)])[(city, country)]
+
+    def locate_many(self, cities: Iterable[Tuple[str, str]]) -> dict:
+        """
+        Returns the location of several cities, reading the stored locations with one query and
+        geocoding the missing ones as a batch.
+
+        Parameters:
+            cities (Iterable[Tuple[str, str]]): The name and country of each city.
+
+        Returns:
+            dict[Tuple[str, str], Optional[Location]]: The location of each city.
+        """
+
+        cities = list(dict.fromkeys(cities))
+        locations = {}
+
+        documents = self._cities_collection.find(
+            {'city': {'$in': [city for city, _ in cities]}, 'location': {'$exists': True}},
+            {'_id': 0, 'city': 1, 'country': 1, 'location': 1})
+        for document in documents:
+            key = (document['city'], document['country'])
+            locations[key] = Location.from_document(document['location'])
+
+        missing = [key for key in cities if key not in locations]
+        if missing:
+            found = self._provider.geocode_many(f"{city}, {country}" for city, country in missing)
+            updates = []
+
+            for (city, country), location in zip(missing, found):
+                locations[(city, country)] = location
+                updates.append(UpdateOne(
+                    {'city': city, 'country': country},
+                    {'$set': {'location': location.to_document() if location else None}}))
+
+            write_in_batches(self._cities_collection, updates, label='city locations')
+
+        return {key: locations[key] for key in cities}
+
+
+_geocoder = None
+_geocoder_lock = threading.Lock()
+
+
+def get_geocoder() -> Geocoder:
+    """
+    Returns the geocoder shared by the station discovery scripts, creating it on first use. It
+    geocodes with the OpenCage API key from the environment and stores locations in the cities
+    collection.
+
+    Returns:
+        Geocoder: The shared geocoder.
+    """
+
+    global _geocoder
+
+    with _geocoder_lock:
+        if _geocoder is None:
+            load_dotenv()
+            provider = OpenCageProvider(os.getenv('OPENCAGE_API_KEY'), cache=get_api_cache())
+            _geocoder = Geocoder(provider, get_database()["cities"])
+
+    return _geocoder
@@ -0,0 +1,333 @@
+"""
+This module provides a client for the NOAA Climate Data Online (CDO) API that can be shared by many
+threads. Every request goes through token bucket rate limiters that respect the API quotas, and
+failed requests are retried with exponential backoff in one place.
+
+API documentation: https://www.ncdc.noaa.gov/cdo-web/webservices/v2
+
+Classes:
+    TokenBucket
+        A thread safe token bucket rate limiter.
+
+    NoaaClient
+        Sends rate limited requests to the CDO API and retries failed requests.
+
+Functions:
+    get_ncei_token() -> Optional[str]
+        Returns the NCEI API token from the environment.
+
+    get_noaa_client() -> NoaaClient
+        Returns the client shared by every data script, so all NOAA requests count against one
+        quota.
+
+    map_bounded(function: Callable, items: Iterable, max_workers: int) -> Iterator
+        Calls a function on many items concurrently, with at most max_workers calls started ahead
+        of the results consumed.
+
+    fetch_all(client: NoaaClient, endpoint: str, all_params: list, max_workers: int) -> list
+        Sends many paged requests to the same endpoint concurrently and returns their results in
+        order.
+
+Notes:
+    The CDO API allows 5 requests per second and 10,000 requests per day for each token.
+    The base URL can be changed, e.g. to point the client at a local stub server in tests.
+"""
+
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Callable, Iterable, Iterator, Optional
+
+import requests
+from dotenv import load_dotenv
+
+from data.api_cache import ApiCache, get_api_cache
+
+NOAA_API_URL = "https://www.ncdc.noaa.gov/cdo-web/api/v2"
+
+# Quotas of the CDO API for each token
+REQUESTS_PER_SECOND = 5
+REQUESTS_PER_DAY = 10000
+
+# The largest number of results the CDO API returns per request
+MAX_PAGE_SIZE = 1000
+
+# Status codes that are worth retrying: rate limited or a temporary server error
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+def get_ncei_token() -> Optional[str]:
+    """
+    Returns the NCEI API token, loading the .env file first so the token can be set there.
+
+    Returns:
+        Optional[str]: The value of the NCEI_TOKEN environment variable.
+    """
+
+    load_dotenv()
+    return os.getenv('NCEI_TOKEN')
+
+
+class TokenBucket:
+    """
+    A thread safe token bucket rate limiter. The bucket holds up to capacity tokens, gains rate
+    tokens per second, and every request takes one token, waiting until one is available.
+
+    Parameters:
+        rate (float): The number of tokens added per second.
+        capacity (float): The maximum number of tokens in the bucket, i.e. the largest burst.
+        clock (Callable[[], float]): Returns the current time in seconds.
+        sleep (Callable[[float], None]): Waits for the given number of seconds.
+    """
+
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        self._rate = rate
+        self._capacity = capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """
+        Takes a token from the bucket, waiting until one is available.
+
+        Returns:
+            None
+        """
+
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._tokens = min(self._capacity,
+                                   self._tokens + (now - self._updated) * self._rate)
+                self._updated = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                wait = (1 - self._tokens) / self._rate
+
+            # Sleep outside of the lock so that other threads can keep refilling the bucket
+            self._sleep(wait)
+
+
+class NoaaClient:
+    """
+    Sends rate limited requests to the CDO API and retries failed requests with exponential
+    backoff. A single client should be shared by every thread that uses the same token, so that
+    all requests count against the same quota.
+
+    Parameters:
+        token (str): The NCEI API token.
+        base_url (str): The base URL of the API.
+        limiters (Optional[list[TokenBucket]]): The rate limiters every request has to pass.
+            Defaults to the per second and per day quotas of the API.
+        max_retries (int): The number of times a failed request is retried.
+        backoff (float): The number of seconds to wait before the first retry. The wait doubles
+            after every retry and some random jitter is added.
+        timeout (float): The number of seconds to wait for a response.
+        sleep (Callable[[float], None]): Waits for the given number of seconds between retries.
+        cache (Optional[ApiCache]): A cache of raw responses. Cached requests do not count
+            against the quota.
+    """
+
+    def __init__(self, token: str, base_url: str = NOAA_API_URL,
+                 limiters: Optional[list] = None, max_retries: int = 4, backoff: float = 5,
+                 timeout: float = 20, sleep: Callable[[float], None] = time.sleep,
+                 cache: Optional[ApiCache] = None):
+        self._token = token
+        self._base_url = base_url.rstrip('/')
+        self._limiters = limiters if limiters is not None else [
+            TokenBucket(REQUESTS_PER_SECOND, REQUESTS_PER_SECOND),
+            TokenBucket(REQUESTS_PER_DAY / 86400, REQUESTS_PER_DAY),
+        ]
+        self._max_retries = max_retries
+        self._backoff = backoff
+        self._timeout = timeout
+        self._sleep = sleep
+        self._cache = cache
+        self._local = threading.local()
+
+    def _session(self) -> requests.Session:
+        # Sessions are not thread safe, so each thread keeps its own pooled session
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.headers['token'] = self._token or ''
+            self._local.session = session
+        return session
+
+    def get(self, endpoint: str, params: dict) -> dict:
+        """
+        Sends a GET request to an endpoint of the API and returns the JSON response. Requests that
+        time out, fail to connect, are rate limited or hit a server error are retried. If the
+        client has a cache, responses are served from and stored in it.
+
+        Parameters:
+            endpoint (str): The endpoint to request, e.g. "data" or "stations".
+            params (dict): A dictionary of parameters to pass to the API endpoint.
+
+        Returns:
+            dict: The JSON response of the API.
+
+        Raises:
+            ValueError: If the request failed, or still failed after all retries.
+            requests.exceptions.RequestException: If the request could not be sent after all
+                retries.
+        """
+
+        if self._cache is not None:
+            return self._cache.cached(f"noaa/{endpoint}", params,
+                                      lambda: self._send(endpoint, params))
+
+        return self._send(endpoint, params)
+
+    def _send(self, endpoint: str, params: dict) -> dict:
+        url = f"{self._base_url}/{endpoint}"
+
+        for attempt in range(self._max_retries + 1):
+            for limiter in self._limiters:
+                limiter.acquire()
+
+            try:
+                response = self._session().get(url, params=params, timeout=self._timeout)
+            except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as error:
+                if attempt == self._max_retries:
+                    raise
+                logging.warning("Request to %s failed: %s. Retrying.", endpoint, error)
+            else:
+                if response.status_code == 200:
+                    return response.json()
+                if response.status_code not in RETRY_STATUS_CODES or \
+                        attempt == self._max_retries:
+                    raise ValueError(
+                        f"Failed to get {endpoint} data: status {response.status_code}.")
+                logging.warning("Request to %s returned status %s. Retrying.", endpoint,
+                                response.status_code)
+
+            self._sleep(self._backoff * 2 ** attempt + random.uniform(0, 1))
+
+        raise ValueError(f"Failed to get {endpoint} data.")
+
+    def get_results(self, endpoint: str, params: dict) -> list:
+        """
+        Sends a GET request to an endpoint of the API and returns the list of results.
+
+        Parameters:
+            endpoint (str): The endpoint to request, e.g. "data" or "stations".
+            params (dict): A dictionary of parameters to pass to the API endpoint.
+
+        Returns:
+            list: The results of the response, or an empty list if there are none.
+        """
+
+        return self.get(endpoint, params).get("results", [])
+
+    def get_all_results(self, endpoint: str, params: dict, page_size: int = MAX_PAGE_SIZE) -> list:
+        """
+        Sends GET requests to an endpoint of the API, paging through the results with the offset
+        parameter until every result reported by the response metadata has been retrieved.
+
+        Parameters:
+            endpoint (str): The endpoint to request, e.g. "data" or "stations".
+            params (dict): A dictionary of parameters to pass to the API endpoint. Any limit,
+                offset or includemetadata parameters are replaced.
+            page_size (int): The number of results to request per page.
+
+        Returns:
+            list: The results of every page.
+        """
+
+        params = {**params, "limit": page_size, "includemetadata": "true"}
+        results = []
+        # Offsets of the CDO API start at 1
+        offset = 1
+
+        while True:
+            response = self.get(endpoint, {**params, "offset": offset})
+            page = response.get("results", [])
+            count = response.get("metadata", {}).get("resultset", {}).get("count", 0)
+
+            results.extend(page)
+            offset += len(page)
+
+            if not page or offset > count:
+                return results
+
+
+_noaa_client = None
+_noaa_client_lock = threading.Lock()
+
+
+def get_noaa_client() -> NoaaClient:
+    """
+    Returns the NOAA API client shared by every data script, creating it on first use. All requests
+    go through its rate limiters, so they count against one quota, and responses are stored in the
+    shared API cache so that re-runs do not request them again.
+
+    Returns:
+        NoaaClient: A rate limited client for the NOAA API.
+    """
+
+    global _noaa_client
+
+    with _noaa_client_lock:
+        if _noaa_client is None:
+            _noaa_client = NoaaClient(get_ncei_token(), cache=get_api_cache())
+
+    return _noaa_client
+
+
+def map_bounded(function: Callable, items: Iterable, max_workers: int = 5) -> Iterator:
+    """
+    Calls a function on many items with a pool of threads and yields the results in the order of
+    the items. A call is only started once the result of an earlier one has been consumed, so at
+    most max_workers calls are in flight. When a call fails, e.g. because the daily quota is used
+    up, its error is raised as soon as the calls in flight have finished, and no more requests are
+    sent.
+
+    Parameters:
+        function (Callable[[Any], Any]): The function to call.
+        items (Iterable): The argument of each call.
+        max_workers (int): The maximum number of calls in flight at once.
+
+    Yields:
+        Any: The result of each call.
+    """
+
+    items = iter(items)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque(executor.submit(function, item) for item in islice(items, max_workers))
+        while pending:
+            result = pending.popleft().result()
+            pending.extend(executor.submit(function, item) for item in islice(items, 1))
+            yield result
+
+
+def fetch_all(client: NoaaClient, endpoint: str, all_params: list, max_workers: int = 5) -> list:
+    """
+    Sends many requests to the same endpoint concurrently and returns their results in the same
+    order as the parameters. Every request is paged through until all of its results have been
+    retrieved. The client's rate limiters bound how fast the requests are sent.
+
+    Parameters:
+        client (NoaaClient): The client to send the requests with.
+        endpoint (str): The endpoint to request, e.g. "data".
+        all_params (list[dict]): The parameters of each request.
+        max_workers (int): The maximum number of requests in flight at once.
+
+    Returns:
+        list[list]: The results of each request.
+    """
+
+    return list(map_bounded(lambda params: client.get_all_results(endpoint, params), all_params,
+                            max_workers))
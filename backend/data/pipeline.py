@@ -0,0 +1,221 @@
+"""
+This module runs the stages of a data update, e.g. the temperature, safety and rain updates, and
+stages the cities they write in a separate collection.
+
+Stages declare the stages they depend on. Every stage whose dependencies have finished is started
+at once on a thread pool, so independent network bound stages run concurrently, and the time each
+stage took is reported when the update ends.
+
+The stages write to a staging copy of the cities collection. Once every stage has succeeded the
+copy is renamed over the cities collection in one step, so the API never reads a collection that
+is only partly updated, and a failed update leaves the cities collection untouched.
+
+Classes:
+    Stage
+        A named step of an update and the stages it depends on.
+
+    PipelineError
+        Raised when one or more stages fail.
+
+Functions:
+    run_stages(stages: List[Stage], max_workers: int) -> dict
+        Runs stages concurrently in the order allowed by their dependencies.
+
+    prepare_staging(dbname: Database, collection_name: str, keep_existing: bool) -> Collection
+        Creates the staging copy of a collection.
+
+    swap_in_staging(staging: Collection, collection_name: str) -> None
+        Replaces a collection with its staging copy.
+
+Notes:
+    Anything written to the cities collection while an update is running, e.g. city locations
+    stored by the station discovery scripts, is replaced when the staging copy is swapped in.
+"""
+
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Iterable, List, NamedTuple
+
+from pymongo.collection import Collection
+from pymongo.database import Database
+
+# The suffix of the name of the staging copy of a collection
+STAGING_SUFFIX = "_staging"
+
+
+class Stage(NamedTuple):
+    """
+    A named step of an update.
+
+    Attributes:
+        name (str): The name of the stage, used in logs and to declare dependencies.
+        run (Callable[[], None]): Runs the stage.
+        depends_on (Iterable[str]): The names of the stages that must finish first. Stages that are
+            not part of the update are ignored, as their data is already in the database.
+    """
+
+    name: str
+    run: Callable[[], None]
+    depends_on: Iterable[str] = ()
+
+
+class PipelineError(Exception):
+    """
+    Raised when one or more stages of an update fail.
+
+    Parameters:
+        failures (dict[str, BaseException]): The exception raised by each failed stage.
+        timings (dict[str, float]): The seconds each finished stage took, including failed ones.
+    """
+
+    def __init__(self, failures: dict, timings: dict):
+        super().__init__("Stages failed: " + ", ".join(
+            f"{name} ({error!r})" for name, error in failures.items()))
+        self.failures = failures
+        self.timings = timings
+
+
+def _pending_dependencies(stages: List[Stage]) -> dict:
+    """
+    Returns the names of the stages each stage waits for, ignoring stages that are not run, as
+    their data is already in the database.
+    """
+
+    names = [stage.name for stage in stages]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Stage names must be unique: {names}")
+
+    return {stage.name: {name for name in stage.depends_on if name in names}
+            for stage in stages}
+
+
+def _run_timed(stage: Stage, timings: dict) -> float:
+    """
+    Runs a stage and records the seconds it took, even if it fails.
+    """
+
+    start = time.perf_counter()
+    try:
+        stage.run()
+    finally:
+        timings[stage.name] = time.perf_counter() - start
+    return timings[stage.name]
+
+
+def _start_ready_stages(executor: ThreadPoolExecutor, by_name: dict, waiting: dict,
+                        running: dict, timings: dict) -> None:
+    """
+    Submits every waiting stage whose dependencies have finished.
+    """
+
+    for name in [name for name, depends_on in waiting.items() if not depends_on]:
+        logging.info('Starting stage %s', name)
+        running[executor.submit(_run_timed, by_name[name], timings)] = name
+        del waiting[name]
+
+
+def _record_finished_stages(done: set, running: dict, waiting: dict, failures: dict,
+                            timings: dict) -> None:
+    """
+    Records the outcome of finished stages, releasing the stages that wait for the successful
+    ones.
+    """
+
+    for future in done:
+        name = running.pop(future)
+        error = future.exception()
+        if error is not None:
+            logging.error('Stage %s failed after %.1f s: %r', name, timings[name], error)
+            failures[name] = error
+            continue
+
+        logging.info('Stage %s finished in %.1f s', name, timings[name])
+        for depends_on in waiting.values():
+            depends_on.discard(name)
+
+
+def run_stages(stages: List[Stage], max_workers: int = 4) -> dict:
+    """
+    Runs stages concurrently, starting each one as soon as the stages it depends on have finished.
+    After a stage fails no new stages are started, but the running ones are waited for.
+
+    Parameters:
+        stages (List[Stage]): The stages to run.
+        max_workers (int): The maximum number of stages running at once.
+
+    Returns:
+        dict[str, float]: The seconds each stage took, in the order they finished.
+
+    Raises:
+        ValueError: If two stages have the same name or the dependencies contain a cycle.
+        PipelineError: If any stage raised an exception.
+    """
+
+    waiting = _pending_dependencies(stages)
+    by_name = {stage.name: stage for stage in stages}
+    timings, failures, running = {}, {}, {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while waiting or running:
+            if not failures:
+                _start_ready_stages(executor, by_name, waiting, running, timings)
+
+            if not running:
+                if failures:
+                    break
+                raise ValueError(f"The dependencies of these stages contain a cycle: "
+                                 f"{sorted(waiting)}")
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            _record_finished_stages(done, running, waiting, failures, timings)
+
+    if failures:
+        raise PipelineError(failures, timings)
+
+    return timings
+
+
+def prepare_staging(dbname: Database, collection_name: str,
+                    keep_existing: bool = False) -> Collection:
+    """
+    Creates the staging copy of a collection, copying its documents on the server.
+
+    Parameters:
+        dbname (Database): The database of the collection.
+        collection_name (str): The name of the collection to copy.
+        keep_existing (bool): Keep the staging copy left by an unfinished update, e.g. to resume
+            it, instead of copying the collection again.
+
+    Returns:
+        Collection: The staging copy. It has no indexes, the caller should create them.
+    """
+
+    staging_name = collection_name + STAGING_SUFFIX
+
+    if keep_existing and staging_name in dbname.list_collection_names():
+        logging.info('Keeping the existing %s collection', staging_name)
+        return dbname[staging_name]
+
+    dbname.drop_collection(staging_name)
+    if collection_name in dbname.list_collection_names():
+        # $out replaces the staging collection with the result of the pipeline in one step
+        dbname[collection_name].aggregate([{'$match': {}}, {'$out': staging_name}])
+
+    return dbname[staging_name]
+
+
+def swap_in_staging(staging: Collection, collection_name: str) -> None:
+    """
+    Replaces a collection with its staging copy. The rename is atomic, so readers see either the
+    old or the new collection, along with its indexes.
+
+    Parameters:
+        staging (Collection): The staging copy.
+        collection_name (str): The name of the collection to replace.
+
+    Returns:
+        None
+    """
+
+    staging.rename(collection_name, dropTarget=True)
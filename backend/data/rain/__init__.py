@@ -0,0 +1,5 @@
+"""
+Scripts that find the NOAA weather station used for the rain data of each city.
+
+Run them as modules from the backend directory, e.g. python -m data.rain.get_stations.
+"""
@@ -3,43 +3,58 @@ This module provides a function to retrieve city data from a MongoDB database an
 write the data to a CSV file.
 
 Functions:
+    get_locations(params: dict) -> dict
+        Returns a page of the NOAA API locations, reusing the response of a previous run.
+
     get_cities_data() -> None
         Retrieves data on cities from the NOAA API and writes it to a CSV file. Filters the API
         results to only include cities already present in the database.
         API documentation: https://www.ncdc.noaa.gov/cdo-web/webservices/v2#locations
 
 Example usage:
-    # Call from command line:
-    # python get_city_id.py
+    # Call from command line in the backend directory:
+    # python -m data.rain.get_city_id
 
 Notes:
     This module requires the following libraries to be installed: 
     requests, csv, os, dotenv, pymongo.
+    Requests to the NOAA API go through the shared NOAA client (see noaa_client), which limits
+    their rate and retries failed requests.
     The module also requires a .env file to be present in the root directory, containing the
     following variable: NCEI_TOKEN.
     The get_database function is imported from a separate module, which should contain the necessary
     code to establish a connection to the MongoDB database.
+    API responses are stored in the shared API cache (see api_cache), so re-runs do not use quota.
 """
 
-import requests
 import os
 import csv
-from dotenv import load_dotenv
-
-import sys
-sys.path.insert(0, '../..')  # Add parent directory to sys.path
 
 from get_database import get_database
+from data.noaa_client import get_noaa_client
+from data.records import CityRecord
+
+# The CSV file the cities are written to
+CITIES_CSV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "csv", "cities.csv")
 
-# Load environment variables
-load_dotenv()
 
-# Get NCEI API token from environment variables
-NCEI_TOKEN = os.getenv('NCEI_TOKEN')
+def get_locations(params: dict) -> dict:
+    """
+    Returns a page of the NOAA API locations. The request is rate limited and retried by the shared
+    NOAA client. Successful responses are stored in the API cache and reused by later runs, failed
+    ones are not.
+
+    Parameters:
+        params (dict): The parameters of the request, including "limit" and "offset".
+
+    Returns:
+        dict: The response, with the locations in "results".
+
+    Raises:
+        ValueError: If the request failed.
+    """
 
-# Get database and cities collection
-dbname = get_database()
-cities_collection = dbname["cities"]
+    return get_noaa_client().get("locations", params)
 
 
 def get_cities_data() -> None:
@@ -54,14 +69,13 @@ def get_cities_data() -> None:
         None
 
     Raises:
-        HTTPError: If the initial API call fails, or if subsequent calls return an HTTP error.
+        ValueError: If an API call returns an HTTP error.
     """
 
     # Get a list of all cities in the database
-    cities = cities_collection.distinct('city')
+    cities = set(get_database()["cities"].distinct('city'))
 
     # Set up the initial API parameters for the first request
-    url = "https://www.ncdc.noaa.gov/cdo-web/api/v2/locations"
     params = {
         'datasetid': 'GHCND',  # Only get data from this dataset
         'locationcategoryid': 'CITY',  # Only get data for cities
@@ -70,19 +84,18 @@ def get_cities_data() -> None:
     }
 
     while True:
-        # Make the API request
-        response = requests.get(url, params=params, headers={
-            'token': NCEI_TOKEN}, timeout=20)
+        # Make the API request, or reuse the response of a previous run
+        response = get_locations(params)
 
         # Get the data from the response
-        data = response.json().get("results", [])
+        data = response.get("results", [])
 
         # If no data is returned, we've got all the data and can break out of the loop
         if not data:
             break
 
         # Write the data to the CSV file
-        with open('csv/cities.csv', mode='a', newline='', encoding='UTF-8') as csv_file:
+        with open(CITIES_CSV_PATH, mode='a', newline='', encoding='UTF-8') as csv_file:
             writer = csv.writer(csv_file)
 
             for result in data:
@@ -92,10 +105,8 @@ def get_cities_data() -> None:
 
                 # Only write the city if it exists in the DB
                 if city in cities:
-                    mindate = result['mindate']
-                    maxdate = result['maxdate']
-                    city_id = result['id']
-                    writer.writerow([mindate, maxdate, name, city, city_id])
+                    writer.writerow(CityRecord(result['mindate'], result['maxdate'], name, city,
+                                               result['id']).to_row())
 
         # Update the offset for the next request
         params['offset'] += len(data)
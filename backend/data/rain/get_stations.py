@@ -3,27 +3,23 @@ This module provides functions for finding weather stations near a list of citie
 API and OpenCage geocoder API.
 
 Functions:
-    read_cities(filename: str) -> List[Dict[str, str]]:
-        Reads a CSV file containing city data and returns a list of dictionaries with keys
-        "city", "id", and "name" corresponding to the relevant columns in the CSV file.
-
     calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     Calculates the distance between two locations on Earth, given their latitude and longitude
     coordinates, using the Haversine formula.
 
     get_bounds(city: str, country: str) -> Optional[Tuple[float, float]]:
-        Given the name of a city and its country, uses the OpenCage geocoder API to retrieve the
-        latitude and longitude coordinates for the city.
+        Given the name of a city and its country, retrieves the latitude and longitude coordinates
+        for the city, stored in the cities collection or from the OpenCage geocoder API.
 
     get_station(params: Dict[str, Union[str, int]]) -> List[Dict[str, Union[str, int]]]:
         Given a dictionary of parameters, sends a GET request to the NOAA API and returns the
-        results as a list. This function uses the retry package to handle network errors.
+        results as a list. Requests go through the shared NOAA client (see noaa_client).
 
     get_best_station(city_name: str, stations: List[Dict[str, Union[str, int, float]]]) -> Dict[str,
     Union[str, float]]:
         Given a city name and a list of weather stations, returns the weather station that has the
         highest score, where the score is calculated based on the distance of the station from the
-        city and the percentage of data coverage.
+        city and the percentage of data coverage (see score_stations in the geo module).
 
     get_country(city_name: str) -> str:
         Given a city name, retrieves the corresponding country name from a MongoDB database.
@@ -35,77 +31,55 @@ Functions:
         whose date coverage is at least num_years. The resulting list is sorted by score in
         descending order.
 
-    main() -> None:
+    main(inventory: Optional[StationInventory]) -> None:
         Iterates through all cities from a csv file, retrieves their latitude and longitude
-        coordinates, queries the NOAA API to find nearby weather stations, calculates a score for
-        each station, and selects the best station for the city based on its score.
+        coordinates, queries the NOAA API or a local station inventory to find nearby weather
+        stations, calculates a score for each station, and selects the best station for the city
+        based on its score.
+
+    score_and_pick_station(city_name: str, country: str, lat: float, lng: float,
+                           stations: List[Dict[str, Union[str, float]]]) -> None:
+        Scores the stations found for a city and writes the best one to the stations CSV file.
+
+Example usage:
+    # Find stations with the NOAA API, from the backend directory:
+    # python -m data.rain.get_stations
+    # Find stations in the GHCND station inventory without any NOAA API calls, after downloading it
+    # with station_inventory.download_inventory():
+    # python -m data.rain.get_stations --inventory
 
 Notes:
     This module requires the following libraries to be installed: requests, csv, os, time,
-    opencage.geocoder, dotenv, and retry.
+    opencage.geocoder and dotenv.
+    Requests to the NOAA API go through the shared NOAA client (see noaa_client), which limits
+    their rate and retries failed requests.
     The module also requires a .env file to be present in the root directory, containing the 
     following variables: NCEI_TOKEN, OPENCAGE_API_KEY.
     The update_database script to add temperature data should be run first
+    API responses are stored in the shared API cache (see api_cache), so re-runs do not use quota.
+    City locations are stored in the cities collection (see geocoding), so each city is only
+    geocoded once.
 """
 
-import requests
 import os
 import csv
-import time
 import json
+import argparse
 from typing import Dict, List, Tuple, Optional, Union
-from dotenv import load_dotenv
-from opencage.geocoder import OpenCageGeocode
-from retry import retry
-
-import sys
-sys.path.insert(0, '../..')  # Add parent directory to sys.path
+import numpy as np
 
 from get_database import get_database
-import math
-
-# Load environment variables
-load_dotenv()
-
-# Get the API tokens and keys from environment variables
-NCEI_TOKEN = os.getenv('NCEI_TOKEN')
-OPENCAGE_API_KEY = os.getenv('OPENCAGE_API_KEY')
-
-# Create a geocoder object with the OpenCage API key
-geocoder = OpenCageGeocode(OPENCAGE_API_KEY)
-
-# Get the cities collection from the database
-dbname = get_database()
-cities_collection = dbname["cities"]
-
-
-def read_cities(filename: str) -> List[Dict[str, str]]:
-    """
-    Reads a CSV file containing city data and returns a list of dictionaries with keys
-    "city", "id", and "name" corresponding to the relevant columns in the CSV file.
+from data.records import StationRecord, iter_cities
+from data.geo import best_stations, haversine_distances, score_stations
+from data.station_inventory import DEFAULT_DIRECTORY, StationInventory
+from data.geocoding import get_geocoder
+from data.noaa_client import get_noaa_client
 
-    Parameters:
-        filename (str): The path to the CSV file to be read.
-
-    Returns:
-        List[Dict[str, str]]: A list of dictionaries, where each dictionary corresponds to a row
-        in the CSV file and contains the "city", "id", and "name" of the city.
-
-    Raises:
-        FileNotFoundError: If the specified file does not exist.
-    """
+# The CSV files of cities and their weather stations
+CSV_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "csv")
 
-    cities = []
-    with open(filename, newline="", encoding='UTF-8') as csvfile:
-        reader = csv.reader(csvfile)
-        next(reader)  # skip header row
-        for row in reader:
-            cities.append({
-                "city": row[3],
-                "id": row[-1],
-                "name": row[2]
-            })
-    return cities
+# The radius around a city to look for stations in the local station inventory
+STATION_SEARCH_RADIUS_KM = 100
 
 
 def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
@@ -125,21 +99,19 @@ def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> fl
     References:
         [1] Haversine formula: https://en.wikipedia.org/wiki/Haversine_formula
         [2] Earth radius: https://en.wikipedia.org/wiki/Earth_radius
+
+    Notes:
+        Use haversine_distances or distance_matrix from the geo module to calculate many distances
+        at once.
     """
 
-    R = 6378  # Earth radius in km
-    dlat = math.radians(lat2 - lat1)
-    dlon = math.radians(lon2 - lon1)
-    a = math.sin(dlat / 2) * math.sin(dlat / 2) + math.cos(math.radians(lat1)) * \
-        math.cos(math.radians(lat2)) * math.sin(dlon / 2) * math.sin(dlon / 2)
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    d = R * c
-    return d
+    return float(haversine_distances(lat1, lon1, lat2, lon2))
 
 
 def get_bounds(city: str, country: str) -> Optional[Tuple[float, float]]:
     """
-    Use the OpenCage geocoder API to get the latitude and longitude of a city and country.
+    Get the latitude and longitude of a city and country, geocoding it with the OpenCage API if
+    its location is not stored in the cities collection yet.
 
     Parameters:
         city (str): The name of the city.
@@ -151,25 +123,14 @@ def get_bounds(city: str, country: str) -> Optional[Tuple[float, float]]:
         an error occurs, None is returned.
     """
 
-    # Use the OpenCage geocoder API to get the latitude and longitude of the city
-    query = f"{city}, {country}"
-    results = geocoder.geocode(query)
-    if results:
-        try:
-            lat = results[0]['geometry']['lat']
-            lng = results[0]['geometry']['lng']
-            return (lat, lng)
-        except KeyError:
-            return None
-    else:
-        return None
+    location = get_geocoder().locate(city, country)
+    return (location.lat, location.lng) if location else None
 
 
-@retry(tries=3, delay=5, backoff=2, jitter=(1, 3), logger=None)
 def get_station(params: Dict[str, str]) -> List[Dict[str, Union[str, float]]]:
     """
     Sends a GET request to the NOAA API to retrieve a list of weather stations that match the given
-    parameters. Retries the request up to 'tries' number of times if it fails.
+    parameters. The request is rate limited, retried and cached by the shared NOAA client.
     
     Parameters:
         params (Dict[str, str]): A dictionary of parameters to include in the API request.
@@ -183,21 +144,10 @@ def get_station(params: Dict[str, str]) -> List[Dict[str, Union[str, float]]]:
         information on a single weather stati
 
     Raises:
-        ValueError: If the response status code is not 200.
+        ValueError: If the request failed.
     """
 
-    url = "https://www.ncdc.noaa.gov/cdo-web/api/v2/stations"
-
-    # Send a GET request to the NOAA API with the given parameters and token
-    response = requests.get(url, params=params, headers={
-        'token': NCEI_TOKEN}, timeout=20)
-
-    # Raise an error if the response status code is not 200
-    if response.status_code != 200:
-        raise ValueError("Failed to get station data.")
-
-    # Return the results from the response as a list
-    return response.json().get("results", [])
+    return get_noaa_client().get_results("stations", params)
 
 
 def get_best_station(city_name: str, country: str, stations: List[
@@ -221,24 +171,22 @@ def get_best_station(city_name: str, country: str, stations: List[
     if not stations:
         return None
 
-    # Find the station with the highest score
-    best_station = max(stations, key=lambda s: s["score"])
+    # Find the station with the highest score, ignoring stations without a score
+    best_index = int(best_stations(np.array([station["score"] for station in stations])))
+    if best_index < 0:
+        return None
+    best_station = stations[best_index]
 
-    # Assign station data to variables
-    mindate = best_station['mindate']
-    maxdate = best_station['maxdate']
-    name = best_station['name']
-    station_id = best_station['id']
-    latitude = best_station['latitude']
-    longitude = best_station['longitude']
-    distance = best_station['distance']
-    datacoverage = best_station['datacoverage']
+    record = StationRecord(best_station['mindate'], best_station['maxdate'],
+                           best_station['name'], city_name, country, best_station['id'],
+                           best_station['latitude'], best_station['longitude'],
+                           best_station['distance'], best_station['datacoverage'])
 
     # Write station data to CSV
-    with open('csv/stations_improved.csv', mode='a', newline='', encoding='UTF-8') as csv_file:
+    with open(os.path.join(CSV_DIRECTORY, 'stations_improved.csv'), mode='a', newline='',
+              encoding='UTF-8') as csv_file:
         writer = csv.writer(csv_file)
-        writer.writerow([mindate, maxdate, name, city_name, country,
-                        station_id, latitude, longitude, distance, datacoverage])
+        writer.writerow(record.to_row())
 
     return best_station
 
@@ -253,7 +201,7 @@ def get_country(city_name: str) -> str:
     Returns:
         str: A string representing the name of the country in which the city is located.
     """
-    return cities_collection.find_one({'city': city_name})['country']
+    return get_database()["cities"].find_one({'city': city_name})['country']
 
 
 def get_stations(year: str, num_years: int, data: List[Dict[str, Union[str, float]]]) -> List[
@@ -326,80 +274,117 @@ def find_stations(data: List[Dict[str, Union[str, float]]]) -> List[Dict[str, Un
     return get_stations('2000', num_years, data)
 
 
-def main() -> None:
+def main(inventory: Optional[StationInventory] = None) -> None:
     """
     Process a list of cities and find the best weather station for each city.
 
     Reads a list of cities with their respective IDs from a CSV file and retrieves
     the latitude and longitude coordinates for each city. Then, it queries the NOAA API to
-    find nearby weather stations. A score is calculated for each station based on its distance from
-    the city and the quality of its data. Finally, the best station for each city is selected based
+    find nearby weather stations, or looks them up in a local station inventory if one is given.
+    A score is calculated for each station based on its distance from the city and the quality of
+    its data. Finally, the best station for each city is selected based
     on its score.
 
     Parameters:
-        None
+        inventory (Optional[StationInventory]): The GHCND station inventory to find stations in
+            without calling the NOAA API.
 
     Returns:
         None
     """
 
-    # Read all cities from CSV file
-    all_cities = read_cities("csv/cities.csv")
+    # Read all cities from the CSV file, which is written by get_city_id.py without a header row
+    all_cities = [(city, get_country(city.city))
+                  for city in iter_cities(os.path.join(CSV_DIRECTORY, "cities.csv"),
+                                          has_header=False)]
+
+    # Get the latitude and longitude of every city at once, only geocoding new cities
+    locations = get_geocoder().locate_many((city.city, country) for city, country in all_cities)
 
     # Iterate through all cities and find the best weather station for each
-    for city in all_cities:
-        # Wait for 1 second before processing each city
-        time.sleep(1)
-        # Get city name, location ID, and country name
-        city_name = city['city']
-        locationid = city['id']
-        country = get_country(city_name)
+    for city, country in all_cities:
+        # Get city name and location ID
+        city_name = city.city
+        locationid = city.id
 
         # Print message to indicate which city is being processed
         print('Getting info for the following city:', city)
 
-        # Get latitude and longitude for the city
-        lat, lng = get_bounds(city_name, country)
-        # Set parameters for the station API request
-        params = {
-            'datasetid': 'GHCND',
-            'locationid': locationid,
-            'units': 'metric',
-            'limit': 1000
-        }
-
-        # Try to get station data from API, and retry once if request times out
-        try:
-            data = get_station(params)
-        except requests.exceptions.ReadTimeout:
-            print("Request timed out. Retrying after waiting for 5 seconds.")
-            time.sleep(5)
+        location = locations[(city_name, country)]
+        if location is None:
+            print('Could not geocode', city_name)
+            continue
+        lat, lng = location.lat, location.lng
+
+        if inventory is not None:
+            # Find the stations near the city in the inventory instead of calling the API
+            indices, _ = inventory.within(lat, lng, STATION_SEARCH_RADIUS_KM)
+            data = [inventory.station(index) for index in indices]
+        else:
+            # Set parameters for the station API request
+            params = {
+                'datasetid': 'GHCND',
+                'locationid': locationid,
+                'units': 'metric',
+                'limit': 1000
+            }
+
+            # Get station data from the API, failed requests are retried by the NOAA client
             data = get_station(params)
 
         # Find stations to use
         stations = find_stations(data)
 
-        # Calculate the distance to each station from the longitude and latitude values of the city
-        for station in stations:
-            station["distance"] = calculate_distance(
-                lat, lng, station["latitude"], station["longitude"])
-        
-        # Assign a score to each station based on the above criteria
-        for station in stations:
-            station["score"] = (1 / (station["distance"])) * \
-                station["datacoverage"]
-
-        # Get the best station for the city based on score
-        best_station = get_best_station(city_name, country, stations)
-
-        # Print the best station for the city if one is found, else print a message indicating no
-        # station was found
-        if best_station:
-            print('The best station for', city_name, 'is',
-                  best_station['name'], 'with a score of', best_station['score'])
-        else:
-            print('No station found for', city_name)
+        score_and_pick_station(city_name, country, lat, lng, stations)
+
+
+def score_and_pick_station(city_name: str, country: str, lat: float, lng: float,
+                           stations: List[Dict[str, Union[str, float]]]) -> None:
+    """
+    Scores the stations found for a city and writes the best one to the stations CSV file.
+
+    Parameters:
+        city_name (str): The name of the city.
+        country (str): The name of the country.
+        lat (float): The latitude of the city.
+        lng (float): The longitude of the city.
+        stations (List[Dict[str, Union[str, float]]]): The stations found for the city, with the
+            keys 'latitude', 'longitude' and 'datacoverage'.
+
+    Returns:
+        None
+    """
+
+    # Calculate the distance to each station from the longitude and latitude values of the city
+    # and score each station, for all stations at once
+    distances = haversine_distances(
+        lat, lng,
+        [station.get("latitude", np.nan) for station in stations],
+        [station.get("longitude", np.nan) for station in stations])
+    scores = score_stations(distances,
+                            [station.get("datacoverage", 0) for station in stations])
+
+    for station, distance, score in zip(stations, distances.tolist(), scores.tolist()):
+        station["distance"] = distance
+        station["score"] = score
+
+    # Get the best station for the city based on score
+    best_station = get_best_station(city_name, country, stations)
+
+    # Print the best station for the city if one is found, else print a message indicating no
+    # station was found
+    if best_station:
+        print('The best station for', city_name, 'is',
+              best_station['name'], 'with a score of', best_station['score'])
+    else:
+        print('No station found for', city_name)
 
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description='Find the best weather station for each city')
+    parser.add_argument('--inventory', nargs='?', const=DEFAULT_DIRECTORY,
+                        help='Find stations in the GHCND station inventory in this directory '
+                             'instead of calling the NOAA API')
+    args = parser.parse_args()
+
+    main(StationInventory.load(args.inventory) if args.inventory else None)
@@ -4,7 +4,8 @@ names to get bounding coordinates, and write station data to a CSV file.
 
 Functions:
     get_bounds(city: str, country: str) -> tuple
-        Geocodes a city name and country to retrieve bounding coordinates using the OpenCage API.
+        Gets the bounding coordinates of a city, stored in the cities collection or geocoded with
+        the OpenCage API.
         API documentation: https://opencagedata.com/api
 
     write_to_csv(station_data: dict, city: str, country: str) -> None
@@ -21,46 +22,34 @@ Functions:
         Retrieves station data for all cities in a MongoDB database and writes it to a CSV file.
 
 Example usage:
-    # Call from command line:
-    # python get_weather_stations.py
+    # Call from command line in the backend directory:
+    # python -m data.rain.get_weather_stations
 
 Notes:
-    This module requires the following libraries to be installed: requests, csv, os, logging, time,
-    opencage.geocoder, dotenv, and retry.
+    This module requires the following libraries to be installed: requests, csv, os, logging,
+    opencage.geocoder and dotenv.
+    Requests to the NOAA API go through the shared NOAA client (see noaa_client), which limits
+    their rate and retries failed requests.
     The module also requires a .env file to be present in the root directory, containing the 
     following variables: NCEI_TOKEN, OPENCAGE_API_KEY.
     The update_database script to add temperature data should be run first
+    API responses are stored in the shared API cache (see api_cache), so re-runs do not use quota.
+    City locations are stored in the cities collection (see geocoding), so each city is only
+    geocoded once.
 """
 
 from typing import Optional, Tuple
 import csv
 import os
 import logging
-import time
-import sys
-import requests
-from opencage.geocoder import OpenCageGeocode
-from dotenv import load_dotenv
-from retry import retry
-
-sys.path.insert(0, '../..')  # Add parent directory to sys.path
 
 from get_database import get_database
+from data.geocoding import get_geocoder
+from data.noaa_client import get_noaa_client
 
-
-# Load environment variables
-load_dotenv()
-
-# Get NCEI API token and OpenCage API key from environment variables
-NCEI_TOKEN = os.getenv('NCEI_TOKEN')
-OPENCAGE_API_KEY = os.getenv('OPENCAGE_API_KEY')
-
-# Get database and cities collection
-dbname = get_database()
-cities_collection = dbname["cities"]
-
-# Set up OpenCage Geocoding API
-geocoder = OpenCageGeocode(OPENCAGE_API_KEY)
+# The CSV file the stations are written to
+STATIONS_CSV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "csv",
+                                 "stations.csv")
 
 
 def get_bounds(city: str, country: str) -> Optional[Tuple[float, float, float, float]]:
@@ -78,24 +67,11 @@ def get_bounds(city: str, country: str) -> Optional[Tuple[float, float, float, f
         geocoded or the bounds cannot be found, returns None.
     """
 
-    # Build geocoding query string
-    query = f"{city}, {country}"
+    # Get the stored location of the city, or geocode it if it has not been geocoded before
+    location = get_geocoder().locate(city, country)
 
-    # Geocode the query and get results
-    results = geocoder.geocode(query)
-
-    # If results are found, get the bounds and return as a tuple of floats
-    if results:
-        try:
-            northeast = results[0]['bounds']['northeast']
-            southwest = results[0]['bounds']['southwest']
-            return (northeast['lat'], northeast['lng'], southwest['lat'], southwest['lng'])
-        # If the bounds cannot be found in the results, return None
-        except KeyError:
-            return None
-    # If no results are found, return None
-    else:
-        return None
+    # If the city was found and has bounds, return them, otherwise return None
+    return location.bounds if location else None
 
 
 def write_to_csv(station_data: dict, city: str, country: str) -> None:
@@ -121,16 +97,16 @@ def write_to_csv(station_data: dict, city: str, country: str) -> None:
     longitude = station_data['longitude']
 
     # Write data to CSV file
-    with open('csv/stations.csv', mode='a', newline='', encoding='UTF-8') as csv_file:
+    with open(STATIONS_CSV_PATH, mode='a', newline='', encoding='UTF-8') as csv_file:
         writer = csv.writer(csv_file)
         writer.writerow([mindate, maxdate, name, city, country,
                         station_id, latitude, longitude])
 
 
-@retry(tries=3, delay=5, backoff=2, jitter=(1, 3), logger=None)
 def get_station_data(params: dict) -> dict:
     """
-    Retrieves data from the NOAA API for stations and returns a JSON object of the response.
+    Retrieves data from the NOAA API for stations and returns a JSON object of the response. The
+    request is rate limited, retried and cached by the shared NOAA client.
 
     Parameters:
         params (dict): A dictionary of parameters to pass to the API endpoint.
@@ -139,22 +115,10 @@ def get_station_data(params: dict) -> dict:
         dict: A JSON object of the API response.
 
     Raises:
-        ValueError: If the response status code is not 200 (i.e. the request failed).
+        ValueError: If the request failed.
     """
 
-    # define the API endpoint URL
-    url = "https://www.ncdc.noaa.gov/cdo-web/api/v2/stations"
-
-    # make a GET request to the API with the specified parameters and token header
-    response = requests.get(url, params=params, headers={
-        'token': NCEI_TOKEN}, timeout=10)
-
-    # raise a ValueError if the response status code is not 200
-    if response.status_code != 200:
-        raise ValueError("Failed to get rainfall data.")
-
-    # return the JSON response from the API
-    return response.json()
+    return get_noaa_client().get("stations", params)
 
 
 def get_station(city: str, country: str, radius: float = 0.5) -> None:
@@ -185,14 +149,9 @@ def get_station(city: str, country: str, radius: float = 0.5) -> None:
         params['extent'] = {bounds[2] - radius}, {bounds[3] - radius}, {bounds[0] + radius}, {
             bounds[1] + radius}
 
-        try:
-            # make a request to the API to get the station data
-            data = get_station_data(params)
-        except requests.exceptions.ReadTimeout:
-            # if the request times out, wait for 5 seconds and try again
-            print("Request timed out. Retrying after waiting for 5 seconds.")
-            time.sleep(5)
-            data = get_station_data(params)
+        # make a request to the API to get the station data, failed requests are retried by the
+        # NOAA client
+        data = get_station_data(params)
 
         try:
             # get the station with the latest maxdate
@@ -220,15 +179,16 @@ def get_stations_for_cities_in_database() -> None:
         None
     """
 
-    # Loop through all documents in the 'cities_collection' collection
-    for document in cities_collection.find():
-        # Get the name of the city and country from the current document
-        city = document['city']
-        country = document['country']
+    cities = [(document['city'], document['country'])
+              for document in get_database()["cities"].find({}, {'_id': 0, 'city': 1,
+                                                                'country': 1})]
 
-        # Add a wait statement to avoid hitting the API rate limit
-        time.sleep(1)
+    # Geocode every city that has not been geocoded before in one batch, so get_station only reads
+    # stored locations
+    get_geocoder().locate_many(cities)
 
+    # Loop through all cities in the 'cities_collection' collection
+    for city, country in cities:
         # Call the get_station() function to retrieve weather station data for the city and country
         get_station(city, country)
 
@@ -0,0 +1,232 @@
+"""
+This module provides streaming readers for the weather station and city CSV files shared by the
+rain data scripts, and the compact records they yield.
+
+Records use __slots__ instead of a dictionary per row, repeated strings such as country names are
+interned, and dates are only parsed when they are first used. The readers yield one record at a
+time, so a file with the full GHCND inventory of over 100,000 stations never has to be held in
+memory as raw rows.
+
+Classes:
+    StationRecord
+        A weather station from a stations CSV file.
+
+    CityRecord
+        A NOAA city location from the cities CSV file.
+
+Functions:
+    iter_stations(filename: str) -> Iterator[StationRecord]
+        Yields the weather stations of a stations CSV file one at a time.
+
+    iter_cities(filename: str, has_header: bool) -> Iterator[CityRecord]
+        Yields the cities of a cities CSV file one at a time.
+
+Notes:
+    Station CSV files have the columns mindate, maxdate, name, city, country, id, latitude,
+    longitude and optionally distance and coverage, with a header row.
+    The cities CSV file has the columns mindate, maxdate, name, city and id.
+"""
+
+import csv
+import sys
+from datetime import datetime
+from typing import Iterator, Optional, Union
+
+DateValue = Union[str, datetime]
+
+
+def _parse_date(value: DateValue) -> datetime:
+    # fromisoformat is much faster than strptime and accepts the YYYY-MM-DD dates used by NOAA
+    return value if isinstance(value, datetime) else datetime.fromisoformat(value)
+
+
+def _to_float(value: str) -> Optional[float]:
+    return float(value) if value not in (None, '') else None
+
+
+class StationRecord:
+    """
+    A weather station. The dates can be given as datetimes or as YYYY-MM-DD strings, which are
+    parsed the first time they are read.
+
+    Parameters:
+        mindate (Union[str, datetime]): The earliest date the station has data for.
+        maxdate (Union[str, datetime]): The latest date the station has data for.
+        name (str): The name of the station.
+        city (str): The city the station is used for.
+        country (str): The country of the city.
+        id (str): The unique identifier of the station, e.g. "GHCND:AG000060390".
+        latitude (Optional[float]): The latitude of the station in decimal degrees.
+        longitude (Optional[float]): The longitude of the station in decimal degrees.
+        distance (Optional[float]): The distance from the station to the city in kilometers.
+        coverage (Optional[float]): The fraction of days the station has data for.
+    """
+
+    __slots__ = ('_mindate', '_maxdate', 'name', 'city', 'country', 'id', 'latitude',
+                 'longitude', 'distance', 'coverage')
+
+    def __init__(self, mindate: DateValue, maxdate: DateValue, name: str, city: str,
+                 country: str, id: str, latitude: Optional[float] = None,
+                 longitude: Optional[float] = None, distance: Optional[float] = None,
+                 coverage: Optional[float] = None):
+        self._mindate = mindate
+        self._maxdate = maxdate
+        self.name = name
+        self.city = city
+        self.country = country
+        self.id = id
+        self.latitude = latitude
+        self.longitude = longitude
+        self.distance = distance
+        self.coverage = coverage
+
+    @property
+    def mindate(self) -> datetime:
+        """The earliest date the station has data for."""
+        self._mindate = _parse_date(self._mindate)
+        return self._mindate
+
+    @property
+    def maxdate(self) -> datetime:
+        """The latest date the station has data for."""
+        self._maxdate = _parse_date(self._maxdate)
+        return self._maxdate
+
+    @classmethod
+    def from_row(cls, row: list) -> 'StationRecord':
+        """
+        Creates a station from a row of a stations CSV file.
+
+        Parameters:
+            row (list[str]): The columns of the row.
+
+        Returns:
+            StationRecord: The station, with its dates not parsed yet.
+        """
+
+        return cls(row[0], row[1], row[2], sys.intern(row[3]), sys.intern(row[4]), row[5],
+                   *(_to_float(value) for value in row[6:10]))
+
+    def to_row(self) -> list:
+        """
+        Returns the columns of the station in a stations CSV file.
+
+        Returns:
+            list: The columns of the row.
+        """
+
+        return [self.mindate.strftime("%Y-%m-%d"), self.maxdate.strftime("%Y-%m-%d"), self.name,
+                self.city, self.country, self.id, self.latitude, self.longitude, self.distance,
+                self.coverage]
+
+    def __repr__(self) -> str:
+        return f"StationRecord(id={self.id!r}, name={self.name!r}, city={self.city!r})"
+
+
+class CityRecord:
+    """
+    A NOAA city location. The dates can be given as datetimes or as YYYY-MM-DD strings, which are
+    parsed the first time they are read.
+
+    Parameters:
+        mindate (Union[str, datetime]): The earliest date NOAA has data for in the city.
+        maxdate (Union[str, datetime]): The latest date NOAA has data for in the city.
+        name (str): The NOAA name of the location, e.g. "Dubai, AE".
+        city (str): The name of the city.
+        id (str): The NOAA location ID, e.g. "CITY:AE000003".
+    """
+
+    __slots__ = ('_mindate', '_maxdate', 'name', 'city', 'id')
+
+    def __init__(self, mindate: DateValue, maxdate: DateValue, name: str, city: str, id: str):
+        self._mindate = mindate
+        self._maxdate = maxdate
+        self.name = name
+        self.city = city
+        self.id = id
+
+    @property
+    def mindate(self) -> datetime:
+        """The earliest date NOAA has data for in the city."""
+        self._mindate = _parse_date(self._mindate)
+        return self._mindate
+
+    @property
+    def maxdate(self) -> datetime:
+        """The latest date NOAA has data for in the city."""
+        self._maxdate = _parse_date(self._maxdate)
+        return self._maxdate
+
+    @classmethod
+    def from_row(cls, row: list) -> 'CityRecord':
+        """
+        Creates a city from a row of the cities CSV file.
+
+        Parameters:
+            row (list[str]): The columns of the row.
+
+        Returns:
+            CityRecord: The city, with its dates not parsed yet.
+        """
+
+        return cls(row[0], row[1], row[2], row[3], row[-1])
+
+    def to_row(self) -> list:
+        """
+        Returns the columns of the city in the cities CSV file. Dates that have not been parsed are
+        written as they were given.
+
+        Returns:
+            list: The columns of the row.
+        """
+
+        return [self._mindate, self._maxdate, self.name, self.city, self.id]
+
+    def __repr__(self) -> str:
+        return f"CityRecord(id={self.id!r}, city={self.city!r})"
+
+
+def iter_stations(filename: str) -> Iterator[StationRecord]:
+    """
+    Yields the weather stations of a stations CSV file one at a time, skipping the header row.
+
+    Parameters:
+        filename (str): The path to the CSV file to read.
+
+    Yields:
+        StationRecord: The station of each row.
+
+    Raises:
+        FileNotFoundError: If the specified file does not exist.
+    """
+
+    with open(filename, newline="", encoding='UTF-8') as csvfile:
+        reader = csv.reader(csvfile)
+        next(reader, None)  # skip header row
+        for row in reader:
+            if row:
+                yield StationRecord.from_row(row)
+
+
+def iter_cities(filename: str, has_header: bool = True) -> Iterator[CityRecord]:
+    """
+    Yields the cities of a cities CSV file one at a time.
+
+    Parameters:
+        filename (str): The path to the CSV file to read.
+        has_header (bool): If True, the first row is a header and is skipped.
+
+    Yields:
+        CityRecord: The city of each row.
+
+    Raises:
+        FileNotFoundError: If the specified file does not exist.
+    """
+
+    with open(filename, newline="", encoding='UTF-8') as csvfile:
+        reader = csv.reader(csvfile)
+        if has_header:
+            next(reader, None)
+        for row in reader:
+            if row:
+                yield CityRecord.from_row(row)
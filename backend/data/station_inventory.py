@@ -0,0 +1,302 @@
+"""
+This module loads the GHCND station inventory published by NOAA into memory and indexes it by
+location, so that the weather stations near a city can be found without calling the NOAA API.
+
+The stations are put in a grid of cells of a few degrees of latitude and longitude. A query only
+computes the distance to the stations in the cells that overlap the search radius, so finding the
+stations near a city takes microseconds and finding them for every city takes well under a second.
+
+Classes:
+    StationInventory
+        The stations of the GHCND inventory with a grid index on their coordinates.
+
+Functions:
+    parse_stations(lines: Iterable[str]) -> dict
+        Parses the fixed width lines of a ghcnd-stations.txt file.
+
+    parse_inventory(lines: Iterable[str], element: str) -> dict
+        Parses the fixed width lines of a ghcnd-inventory.txt file.
+
+    download_inventory(directory: str) -> None
+        Downloads the station and inventory files of GHCND.
+
+Notes:
+    File format documentation: https://www.ncei.noaa.gov/pub/data/ghcn/daily/readme.txt
+    The files only need to be downloaded once, and are updated by NOAA every day.
+"""
+
+import math
+import os
+from typing import Iterable, Optional
+
+import numpy as np
+import requests
+
+from data.geo import EARTH_RADIUS_KM, haversine_distances
+
+GHCND_URL = "https://www.ncei.noaa.gov/pub/data/ghcn/daily"
+STATIONS_FILENAME = "ghcnd-stations.txt"
+INVENTORY_FILENAME = "ghcnd-inventory.txt"
+DEFAULT_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "ghcnd")
+
+# The size of the grid cells in degrees of latitude and longitude
+DEFAULT_CELL_DEGREES = 2.0
+
+
+def parse_stations(lines: Iterable[str]) -> dict:
+    """
+    Parses the fixed width lines of a ghcnd-stations.txt file.
+
+    Parameters:
+        lines (Iterable[str]): The lines of the file.
+
+    Returns:
+        dict: The columns 'ids', 'latitudes', 'longitudes' and 'names' as lists, one entry per
+        station.
+    """
+
+    ids, latitudes, longitudes, names = [], [], [], []
+
+    for line in lines:
+        if len(line) < 30:
+            continue
+        # Columns 1-11 are the ID, 13-20 the latitude, 22-30 the longitude and 42-71 the name
+        ids.append(line[0:11])
+        latitudes.append(float(line[12:20]))
+        longitudes.append(float(line[21:30]))
+        names.append(line[41:71].strip())
+
+    return {'ids': ids, 'latitudes': latitudes, 'longitudes': longitudes, 'names': names}
+
+
+def parse_inventory(lines: Iterable[str], element: str = "PRCP") -> dict:
+    """
+    Parses the fixed width lines of a ghcnd-inventory.txt file, keeping the years of one element.
+
+    Parameters:
+        lines (Iterable[str]): The lines of the file.
+        element (str): The element to keep, e.g. "PRCP" for precipitation.
+
+    Returns:
+        dict: For each station ID with data for the element, a tuple of the first and last year of
+        data.
+    """
+
+    years = {}
+
+    for line in lines:
+        # Columns 1-11 are the ID, 32-35 the element and 37-40 and 42-45 the first and last year
+        if line[31:35] == element:
+            years[line[0:11]] = (int(line[36:40]), int(line[41:45]))
+
+    return years
+
+
+def download_inventory(directory: str = DEFAULT_DIRECTORY) -> None:
+    """
+    Downloads the station and inventory files of GHCND.
+
+    Parameters:
+        directory (str): The directory to save the files to.
+
+    Returns:
+        None
+
+    Raises:
+        requests.exceptions.HTTPError: If a file could not be downloaded.
+    """
+
+    os.makedirs(directory, exist_ok=True)
+
+    for filename in (STATIONS_FILENAME, INVENTORY_FILENAME):
+        with requests.get(f"{GHCND_URL}/{filename}", stream=True, timeout=60) as response:
+            response.raise_for_status()
+            with open(os.path.join(directory, filename), "wb") as file:
+                for chunk in response.iter_content(chunk_size=1 << 20):
+                    file.write(chunk)
+
+
+class StationInventory:
+    """
+    The stations of the GHCND inventory with a grid index on their coordinates.
+
+    Parameters:
+        ids (list[str]): The GHCND ID of each station, without the "GHCND:" prefix.
+        names (list[str]): The name of each station.
+        latitudes (ArrayLike): The latitude of each station in decimal degrees.
+        longitudes (ArrayLike): The longitude of each station in decimal degrees.
+        first_years (Optional[ArrayLike]): The first year each station has data for.
+        last_years (Optional[ArrayLike]): The last year each station has data for.
+        cell_degrees (float): The size of the grid cells in degrees.
+    """
+
+    def __init__(self, ids: list, names: list, latitudes, longitudes, first_years=None,
+                 last_years=None, cell_degrees: float = DEFAULT_CELL_DEGREES):
+        self.ids = np.asarray(ids, dtype=object)
+        self.names = np.asarray(names, dtype=object)
+        self.latitudes = np.asarray(latitudes, dtype=float)
+        self.longitudes = np.asarray(longitudes, dtype=float)
+        self.first_years = None if first_years is None else np.asarray(first_years, dtype=int)
+        self.last_years = None if last_years is None else np.asarray(last_years, dtype=int)
+
+        self._cell_degrees = cell_degrees
+        self._rows = math.ceil(180 / cell_degrees)
+        self._columns = math.ceil(360 / cell_degrees)
+
+        # Sort the stations by cell so that the stations of each cell are one slice of _order
+        cells = self._cells(self.latitudes, self.longitudes)
+        self._order = np.argsort(cells, kind='stable')
+        keys, starts = np.unique(cells[self._order], return_index=True)
+        ends = np.append(starts[1:], len(cells))
+        self._cell_slices = {int(key): (int(start), int(end))
+                             for key, start, end in zip(keys, starts, ends)}
+
+    @classmethod
+    def load(cls, directory: str = DEFAULT_DIRECTORY, element: Optional[str] = "PRCP",
+             cell_degrees: float = DEFAULT_CELL_DEGREES) -> 'StationInventory':
+        """
+        Loads the inventory from a ghcnd-stations.txt file and, if an element is given, a
+        ghcnd-inventory.txt file in the same directory.
+
+        Parameters:
+            directory (str): The directory containing the files.
+            element (Optional[str]): If given, only stations with data for this element are kept,
+                along with the years they have data for.
+            cell_degrees (float): The size of the grid cells in degrees.
+
+        Returns:
+            StationInventory: The loaded inventory.
+
+        Raises:
+            FileNotFoundError: If the files have not been downloaded.
+        """
+
+        with open(os.path.join(directory, STATIONS_FILENAME), encoding='UTF-8') as file:
+            stations = parse_stations(file)
+
+        if element is None:
+            return cls(stations['ids'], stations['names'], stations['latitudes'],
+                       stations['longitudes'], cell_degrees=cell_degrees)
+
+        with open(os.path.join(directory, INVENTORY_FILENAME), encoding='UTF-8') as file:
+            years = parse_inventory(file, element)
+
+        keep = [i for i, station_id in enumerate(stations['ids']) if station_id in years]
+        return cls([stations['ids'][i] for i in keep], [stations['names'][i] for i in keep],
+                   [stations['latitudes'][i] for i in keep],
+                   [stations['longitudes'][i] for i in keep],
+                   [years[stations['ids'][i]][0] for i in keep],
+                   [years[stations['ids'][i]][1] for i in keep], cell_degrees)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _cells(self, latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+        rows = np.clip(((latitudes + 90) // self._cell_degrees).astype(int), 0, self._rows - 1)
+        columns = ((longitudes + 180) // self._cell_degrees).astype(int) % self._columns
+        return rows * self._columns + columns
+
+    def _candidates(self, latitude: float, longitude: float, radius_km: float) -> np.ndarray:
+        # The grid cells overlapping a box around the circle of the search radius
+        radius_degrees = math.degrees(radius_km / EARTH_RADIUS_KM)
+        first_row = max(0, int((latitude - radius_degrees + 90) // self._cell_degrees))
+        last_row = min(self._rows - 1, int((latitude + radius_degrees + 90) // self._cell_degrees))
+
+        # Longitude degrees get shorter towards the poles, so the box gets wider
+        max_latitude = min(90.0, abs(latitude) + radius_degrees)
+        cosine = math.cos(math.radians(max_latitude))
+        if cosine < 1e-9 or radius_degrees / cosine >= 180:
+            columns = range(self._columns)
+        else:
+            longitude_degrees = radius_degrees / cosine
+            first_column = int((longitude - longitude_degrees + 180) // self._cell_degrees)
+            last_column = int((longitude + longitude_degrees + 180) // self._cell_degrees)
+            columns = [column % self._columns
+                       for column in range(first_column, min(last_column,
+                                                             first_column + self._columns - 1) + 1)]
+
+        slices = [self._cell_slices.get(row * self._columns + column)
+                  for row in range(first_row, last_row + 1) for column in columns]
+        parts = [self._order[start:end] for start, end in filter(None, slices)]
+
+        return np.concatenate(parts) if parts else np.empty(0, dtype=int)
+
+    def within(self, latitude: float, longitude: float, radius_km: float) -> tuple:
+        """
+        Finds the stations within a radius of a location.
+
+        Parameters:
+            latitude (float): The latitude of the location in decimal degrees.
+            longitude (float): The longitude of the location in decimal degrees.
+            radius_km (float): The search radius in kilometers.
+
+        Returns:
+            tuple: The indices of the stations and their distances in kilometers, as arrays sorted
+            by distance.
+        """
+
+        candidates = self._candidates(latitude, longitude, radius_km)
+        distances = haversine_distances(latitude, longitude, self.latitudes[candidates],
+                                        self.longitudes[candidates])
+        inside = distances <= radius_km
+        candidates, distances = candidates[inside], distances[inside]
+        order = np.argsort(distances, kind='stable')
+
+        return candidates[order], distances[order]
+
+    def nearest(self, latitude: float, longitude: float, k: int = 5,
+                radius_km: float = 50.0, min_last_year: Optional[int] = None,
+                min_years: int = 0) -> tuple:
+        """
+        Finds the k nearest stations within a radius of a location that have recent and long
+        enough records.
+
+        Parameters:
+            latitude (float): The latitude of the location in decimal degrees.
+            longitude (float): The longitude of the location in decimal degrees.
+            k (int): The maximum number of stations to return.
+            radius_km (float): The search radius in kilometers.
+            min_last_year (Optional[int]): Only keep stations with data for this year or later.
+            min_years (int): Only keep stations with data for at least this many years.
+
+        Returns:
+            tuple: The indices of the stations and their distances in kilometers, as arrays sorted
+            by distance.
+        """
+
+        indices, distances = self.within(latitude, longitude, radius_km)
+
+        if self.last_years is not None:
+            keep = self.last_years[indices] - self.first_years[indices] >= min_years
+            if min_last_year is not None:
+                keep &= self.last_years[indices] >= min_last_year
+            indices, distances = indices[keep], distances[keep]
+
+        return indices[:k], distances[:k]
+
+    def station(self, index: int) -> dict:
+        """
+        Returns a station in the format of the results of the NOAA stations endpoint, so it can be
+        used in place of the API.
+
+        Parameters:
+            index (int): The index of the station in the inventory.
+
+        Returns:
+            dict: The 'id', 'name', 'latitude', 'longitude', 'mindate', 'maxdate' and
+            'datacoverage' of the station. The inventory has no data coverage, so it is 1.
+        """
+
+        station = {
+            'id': f"GHCND:{self.ids[index]}",
+            'name': self.names[index],
+            'latitude': float(self.latitudes[index]),
+            'longitude': float(self.longitudes[index]),
+            'datacoverage': 1.0,
+        }
+
+        if self.first_years is not None:
+            station['mindate'] = f"{self.first_years[index]}-01-01"
+            station['maxdate'] = f"{self.last_years[index]}-12-31"
+
+        return station
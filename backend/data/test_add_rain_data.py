@@ -0,0 +1,292 @@
+"""
+Test cases for planning and aggregating the rain data requests
+"""
+
+from datetime import datetime, timedelta
+
+import mongomock
+import pytest
+
+from data import add_rain_data
+from data.add_rain_data import (MONTH_NAMES, RainWriter, aggregate_rainy_days,
+                                build_rain_update, get_station_years, load_rain_sums, plan_rain_requests,
+                                read_rain_rows, save_rain_sums, sum_rain_by_year)
+from data.checkpoint import JobCheckpoint
+from data.records import StationRecord
+
+STATIONS = [
+    StationRecord(datetime(1950, 1, 1), datetime(2023, 4, 30), "A", "Algiers", "Algeria",
+                  "GHCND:A"),
+    StationRecord("2010-06-01", "2021-08-30", "B", "Kabul", "Afghanistan", "GHCND:B"),
+    StationRecord("2019-01-01", "2022-01-01", "C", "Dubai", "United Arab Emirates", "GHCND:C"),
+]
+
+
+def make_observations(station_id: str, year: int) -> list:
+    """
+    Returns a year of made up daily precipitation observations for a station, with some days
+    missing and some values missing.
+    """
+
+    observations = []
+    day = datetime(year, 1, 1)
+    seed = sum(map(ord, station_id)) + year
+
+    while day.year == year:
+        seed = (seed * 1103515245 + 12345) % 2 ** 31
+        if seed % 7:
+            value = None if seed % 13 == 0 else round((seed % 500) / 100, 1)
+            observations.append({"date": day.strftime("%Y-%m-%dT%H:%M:%S"),
+                                 "station": station_id, "value": value})
+        day += timedelta(days=1)
+
+    return observations
+
+
+def fetch(params: dict) -> list:
+    """
+    Returns the observations the API would return for a request.
+    """
+
+    year = int(params["startdate"][:4])
+    return [observation for station_id in params["stationid"]
+            for observation in make_observations(station_id, year)]
+
+
+def count_rainy_days_per_year(max_date: datetime, min_date: datetime, station_id: str) -> tuple:
+    """
+    The calculation of count_rainy_days before requests were shared between stations, with one
+    request per station and year.
+    """
+
+    rainy_days_per_month = {month: 0 for month in MONTH_NAMES}
+    total_precipitation_per_month = {month: 0 for month in MONTH_NAMES}
+
+    for year_offset in range(1, 21):
+        year = max_date.year - year_offset
+        if min_date.year + 1 > year:
+            break
+
+        for observation in make_observations(station_id, year):
+            date = datetime.strptime(observation["date"], "%Y-%m-%dT%H:%M:%S")
+            month_name = date.strftime("%b").lower()
+            precipitation = observation["value"]
+            if precipitation is not None and float(precipitation) >= 1.0:
+                rainy_days_per_month[month_name] += 1
+            if precipitation is not None:
+                total_precipitation_per_month[month_name] += float(precipitation)
+
+    for month in MONTH_NAMES:
+        rainy_days_per_month[month] /= min(20, max_date.year - min_date.year - 1)
+        rainy_days_per_month[month] = round(rainy_days_per_month[month], 2)
+        total_precipitation_per_month[month] /= min(20, max_date.year - min_date.year - 1)
+        total_precipitation_per_month[month] = round(total_precipitation_per_month[month], 2)
+
+    return rainy_days_per_month, total_precipitation_per_month
+
+
+def test_station_years():
+    """
+    Tests that up to 20 full years before the max date are used.
+    """
+
+    assert get_station_years(datetime(2023, 4, 30), datetime(1950, 1, 1)) == list(
+        range(2022, 2002, -1))
+    assert get_station_years(datetime(2021, 8, 30), datetime(2010, 6, 1)) == list(
+        range(2020, 2010, -1))
+    assert not get_station_years(datetime(2021, 1, 1), datetime(2020, 1, 1))
+
+
+def test_requests_shared_between_stations():
+    """
+    Tests that each request covers one year of several stations and that every station year is
+    requested exactly once.
+    """
+
+    all_params = plan_rain_requests(STATIONS, stations_per_request=2)
+
+    requested = [(station_id, params["startdate"], params["enddate"])
+                 for params in all_params for station_id in params["stationid"]]
+    expected = [(station.id, f"{year}-01-01", f"{year}-12-31") for station in STATIONS
+                for year in get_station_years(station.maxdate, station.mindate)]
+
+    assert sorted(requested) == sorted(expected)
+    assert all(len(params["stationid"]) <= 2 for params in all_params)
+    assert len(all_params) < len(expected)
+
+
+def test_counts_match_per_year_requests():
+    """
+    Tests that the averages calculated from shared requests match one request per station and year.
+    Rainy days match exactly. Total precipitation is summed in a different order, so it can differ
+    by floating point error before rounding.
+    """
+
+    all_params = plan_rain_requests(STATIONS, stations_per_request=2)
+    sums = sum_rain_by_year(all_params, [fetch(params) for params in all_params])
+
+    for station in STATIONS:
+        rainy_days, total_precipitation = aggregate_rainy_days(
+            sums[station.id], station.maxdate, station.mindate)
+        expected_rainy_days, expected_total_precipitation = count_rainy_days_per_year(
+            station.maxdate, station.mindate, station.id)
+
+        assert rainy_days == expected_rainy_days
+        for month in MONTH_NAMES:
+            assert abs(total_precipitation[month] - expected_total_precipitation[month]) <= 0.01
+
+
+def test_stations_stop_after_failed_request(monkeypatch):
+    """
+    Tests that once a request fails, e.g. because the daily quota is used up, the error is raised
+    without sending the requests of the remaining stations.
+    """
+
+    sent = []
+
+    class QuotaClient:
+        def get_all_results(self, endpoint, params):
+            sent.append(params)
+            if len(sent) == 2:
+                raise RuntimeError("429 Too Many Requests")
+            return fetch(params)
+
+    monkeypatch.setattr(add_rain_data, "get_noaa_client", QuotaClient)
+    all_params = plan_rain_requests(STATIONS, stations_per_request=1)
+
+    with pytest.raises(RuntimeError):
+        list(add_rain_data.fetch_rain_for_stations(STATIONS, max_workers=2,
+                                                   stations_per_request=1))
+
+    assert len(sent) <= 3 < len(all_params)
+
+
+def test_incremental_refresh_only_requests_new_years():
+    """
+    Tests that after the sums of each year are stored, a refresh a year later only requests the new
+    year, and that the averages calculated from the stored and new sums match a full refresh.
+    """
+
+    sums_collection = mongomock.MongoClient().db.rain_sums
+    all_params = plan_rain_requests(STATIONS)
+    save_rain_sums(sums_collection, sum_rain_by_year(all_params,
+                                                     [fetch(params) for params in all_params]))
+
+    refreshed = [StationRecord(station.mindate,
+                               station.maxdate.replace(year=station.maxdate.year + 1),
+                               station.name, station.city, station.country, station.id)
+                 for station in STATIONS]
+    station_ids = [station.id for station in refreshed]
+    known_sums = load_rain_sums(sums_collection, station_ids)
+    new_params = plan_rain_requests(refreshed, known_years=known_sums)
+
+    assert sorted((station_id, params["startdate"]) for params in new_params
+                  for station_id in params["stationid"]) == [
+        ("GHCND:A", "2023-01-01"), ("GHCND:B", "2021-01-01"), ("GHCND:C", "2022-01-01")]
+
+    save_rain_sums(sums_collection, sum_rain_by_year(new_params,
+                                                     [fetch(params) for params in new_params]))
+    stored_sums = load_rain_sums(sums_collection, station_ids)
+
+    for station in refreshed:
+        expected_rainy_days, expected_total_precipitation = count_rainy_days_per_year(
+            station.maxdate, station.mindate, station.id)
+        rainy_days, total_precipitation = aggregate_rainy_days(
+            stored_sums[station.id], station.maxdate, station.mindate)
+
+        assert rainy_days == expected_rainy_days
+        for month in MONTH_NAMES:
+            assert abs(total_precipitation[month] - expected_total_precipitation[month]) <= 0.01
+
+
+class CountingCollection:
+    """
+    Wraps a collection and records the number of updates in every bulk write.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.batches = []
+
+    def bulk_write(self, operations, ordered=True):
+        self.batches.append(len(operations))
+        return self.collection.bulk_write(operations, ordered=ordered)
+
+
+def test_build_rain_update_only_sets_rainy_days():
+    """
+    Tests that the update of a station sets the rainy days of every month of its city and keeps
+    the temperatures.
+    """
+
+    cities_collection = mongomock.MongoClient().db.cities
+    cities_collection.insert_one({"city": "Lima", "country": "Peru",
+                                  "months": {"jan": {"temperature": 23.0}}})
+    station = StationRecord("1990-01-01", "2023-01-01", "LIMA, PE", "Lima", "Peru", "GHCND:PE1")
+    days_rainy = {month: float(index) for index, month in enumerate(MONTH_NAMES)}
+
+    cities_collection.bulk_write([build_rain_update(station, days_rainy)])
+
+    months = cities_collection.find_one({"city": "Lima", "country": "Peru"})["months"]
+    assert months["jan"] == {"temperature": 23.0, "rain": 0.0}
+    assert {month: months[month]["rain"] for month in MONTH_NAMES} == days_rainy
+
+
+def test_rain_writer_flushes_every_flush_every_stations(tmp_path):
+    """
+    Tests that updates are only written once flush_every stations have been added, and that the
+    rest are written when the writer is closed.
+    """
+
+    cities_collection = CountingCollection(mongomock.MongoClient().db.cities)
+    checkpoint = JobCheckpoint(str(tmp_path / "checkpoint.json"))
+    checkpoint.start()
+    stations = [StationRecord("1990-01-01", "2023-01-01", f"STATION {index}", f"City {index}",
+                              "Peru", f"GHCND:PE{index}") for index in range(5)]
+    days_rainy = {month: 1.5 for month in MONTH_NAMES}
+
+    with RainWriter(cities_collection, str(tmp_path / "rain.csv"), checkpoint,
+                    flush_every=2) as rain_writer:
+        rain_writer.add(stations[0], days_rainy, days_rainy)
+        assert cities_collection.batches == []
+
+        rain_writer.add(stations[1], days_rainy, days_rainy)
+        assert cities_collection.batches == [2]
+        assert checkpoint.completed == {"GHCND:PE0", "GHCND:PE1"}
+
+        for station in stations[2:]:
+            rain_writer.add(station, days_rainy, days_rainy)
+        assert cities_collection.batches == [2, 2]
+
+    assert cities_collection.batches == [2, 2, 1]
+    assert checkpoint.completed == {station.id for station in stations}
+    assert len(read_rain_rows(str(tmp_path / "rain.csv"))) == 5
+
+
+def test_rain_writer_is_idempotent_and_checkpoints(tmp_path):
+    """
+    Tests that saving a station again replaces its CSV row, and that stations are only recorded in
+    the checkpoint once they have been written.
+    """
+
+    cities_collection = mongomock.MongoClient().db.cities
+    cities_collection.insert_one({"city": "Lima", "country": "Peru", "months": {}})
+    csv_path = str(tmp_path / "rain.csv")
+    checkpoint = JobCheckpoint(str(tmp_path / "checkpoint.json"))
+    checkpoint.start()
+    station = StationRecord("1990-01-01", "2023-01-01", "LIMA, PE", "Lima", "Peru", "GHCND:PE1")
+    days_rainy = {month: 1.5 for month in MONTH_NAMES}
+
+    with RainWriter(cities_collection, csv_path, checkpoint, flush_every=10) as rain_writer:
+        rain_writer.add(station, days_rainy, days_rainy)
+        assert not checkpoint.completed
+
+    assert checkpoint.completed == {"GHCND:PE1"}
+    assert cities_collection.find_one({"city": "Lima"})["months"]["jan"]["rain"] == 1.5
+
+    with RainWriter(cities_collection, csv_path, checkpoint) as rain_writer:
+        rain_writer.add(station, {**days_rainy, "jan": 2.0}, days_rainy)
+
+    rows = read_rain_rows(csv_path)
+    assert list(rows) == ["GHCND:PE1"]
+    assert "'jan': 2.0" in rows["GHCND:PE1"][4]
@@ -0,0 +1,64 @@
+"""
+Test cases for building the safety updates
+"""
+
+import mongomock
+
+from bulk_writes import write_in_batches
+from data.add_safety_data import build_safety_updates, match_countries, save_country_safety
+
+
+def test_match_countries_ignores_case_and_whitespace():
+    """
+    Tests that advisory countries are matched to the spelling used by the cities, and that
+    countries without cities are reported.
+    """
+
+    matched, unmatched = match_countries(
+        ['France', ' united kingdom', 'Atlantis'], ['France', 'United Kingdom', 'Peru', None])
+
+    assert matched == {'France': 'France', ' united kingdom': 'United Kingdom'}
+    assert unmatched == ['Atlantis']
+
+
+def test_build_safety_updates_groups_countries_by_safety():
+    """
+    Tests that there is one update per safety value and that it sets the safety of every city in
+    the matched countries.
+    """
+
+    collection = mongomock.MongoClient().db.cities
+    collection.insert_many([
+        {'city': 'Paris', 'country': 'France'},
+        {'city': 'Lyon', 'country': 'France'},
+        {'city': 'Lima', 'country': 'Peru'},
+        {'city': 'Kabul', 'country': 'Afghanistan'},
+        {'city': 'Oslo', 'country': 'Norway'},
+    ])
+
+    updates, unmatched = build_safety_updates(
+        {'France': 1, 'Peru': 2, 'Afghanistan': 4, 'Norway': 1, 'Atlantis': 3},
+        collection.distinct('country'))
+
+    assert len(updates) == 3
+    assert unmatched == ['Atlantis']
+
+    totals = write_in_batches(collection, updates)
+
+    assert totals['batches'] == 1
+    assert totals['modified'] == 5
+    safety = {document['city']: document['safety'] for document in collection.find()}
+    assert safety == {'Paris': 1, 'Lyon': 1, 'Lima': 2, 'Kabul': 4, 'Oslo': 1}
+
+
+def test_save_country_safety_replaces_table():
+    """
+    Tests that the country safety table holds exactly the countries of the latest advisories.
+    """
+
+    collection = mongomock.MongoClient().db.country_safety
+    save_country_safety(collection, {'France': 1, 'Peru': 2})
+    save_country_safety(collection, {'France': 2, 'Atlantis': 3})
+
+    assert {document['_id']: document['safety'] for document in collection.find()} == {
+        'France': 2, 'Atlantis': 3}
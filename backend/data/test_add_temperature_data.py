@@ -0,0 +1,96 @@
+"""
+Test cases for building and writing the temperature updates of the cities
+"""
+
+import math
+
+import mongomock
+import pandas as pd
+import pytest
+
+from data import add_temperature_data
+from data.add_temperature_data import (MONTH_NAMES, add_temperature_to_db, build_city_updates,
+                                       convert_temps_to_float)
+
+
+def make_city_data(count: int) -> pd.DataFrame:
+    """
+    Returns a table in the format of the Wikipedia page with count made up cities.
+    """
+
+    rows = []
+    for index in range(count):
+        row = {"Country": f"Country {index}", "City": f"City {index}"}
+        for month_number, month_name in enumerate(MONTH_NAMES):
+            row[month_name] = f"{index - month_number}.5 ({index * 2}.0)"
+        rows.append(row)
+
+    return pd.DataFrame(rows)
+
+
+class CountingCollection:
+    """
+    Wraps a collection and records the size of every bulk write.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.batches = []
+
+    def bulk_write(self, operations, ordered=True):
+        self.batches.append(len(operations))
+        return self.collection.bulk_write(operations, ordered=ordered)
+
+
+@pytest.fixture(name='cities')
+def fixture_cities():
+    return mongomock.MongoClient().db.cities
+
+
+def test_convert_temps_to_float():
+    temperatures = convert_temps_to_float(pd.Series(["13.4 (56.1)", "−2.5 (27.5)", "n/a", None]))
+
+    assert temperatures.tolist()[:2] == [13.4, -2.5]
+    assert all(math.isnan(value) for value in temperatures.tolist()[2:])
+
+
+def test_build_city_updates_sets_month_temperatures(cities):
+    city_data = make_city_data(1)
+    city_data.loc[0, "Jan"] = "−3.2 (26.2)"
+    city_data.loc[0, "Feb"] = "not measured"
+
+    updates = build_city_updates(city_data)
+    assert len(updates) == 1
+
+    # The update is an upsert, so the city is created
+    cities.bulk_write(updates)
+    city = cities.find_one({"city": "City 0", "country": "Country 0"}, {"_id": 0})
+
+    assert set(city["months"]) == {month_name.lower() for month_name in MONTH_NAMES}
+    assert all(set(month) == {"temperature"} and isinstance(month["temperature"], float)
+               for month in city["months"].values())
+    assert city["months"]["jan"]["temperature"] == -3.2
+    assert math.isnan(city["months"]["feb"]["temperature"])
+    assert city["months"]["mar"]["temperature"] == -2.5
+
+
+def test_updates_keep_rain_data(cities):
+    cities.insert_one({"city": "City 0", "country": "Country 0",
+                       "months": {"jan": {"rainy_days": 4.0}}})
+
+    cities.bulk_write(build_city_updates(make_city_data(2)))
+
+    city = cities.find_one({"city": "City 0"})
+    assert city["months"]["jan"] == {"rainy_days": 4.0, "temperature": 0.5}
+    assert cities.find_one({"city": "City 1"})["months"]["dec"]["temperature"] == -10.5
+
+
+def test_add_temperature_to_db_writes_in_batches(monkeypatch, cities):
+    collection = CountingCollection(cities)
+    monkeypatch.setattr(add_temperature_data, "fetch_city_data", lambda: make_city_data(5))
+    monkeypatch.setattr(add_temperature_data, "get_database", lambda: {"cities": collection})
+
+    add_temperature_to_db(batch_size=2)
+
+    assert collection.batches == [2, 2, 1]
+    assert cities.count_documents({}) == 5
@@ -0,0 +1,76 @@
+"""
+Test cases for the persistent API response cache
+"""
+
+import pytest
+
+from data.api_cache import ApiCache, CacheMissError, make_key
+
+
+def test_key_ignores_parameter_order():
+    """
+    Tests that the same parameters in a different order give the same key.
+    """
+
+    assert make_key("noaa/data", {"a": 1, "b": [1, 2]}) == make_key("noaa/data",
+                                                                    {"b": [1, 2], "a": 1})
+    assert make_key("noaa/data", {"a": 1}) != make_key("noaa/stations", {"a": 1})
+    assert make_key("noaa/data", {"a": 1}) != make_key("noaa/data", {"a": 2})
+
+
+def test_fetches_once(tmp_path):
+    """
+    Tests that a response is only fetched once, including by a new cache using the same file.
+    """
+
+    path = str(tmp_path / "cache.sqlite3")
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return {"results": [{"value": 1.5}]}
+
+    assert ApiCache(path).cached("noaa/data", {"a": 1}, fetch) == {"results": [{"value": 1.5}]}
+    assert ApiCache(path).cached("noaa/data", {"a": 1}, fetch) == {"results": [{"value": 1.5}]}
+    assert len(calls) == 1
+
+
+def test_ttl(clock):
+    """
+    Tests that an expired response is fetched again.
+    """
+
+    cache = ApiCache(":memory:", ttl=10, clock=clock)
+
+    cache.put("noaa/data", {"a": 1}, "old")
+    clock.now = 11
+
+    assert cache.get("noaa/data", {"a": 1}) is None
+    assert cache.cached("noaa/data", {"a": 1}, lambda: "new") == "new"
+
+
+def test_invalidate_endpoint():
+    """
+    Tests that invalidating an endpoint only removes the responses of that endpoint.
+    """
+
+    cache = ApiCache(":memory:")
+    cache.put("noaa/data", {"a": 1}, "data")
+    cache.put("opencage/geocode", {"query": "Toronto, Canada"}, "geocode")
+
+    assert cache.invalidate("noaa/data") == 1
+    assert cache.get("noaa/data", {"a": 1}) is None
+    assert cache.get("opencage/geocode", {"query": "Toronto, Canada"}) == "geocode"
+
+
+def test_offline():
+    """
+    Tests that an offline cache serves cached responses and never fetches missing ones.
+    """
+
+    cache = ApiCache(":memory:", offline=True)
+    cache.put("noaa/data", {"a": 1}, "data")
+
+    assert cache.cached("noaa/data", {"a": 1}, lambda: "new") == "data"
+    with pytest.raises(CacheMissError):
+        cache.cached("noaa/data", {"a": 2}, lambda: "new")
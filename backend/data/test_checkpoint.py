@@ -0,0 +1,81 @@
+"""
+Test cases for the job checkpoints
+"""
+
+import json
+
+import pytest
+
+from data.checkpoint import JobCheckpoint, UnfinishedJobError, atomic_write
+
+
+def test_resume_skips_completed_items(tmp_path):
+    """
+    Tests that a resumed run loads the items completed by the previous run.
+    """
+
+    path = str(tmp_path / "job.json")
+    checkpoint = JobCheckpoint(path)
+    checkpoint.start()
+    checkpoint.mark_completed(["a", "b"])
+
+    resumed = JobCheckpoint(path)
+    resumed.start(resume=True)
+
+    assert resumed.completed == {"a", "b"}
+    assert resumed.started == checkpoint.started
+
+
+def test_unfinished_run_must_be_resumed_or_restarted(tmp_path):
+    """
+    Tests that a new run refuses to start over an unfinished run unless told what to do, and that
+    restarting discards the completed items.
+    """
+
+    path = str(tmp_path / "job.json")
+    JobCheckpoint(path).start()
+    JobCheckpoint(path).mark_completed(["a"])
+
+    with pytest.raises(UnfinishedJobError):
+        JobCheckpoint(path).start()
+
+    restarted = JobCheckpoint(path)
+    restarted.start(restart=True)
+    assert not restarted.completed
+
+    with open(path, encoding="UTF-8") as file:
+        assert json.load(file)["completed"] == []
+
+
+def test_finished_run_starts_fresh(tmp_path):
+    """
+    Tests that finishing a run removes the checkpoint so the next run starts from the beginning.
+    """
+
+    path = str(tmp_path / "job.json")
+    checkpoint = JobCheckpoint(path)
+    checkpoint.start()
+    checkpoint.mark_completed(["a"])
+    checkpoint.finish()
+
+    assert not checkpoint.exists()
+    JobCheckpoint(path).start()
+
+
+def test_atomic_write_keeps_original_on_failure(tmp_path):
+    """
+    Tests that a failed write leaves the original file and no temporary files behind.
+    """
+
+    path = tmp_path / "data.csv"
+    path.write_text("original", encoding="UTF-8")
+
+    def failing_write(file):
+        file.write("partial")
+        raise RuntimeError("crash")
+
+    with pytest.raises(RuntimeError):
+        atomic_write(str(path), failing_write)
+
+    assert path.read_text(encoding="UTF-8") == "original"
+    assert [entry.name for entry in tmp_path.iterdir()] == ["data.csv"]
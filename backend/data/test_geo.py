@@ -0,0 +1,87 @@
+"""
+Test cases for the vectorized distance and station scoring
+"""
+
+import math
+
+import numpy as np
+
+from data.geo import (MIN_DISTANCE_KM, best_stations, distance_matrix, haversine_distances,
+                      score_stations)
+
+CITIES = [(36.7538, 3.0588), (34.5553, 69.2075), (25.2048, 55.2708)]
+STATIONS = [(36.7167, 3.25), (34.566, 69.212), (25.25, 55.333), (-33.9, 151.2)]
+
+
+def scalar_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """
+    The calculation of calculate_distance in rain/get_stations.py before it was vectorized.
+    """
+
+    dlat = math.radians(lat2 - lat1)
+    dlon = math.radians(lon2 - lon1)
+    a = math.sin(dlat / 2) * math.sin(dlat / 2) + math.cos(math.radians(lat1)) * \
+        math.cos(math.radians(lat2)) * math.sin(dlon / 2) * math.sin(dlon / 2)
+    return 6378 * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+def test_distance_matrix_matches_scalar_distance():
+    """
+    Tests that every city and station pair of the matrix matches the scalar calculation.
+    """
+
+    distances = distance_matrix(CITIES, STATIONS)
+
+    assert distances.shape == (3, 4)
+    for i, city in enumerate(CITIES):
+        for j, station in enumerate(STATIONS):
+            assert math.isclose(distances[i, j], scalar_distance(*city, *station), rel_tol=1e-9)
+
+
+def test_haversine_broadcasts_one_city_against_stations():
+    """
+    Tests that a single city can be compared to an array of stations.
+    """
+
+    lats, lons = zip(*STATIONS)
+    distances = haversine_distances(CITIES[0][0], CITIES[0][1], lats, lons)
+
+    np.testing.assert_allclose(distances, distance_matrix(CITIES[:1], STATIONS)[0])
+    assert haversine_distances(10, 20, 10, 20) == 0
+
+
+def test_zero_distance_station_has_finite_score():
+    """
+    Tests that a station at the exact coordinates of a city is scored as if it were the minimum
+    distance away instead of dividing by zero.
+    """
+
+    scores = score_stations([0.0, 0.5, 10.0], [0.9, 0.9, 0.9])
+
+    assert np.isfinite(scores).all()
+    np.testing.assert_allclose(scores, [0.9 / MIN_DISTANCE_KM, 1.8, 0.09])
+
+
+def test_closer_station_within_one_km_scores_higher():
+    """
+    Tests that stations less than a kilometer from a city are still told apart by their distance.
+    """
+
+    scores = score_stations([0.9, 0.2], [1.0, 1.0])
+
+    assert scores[1] > scores[0]
+    assert best_stations(scores) == 1
+
+
+def test_best_stations_per_city():
+    """
+    Tests that the closest station with full coverage is chosen for each city, and that cities
+    without scored stations get -1.
+    """
+
+    scores = score_stations(distance_matrix(CITIES, STATIONS), [1.0, 1.0, 1.0, 1.0])
+    np.testing.assert_array_equal(best_stations(scores), [0, 1, 2])
+
+    scores = np.array([[np.nan, np.nan], [np.nan, 2.0]])
+    np.testing.assert_array_equal(best_stations(scores), [-1, 1])
+    assert best_stations(np.empty((2, 0))).tolist() == [-1, -1]
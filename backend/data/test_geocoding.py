@@ -0,0 +1,63 @@
+"""
+Test cases for the shared geocoding layer
+"""
+
+import mongomock
+
+from data.api_cache import ApiCache
+from data.geocoding import Geocoder, Location, OpenCageProvider, StaticProvider
+
+ALGIERS = Location(36.7538, 3.0588, (36.82, 3.23, 36.68, 2.93))
+KABUL = Location(34.5553, 69.2075)
+
+
+def make_cities_collection():
+    """
+    Returns a cities collection with a few cities.
+    """
+
+    collection = mongomock.MongoClient().db.cities
+    collection.insert_many([{"city": "Algiers", "country": "Algeria"},
+                            {"city": "Kabul", "country": "Afghanistan"},
+                            {"city": "Atlantis", "country": "Nowhere"}])
+    return collection
+
+
+def test_provider_only_called_on_cache_miss():
+    """
+    Tests that cities are geocoded once, including cities that could not be found, and that the
+    locations are stored in the cities collection.
+    """
+
+    collection = make_cities_collection()
+    provider = StaticProvider({"Algiers, Algeria": ALGIERS, "Kabul, Afghanistan": KABUL})
+    geocoder = Geocoder(provider, collection)
+    cities = [("Algiers", "Algeria"), ("Kabul", "Afghanistan"), ("Atlantis", "Nowhere")]
+
+    assert geocoder.locate_many(cities) == {cities[0]: ALGIERS, cities[1]: KABUL, cities[2]: None}
+    assert len(provider.queries) == 3
+
+    other_run = Geocoder(StaticProvider({}), collection)
+    assert other_run.locate_many(cities) == {cities[0]: ALGIERS, cities[1]: KABUL,
+                                             cities[2]: None}
+    assert other_run.locate("Algiers", "Algeria").bounds == ALGIERS.bounds
+    assert collection.find_one({"city": "Kabul"})["location"] == {
+        "lat": 34.5553, "lng": 69.2075, "bounds": None}
+
+
+def test_open_cage_results_are_parsed():
+    """
+    Tests that OpenCage results are converted to locations, using a cached response so no request
+    is sent.
+    """
+
+    cache = ApiCache(":memory:")
+    cache.put("opencage/geocode", {"query": "Algiers, Algeria"}, [{
+        "geometry": {"lat": 36.7538, "lng": 3.0588},
+        "bounds": {"northeast": {"lat": 36.82, "lng": 3.23},
+                   "southwest": {"lat": 36.68, "lng": 2.93}},
+    }])
+    cache.put("opencage/geocode", {"query": "Atlantis, Nowhere"}, [])
+    provider = OpenCageProvider("key", cache=cache)
+
+    assert provider.geocode_many(["Algiers, Algeria", "Atlantis, Nowhere"]) == [ALGIERS, None]
@@ -0,0 +1,79 @@
+"""
+Test cases for requesting the NOAA API locations and stations of the cities
+"""
+
+import pytest
+import requests
+
+from data.api_cache import ApiCache
+from data.noaa_client import NoaaClient
+from data.rain import get_city_id, get_stations, get_weather_stations
+
+
+class FakeResponse:
+    """
+    A response of the NOAA API.
+    """
+
+    def __init__(self, status_code: int, body: dict):
+        self.status_code = status_code
+        self._body = body
+
+    def json(self) -> dict:
+        return self._body
+
+
+class RecordingClient:
+    """
+    Stands in for the shared NOAA client and records the endpoint of every request.
+    """
+
+    def __init__(self):
+        self.endpoints = []
+
+    def get(self, endpoint: str, params: dict) -> dict:
+        self.endpoints.append(endpoint)
+        return {"results": [{"id": "GHCND:PE1"}]}
+
+    def get_results(self, endpoint: str, params: dict) -> list:
+        return self.get(endpoint, params)["results"]
+
+
+def test_error_responses_are_not_cached(monkeypatch):
+    """
+    Tests that a failed request raises instead of storing the error body in the API cache, so the
+    next run requests the locations again.
+    """
+
+    cache = ApiCache(":memory:")
+    client = NoaaClient("token", limiters=[], max_retries=0, cache=cache)
+    responses = [FakeResponse(429, {"status": "429", "message": "quota exceeded"}),
+                 FakeResponse(200, {"results": [{"name": "Lima, PE"}]})]
+    monkeypatch.setattr(get_city_id, "get_noaa_client", lambda: client)
+    monkeypatch.setattr(requests.Session, "get", lambda *args, **kwargs: responses.pop(0))
+    params = {"limit": 1000, "offset": 0}
+
+    with pytest.raises(ValueError):
+        get_city_id.get_locations(params)
+    assert cache.get("noaa/locations", params) is None
+
+    assert get_city_id.get_locations(params) == {"results": [{"name": "Lima, PE"}]}
+    assert cache.get("noaa/locations", params) == {"results": [{"name": "Lima, PE"}]}
+
+
+def test_requests_share_the_noaa_client(monkeypatch):
+    """
+    Tests that the locations and stations are requested with the shared NOAA client, so that every
+    request counts against the same rate limits.
+    """
+
+    client = RecordingClient()
+    for module in (get_city_id, get_stations, get_weather_stations):
+        monkeypatch.setattr(module, "get_noaa_client", lambda: client)
+
+    get_city_id.get_locations({"limit": 1000, "offset": 0})
+    assert get_stations.get_station({"locationid": "CITY:PE000001"}) == [{"id": "GHCND:PE1"}]
+    assert get_weather_stations.get_station_data({"datasetid": "GHCND"}) == {
+        "results": [{"id": "GHCND:PE1"}]}
+
+    assert client.endpoints == ["locations", "stations", "stations"]
@@ -0,0 +1,38 @@
+"""
+Test cases for importing the data scripts without side effects
+"""
+
+import os
+import subprocess
+import sys
+
+BACKEND_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+MODULES = [
+    "data.update_database",
+    "data.add_rain_data",
+    "data.rain.get_city_id",
+    "data.rain.get_stations",
+    "data.rain.get_weather_stations",
+]
+
+
+def test_import_makes_no_connections():
+    """
+    Tests that importing the scripts does not create a database client or geocoder, and works
+    without any credentials in the environment.
+    """
+
+    code = "; ".join([
+        *(f"import {module}" for module in MODULES),
+        "import get_database, data.geocoding, data.noaa_client",
+        "assert get_database._client is None",
+        "assert data.geocoding._geocoder is None",
+        "assert data.noaa_client._noaa_client is None",
+        "assert 'opencage.geocoder' not in sys.modules",
+    ])
+    environment = {key: value for key, value in os.environ.items()
+                   if key not in ('MONGODB_URI', 'NCEI_TOKEN', 'OPENCAGE_API_KEY')}
+
+    subprocess.run([sys.executable, "-c", f"import sys; {code}"], cwd=BACKEND_DIRECTORY,
+                   env=environment, check=True)
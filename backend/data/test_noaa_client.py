@@ -0,0 +1,207 @@
+"""
+Test cases for the NOAA API client, run against a local stub HTTP server
+"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from data.api_cache import ApiCache
+from data.noaa_client import NoaaClient, TokenBucket, fetch_all
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Answers every request with the next queued status code, echoing the request parameters back
+    as the results once the status is 200.
+    """
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append(self.path)
+            status = server.statuses.pop(0) if server.statuses else 200
+
+        params = {key: values[0] for key, values in parse_qs(urlparse(self.path).query).items()}
+
+        if server.dataset is None:
+            body = json.dumps({"results": [params]}).encode()
+        else:
+            # Serve a page of the dataset the same way the CDO API does, with 1-based offsets
+            start = int(params["offset"]) - 1
+            page = server.dataset[start:start + int(params["limit"])]
+            body = json.dumps({
+                "metadata": {"resultset": {"count": len(server.dataset)}},
+                "results": page
+            } if page else {}).encode()
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    """
+    Starts a stub NOAA API server on a free local port.
+    """
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.lock = threading.Lock()
+    server.requests = []
+    server.statuses = []
+    server.dataset = None
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_client(server, **kwargs) -> NoaaClient:
+    """
+    Returns a client for the stub server without rate limits or waits between retries.
+    """
+
+    return NoaaClient("token", base_url=f"http://127.0.0.1:{server.server_port}", limiters=[],
+                      sleep=lambda seconds: None, **kwargs)
+
+
+def test_get_results(stub_server):
+    """
+    Tests that the results of a successful request are returned.
+    """
+
+    client = make_client(stub_server)
+
+    assert client.get_results("data", {"stationid": "A"}) == [{"stationid": "A"}]
+    assert stub_server.requests[0].startswith("/data?")
+
+
+def test_retries_server_errors(stub_server):
+    """
+    Tests that rate limited requests and server errors are retried.
+    """
+
+    stub_server.statuses = [429, 503]
+    client = make_client(stub_server)
+
+    assert client.get_results("data", {"stationid": "A"}) == [{"stationid": "A"}]
+    assert len(stub_server.requests) == 3
+
+
+def test_gives_up_after_max_retries(stub_server):
+    """
+    Tests that a ValueError is thrown once all retries have failed.
+    """
+
+    stub_server.statuses = [503, 503, 503]
+    client = make_client(stub_server, max_retries=2)
+
+    with pytest.raises(ValueError):
+        client.get_results("data", {"stationid": "A"})
+    assert len(stub_server.requests) == 3
+
+
+def test_does_not_retry_client_errors(stub_server):
+    """
+    Tests that a request that is rejected by the API is not retried.
+    """
+
+    stub_server.statuses = [400]
+    client = make_client(stub_server)
+
+    with pytest.raises(ValueError):
+        client.get_results("data", {"stationid": "A"})
+    assert len(stub_server.requests) == 1
+
+
+def test_fetch_all_keeps_order(stub_server):
+    """
+    Tests that concurrent requests return their results in the order of the parameters.
+    """
+
+    client = make_client(stub_server)
+    all_params = [{"year": str(year)} for year in range(2000, 2020)]
+
+    results = fetch_all(client, "data", all_params, max_workers=8)
+
+    assert [result[0]["year"] for result in results] == [
+        params["year"] for params in all_params]
+
+
+def test_fetch_all_stops_after_failed_request():
+    """
+    Tests that once a request fails, e.g. because the daily quota is used up, the error is raised
+    without sending the remaining requests.
+    """
+
+    class QuotaClient:
+        def __init__(self):
+            self.sent = []
+
+        def get_all_results(self, endpoint, params):
+            self.sent.append(params["year"])
+            if params["year"] == 2001:
+                raise RuntimeError("429 Too Many Requests")
+            return [params]
+
+    client = QuotaClient()
+    all_params = [{"year": year} for year in range(2000, 2100)]
+
+    with pytest.raises(RuntimeError):
+        fetch_all(client, "data", all_params, max_workers=4)
+
+    # Only the requests in flight when the error was raised were sent
+    assert len(client.sent) <= 5
+
+
+def test_cached_responses(stub_server):
+    """
+    Tests that a request answered from the cache is not sent to the API.
+    """
+
+    client = make_client(stub_server, cache=ApiCache(":memory:"))
+
+    client.get_results("data", {"stationid": "A"})
+    client.get_results("data", {"stationid": "A"})
+    client.get_results("data", {"stationid": "B"})
+
+    assert len(stub_server.requests) == 2
+
+
+@pytest.mark.parametrize('size', [0, 1, 999, 1000, 1001, 2500])
+def test_get_all_results_pages(stub_server, size):
+    """
+    Tests that every result is retrieved when there are more results than fit in one page.
+    """
+
+    stub_server.dataset = [{"value": value} for value in range(size)]
+    client = make_client(stub_server)
+
+    assert client.get_all_results("data", {"stationid": "A"}) == stub_server.dataset
+    assert len(stub_server.requests) == max(1, -(-size // 1000))
+
+
+def test_token_bucket_limits_rate(clock):
+    """
+    Tests that the token bucket allows a burst of capacity requests and then waits for new tokens.
+    """
+
+    bucket = TokenBucket(rate=5, capacity=5, clock=clock, sleep=clock.sleep)
+
+    for _ in range(5):
+        bucket.acquire()
+    assert clock.now == 0
+
+    for _ in range(5):
+        bucket.acquire()
+    assert clock.now == pytest.approx(1)
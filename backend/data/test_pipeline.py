@@ -0,0 +1,123 @@
+"""
+Test cases for running the stages of a data update and swapping in the staging collection
+"""
+
+import threading
+
+import mongomock
+import pytest
+
+from data.pipeline import (PipelineError, Stage, prepare_staging, run_stages,
+                           swap_in_staging)
+
+
+def test_independent_stages_run_concurrently():
+    """
+    Tests that stages without dependencies between them run at the same time, by having each stage
+    wait for the other to start.
+    """
+
+    started = {'a': threading.Event(), 'b': threading.Event()}
+
+    def stage(name, other):
+        def run():
+            started[name].set()
+            assert started[other].wait(timeout=5)
+        return run
+
+    timings = run_stages([Stage('a', stage('a', 'b')), Stage('b', stage('b', 'a'))])
+
+    assert set(timings) == {'a', 'b'}
+
+
+def test_stages_start_after_their_dependencies():
+    """
+    Tests that a stage only starts once every stage it depends on has finished, and that
+    dependencies on stages that are not run are ignored.
+    """
+
+    order = []
+    lock = threading.Lock()
+
+    def stage(name):
+        def run():
+            with lock:
+                order.append(name)
+        return run
+
+    run_stages([
+        Stage('rain', stage('rain'), ['temperature', 'stations']),
+        Stage('safety', stage('safety'), ['temperature']),
+        Stage('temperature', stage('temperature')),
+    ])
+
+    assert order[0] == 'temperature'
+    assert sorted(order[1:]) == ['rain', 'safety']
+
+
+def test_failed_stage_stops_dependent_stages():
+    """
+    Tests that the stages depending on a failed stage are not started and that the failure is
+    raised along with the timings of the finished stages.
+    """
+
+    ran = []
+
+    def fail():
+        raise RuntimeError('no data')
+
+    with pytest.raises(PipelineError) as error:
+        run_stages([
+            Stage('temperature', fail),
+            Stage('safety', lambda: ran.append('safety'), ['temperature']),
+        ])
+
+    assert not ran
+    assert list(error.value.failures) == ['temperature']
+    assert isinstance(error.value.failures['temperature'], RuntimeError)
+    assert 'temperature' in error.value.timings
+
+
+def test_dependency_cycle_is_rejected():
+    """
+    Tests that stages which depend on each other raise an error instead of waiting forever.
+    """
+
+    with pytest.raises(ValueError):
+        run_stages([Stage('a', lambda: None, ['b']), Stage('b', lambda: None, ['a'])])
+
+
+def test_staging_copy_is_swapped_in():
+    """
+    Tests that writes to the staging copy are not visible until it replaces the collection.
+    """
+
+    dbname = mongomock.MongoClient().db
+    dbname.cities.insert_many([{'city': 'Oslo', 'safety': 1}, {'city': 'Lima', 'safety': 2}])
+
+    staging = prepare_staging(dbname, 'cities')
+    staging.update_one({'city': 'Oslo'}, {'$set': {'safety': 3}})
+
+    assert dbname.cities.find_one({'city': 'Oslo'})['safety'] == 1
+
+    swap_in_staging(staging, 'cities')
+
+    assert dbname.cities.find_one({'city': 'Oslo'})['safety'] == 3
+    assert dbname.cities.count_documents({}) == 2
+    assert 'cities_staging' not in dbname.list_collection_names()
+
+
+def test_staging_copy_is_kept_to_resume():
+    """
+    Tests that the staging copy of an unfinished update is only kept when asked to.
+    """
+
+    dbname = mongomock.MongoClient().db
+    dbname.cities.insert_one({'city': 'Oslo', 'rain': None})
+    prepare_staging(dbname, 'cities').update_one({'city': 'Oslo'}, {'$set': {'rain': 5}})
+
+    kept = prepare_staging(dbname, 'cities', keep_existing=True)
+    assert kept.find_one({'city': 'Oslo'})['rain'] == 5
+
+    copied = prepare_staging(dbname, 'cities')
+    assert copied.find_one({'city': 'Oslo'})['rain'] is None
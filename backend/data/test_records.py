@@ -0,0 +1,71 @@
+"""
+Test cases for the streaming station and city readers
+"""
+
+import os
+import sys
+from datetime import datetime
+
+from data.records import CityRecord, StationRecord, iter_cities, iter_stations
+
+RAIN_CSV_DIRECTORY = os.path.join(os.path.dirname(__file__), "rain", "csv")
+
+
+def test_iter_stations_reads_typed_records():
+    """
+    Tests that every station of the stations file is read, with numeric coordinates and parsed
+    dates.
+    """
+
+    stations = iter_stations(os.path.join(RAIN_CSV_DIRECTORY, "stations_improved.csv"))
+    first = next(stations)
+
+    assert first.id == "GHCND:AFM00040948"
+    assert first.city == "Kabul" and first.country == "Afghanistan"
+    assert first.latitude == 34.566 and first.coverage == 0.5777
+    assert first.mindate == datetime(1966, 3, 2)
+    assert first.maxdate == datetime(2021, 8, 30)
+
+    rest = list(stations)
+    assert len(rest) == 309
+    assert all(station.id.startswith("GHCND:") for station in rest)
+
+
+def test_station_dates_are_parsed_lazily():
+    """
+    Tests that dates are kept as read until they are used, and that records have no per instance
+    dictionary.
+    """
+
+    station = StationRecord.from_row(["1940-01-01", "2023-04-30", "ALGER, AG", "Algiers",
+                                      "Algeria", "GHCND:AG000060390", "36.7", "3.25"])
+
+    assert station._mindate == "1940-01-01"
+    assert station.mindate == datetime(1940, 1, 1)
+    assert station._mindate == datetime(1940, 1, 1)
+    assert station.distance is None
+    assert not hasattr(station, "__dict__")
+    assert station.country is sys.intern("Algeria")
+
+
+def test_station_row_round_trip():
+    """
+    Tests that a station written with to_row is read back unchanged.
+    """
+
+    row = ["1940-01-01", "2023-04-30", "ALGER, AG", "Algiers", "Algeria", "GHCND:AG000060390",
+           36.7167, 3.25, 18.1, 0.889]
+
+    assert StationRecord.from_row([str(value) for value in row]).to_row() == row
+
+
+def test_iter_cities_without_header():
+    """
+    Tests that the first city is kept when the file has no header row.
+    """
+
+    cities = list(iter_cities(os.path.join(RAIN_CSV_DIRECTORY, "cities.csv"), has_header=False))
+
+    assert cities[0].city == "Dubai" and cities[0].id == "CITY:AE000003"
+    assert cities[0].maxdate == datetime(2023, 4, 29)
+    assert CityRecord.from_row(cities[1].to_row()).name == "Kabul, AF"
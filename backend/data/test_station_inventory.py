@@ -0,0 +1,109 @@
+"""
+Test cases for the GHCND station inventory and its grid index
+"""
+
+import numpy as np
+
+from data.geo import haversine_distances
+from data.station_inventory import StationInventory, parse_inventory, parse_stations
+
+STATIONS_LINES = [
+    "AG000060390  36.7167    3.2500   25.0    ALGER-DAR EL BEIDA             GSN     60390",
+    "AFM00040948  34.5660   69.2120 1791.0    KABUL INTL                              40948",
+    "AE000041196  25.3330   55.5170   34.0    SHARJAH INTER. AIRP            GSN     41196",
+]
+
+INVENTORY_LINES = [
+    "AG000060390  36.7167    3.2500 TMAX 1940 2023",
+    "AG000060390  36.7167    3.2500 PRCP 1940 2023",
+    "AFM00040948  34.5660   69.2120 PRCP 1966 2021",
+]
+
+
+def make_inventory(size: int = 5000, cell_degrees: float = 2.0) -> StationInventory:
+    """
+    Returns an inventory of randomly placed stations.
+    """
+
+    generator = np.random.default_rng(42)
+    latitudes = np.degrees(np.arcsin(generator.uniform(-1, 1, size)))
+    longitudes = generator.uniform(-180, 180, size)
+
+    return StationInventory([f"S{i}" for i in range(size)], [f"Station {i}" for i in range(size)],
+                            latitudes, longitudes, cell_degrees=cell_degrees)
+
+
+def brute_force_within(inventory: StationInventory, latitude: float, longitude: float,
+                       radius_km: float) -> list:
+    """
+    Returns the indices of the stations within the radius by checking every station.
+    """
+
+    distances = haversine_distances(latitude, longitude, inventory.latitudes,
+                                    inventory.longitudes)
+    return sorted(np.flatnonzero(distances <= radius_km).tolist())
+
+
+def test_parse_fixed_width_files():
+    """
+    Tests that the columns of the station and inventory files are parsed.
+    """
+
+    stations = parse_stations(STATIONS_LINES)
+
+    assert stations['ids'] == ["AG000060390", "AFM00040948", "AE000041196"]
+    assert stations['latitudes'][1] == 34.566 and stations['longitudes'][2] == 55.517
+    assert stations['names'][0] == "ALGER-DAR EL BEIDA"
+    assert parse_inventory(INVENTORY_LINES) == {"AG000060390": (1940, 2023),
+                                                "AFM00040948": (1966, 2021)}
+
+
+def test_load_keeps_stations_with_element(tmp_path):
+    """
+    Tests that only stations with precipitation data are loaded, with their years.
+    """
+
+    (tmp_path / "ghcnd-stations.txt").write_text("\n".join(STATIONS_LINES), encoding="UTF-8")
+    (tmp_path / "ghcnd-inventory.txt").write_text("\n".join(INVENTORY_LINES), encoding="UTF-8")
+
+    inventory = StationInventory.load(str(tmp_path))
+
+    assert len(inventory) == 2
+    indices, distances = inventory.nearest(36.75, 3.06, radius_km=50)
+    assert inventory.station(indices[0]) == {
+        'id': "GHCND:AG000060390", 'name': "ALGER-DAR EL BEIDA", 'latitude': 36.7167,
+        'longitude': 3.25, 'datacoverage': 1.0, 'mindate': "1940-01-01", 'maxdate': "2023-12-31"}
+    assert distances[0] < 20
+    assert len(inventory.nearest(36.75, 3.06, radius_km=50, min_last_year=2024)[0]) == 0
+
+
+def test_within_matches_brute_force():
+    """
+    Tests that the grid finds the same stations as checking every station, including near the
+    poles and across the antimeridian.
+    """
+
+    inventory = make_inventory()
+    locations = [(0, 0), (51.5, -0.1), (-33.9, 151.2), (64.8, -147.7), (89.5, 10), (-89.9, 0),
+                 (10, 179.9), (-20, -179.5)]
+
+    for latitude, longitude in locations:
+        for radius_km in (50, 300, 1500):
+            indices, distances = inventory.within(latitude, longitude, radius_km)
+
+            assert sorted(indices.tolist()) == brute_force_within(inventory, latitude, longitude,
+                                                                  radius_km)
+            assert np.all(np.diff(distances) >= 0)
+
+
+def test_nearest_returns_k_closest():
+    """
+    Tests that the k nearest stations are returned in order of distance.
+    """
+
+    inventory = make_inventory()
+    indices, distances = inventory.nearest(48.85, 2.35, k=3, radius_km=2000)
+
+    all_distances = haversine_distances(48.85, 2.35, inventory.latitudes, inventory.longitudes)
+    assert indices.tolist() == np.argsort(all_distances)[:3].tolist()
+    np.testing.assert_allclose(distances, np.sort(all_distances)[:3])
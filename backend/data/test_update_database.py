@@ -0,0 +1,151 @@
+"""
+Test cases for running the stages of a data update against the staging copy of the cities
+"""
+
+import mongomock
+import pytest
+
+from data import update_database as update_module
+from data.checkpoint import JobCheckpoint, UnfinishedJobError
+from data.pipeline import PipelineError
+
+STATIONS = ["Oslo", "Lima", "Kabul"]
+
+
+@pytest.fixture(name="dbname")
+def fixture_dbname(monkeypatch, tmp_path):
+    """
+    A database of cities without rain data, used by update_database, with the rain checkpoint
+    stored in a temporary directory.
+    """
+
+    dbname = mongomock.MongoClient().db
+    dbname.cities.insert_many([{"city": city, "country": "X", "months": {}} for city in STATIONS])
+    monkeypatch.setattr(update_module, "get_database", lambda: dbname)
+    monkeypatch.setattr(update_module, "RAIN_CHECKPOINT_PATH", str(tmp_path / "rain.json"))
+
+    return dbname
+
+
+def use_rain_update(monkeypatch, checkpoint_path, fail_at=None):
+    """
+    Replaces the rain update with one that saves and checkpoints one station at a time, like
+    add_rain_to_db, and fails at the given station.
+    """
+
+    def add_rain_to_db(incremental, resume, restart, cities_collection):
+        checkpoint = JobCheckpoint(checkpoint_path)
+        checkpoint.start(resume, restart)
+        for city in STATIONS:
+            if city in checkpoint.completed:
+                continue
+            if city == fail_at:
+                raise RuntimeError("quota exceeded")
+            cities_collection.update_one({"city": city}, {"$set": {"months.jan.rain": 5}})
+            checkpoint.mark_completed([city])
+        checkpoint.finish()
+
+    monkeypatch.setattr(update_module, "add_rain_to_db", add_rain_to_db)
+
+
+def test_resume_after_plain_rerun_keeps_saved_stations(dbname, monkeypatch):
+    """
+    Tests that a plain re-run after a failed rain update is refused without dropping the staging
+    copy, so that resuming afterwards still writes the stations saved before the failure.
+    """
+
+    checkpoint_path = update_module.RAIN_CHECKPOINT_PATH
+
+    use_rain_update(monkeypatch, checkpoint_path, fail_at="Lima")
+    with pytest.raises(PipelineError):
+        update_module.update_database(False, False, True)
+
+    use_rain_update(monkeypatch, checkpoint_path)
+    with pytest.raises(UnfinishedJobError):
+        update_module.update_database(False, False, True)
+
+    assert dbname.cities_staging.find_one({"city": "Oslo"})["months"]["jan"]["rain"] == 5
+
+    update_module.update_database(False, False, True, resume=True)
+
+    assert all(city["months"]["jan"]["rain"] == 5 for city in dbname.cities.find())
+    assert not JobCheckpoint(checkpoint_path).exists()
+
+
+def test_resume_without_staging_copy_is_refused(dbname, monkeypatch):
+    """
+    Tests that an unfinished rain update whose staging copy is gone can only be restarted.
+    """
+
+    checkpoint_path = update_module.RAIN_CHECKPOINT_PATH
+
+    use_rain_update(monkeypatch, checkpoint_path, fail_at="Lima")
+    with pytest.raises(PipelineError):
+        update_module.update_database(False, False, True)
+    dbname.drop_collection("cities_staging")
+
+    use_rain_update(monkeypatch, checkpoint_path)
+    with pytest.raises(UnfinishedJobError):
+        update_module.update_database(False, False, True, resume=True)
+
+    update_module.update_database(False, False, True, restart=True)
+
+    assert all(city["months"]["jan"]["rain"] == 5 for city in dbname.cities.find())
+
+
+def test_unfinished_rain_update_is_not_swapped_in_by_other_stages(dbname, monkeypatch):
+    """
+    Tests that other updates neither resume an unfinished rain update nor swap in its half-updated
+    staging copy.
+    """
+
+    checkpoint_path = update_module.RAIN_CHECKPOINT_PATH
+    monkeypatch.setattr(update_module, "add_temperature_to_db", lambda batch_size, staging: None)
+
+    use_rain_update(monkeypatch, checkpoint_path, fail_at="Lima")
+    with pytest.raises(PipelineError):
+        update_module.update_database(False, False, True)
+
+    with pytest.raises(ValueError):
+        update_module.update_database(True, False, False, resume=True)
+    with pytest.raises(UnfinishedJobError):
+        update_module.update_database(True, False, False)
+
+    assert all("jan" not in city["months"] for city in dbname.cities.find())
+    assert dbname.cities_staging.find_one({"city": "Oslo"})["months"]["jan"]["rain"] == 5
+    assert JobCheckpoint(checkpoint_path).exists()
+
+
+def test_country_safety_is_only_replaced_on_success(dbname, monkeypatch):
+    """
+    Tests that the country safety table written by the safety stage is swapped in along with the
+    cities, and left unchanged when another stage fails.
+    """
+
+    dbname.country_safety.insert_one({"_id": "X", "safety": 1})
+
+    def add_safety_to_db(cities_collection, country_safety_collection):
+        cities_collection.update_many({}, {"$set": {"safety": 3}})
+        country_safety_collection.replace_one({"_id": "X"}, {"_id": "X", "safety": 3}, upsert=True)
+
+    monkeypatch.setattr(update_module, "add_safety_to_db", add_safety_to_db)
+
+    use_rain_update(monkeypatch, update_module.RAIN_CHECKPOINT_PATH, fail_at="Oslo")
+    with pytest.raises(PipelineError):
+        update_module.update_database(False, True, True)
+
+    assert dbname.country_safety.find_one({"_id": "X"})["safety"] == 1
+    assert dbname.cities.find_one({"city": "Oslo"}).get("safety") is None
+
+    swapped = []
+    swap_in_staging = update_module.swap_in_staging
+    monkeypatch.setattr(update_module, "swap_in_staging", lambda staging, name: (
+        swapped.append(name), swap_in_staging(staging, name)))
+
+    update_module.update_database(False, True, False, restart=True)
+
+    # The cities are replaced last
+    assert swapped == ["country_safety", "cities"]
+    assert dbname.country_safety.find_one({"_id": "X"})["safety"] == 3
+    assert dbname.cities.find_one({"city": "Oslo"})["safety"] == 3
+    assert "country_safety_staging" not in dbname.list_collection_names()
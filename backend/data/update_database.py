@@ -2,61 +2,199 @@
 A module for updating temperature and safety data in a database.
 
 Functions:
-    update_database(temperature: bool, safety: bool) -> None
-        Updates the database with temperature and/or safety and/or rain data if specified.
+    prepare_cities_staging(dbname: Database, rain: bool, resume: bool, restart: bool) -> Collection
+        Prepares the staging copy of the cities collection, keeping the one of an unfinished rain
+        update that is resumed.
+
+    update_database(temperature: bool, safety: bool, rain: bool, batch_size: int,
+                    full_rain_refresh: bool, resume: bool, restart: bool) -> dict
+        Updates the database with temperature and/or safety and/or rain data if specified, and
+        returns the time each stage took.
 
 Arguments:
     temperature (bool): A boolean indicating whether to update the temperature data in the database.
     safety (bool): A boolean indicating whether to update the safety data in the database.
     rain (bool): A boolean indicating whether to update the rain data in the database.
+    batch_size (int): The maximum number of cities to write to the database per bulk write.
+    full_rain_refresh (bool): A boolean indicating whether every year of rain data should be
+    requested again.
+    resume (bool): A boolean indicating whether an unfinished rain update should continue from its
+    checkpoint. Only allowed together with rain.
+    restart (bool): A boolean indicating whether an unfinished rain update should be started over.
 
 Example usage:
     # Call from command line to update temperature and safety data:
     # yarn update-data --temperature --safety
+    # Call from command line to recompute rain data only from API responses cached by earlier runs:
+    # yarn update-data --rain --offline
+    # Call from command line to continue a rain update that stopped part way through:
+    # yarn update-data --rain --resume
+    # Without yarn, run the module from the backend directory:
+    # python -m data.update_database --rain
 
 Notes:
     This module requires the add_temperature_data, add_safety_data, and add_rain_data modules to be
     imported.
     The logging level is set to INFO to write to the console.
+    The updates are written to a staging copy of the cities collection, see pipeline, which
+    replaces the cities collection once every update has succeeded. The country safety table is
+    staged and swapped in the same way. Safety and rain start after temperature, which creates the
+    cities.
+    The indexes are created on the staging copy before any update, and are kept by the swap.
+    The data version is bumped after any update so that the API reloads its in-memory city index,
+    and the month tables the index is loaded from are rebuilt.
 '''
 
 import sys
+import time
 import argparse
 import logging
-from add_temperature_data import add_temperature_to_db
-from add_safety_data import add_safety_to_db
-from add_rain_data import add_rain_to_db
+from data.add_temperature_data import add_temperature_to_db
+from data.add_safety_data import add_safety_to_db
+from data.add_rain_data import RAIN_CHECKPOINT_PATH, add_rain_to_db
+from data.api_cache import get_api_cache
+from data.checkpoint import JobCheckpoint, UnfinishedJobError
+from data.pipeline import STAGING_SUFFIX, Stage, prepare_staging, run_stages, swap_in_staging
+
+from get_database import get_database
+from bulk_writes import DEFAULT_BATCH_SIZE
+from data_version import bump_data_version
+from month_tables import COUNTRY_SAFETY_COLLECTION, write_month_tables
+from indexes import ensure_indexes, explain_get_cities
+
+
+def prepare_cities_staging(dbname, rain, resume=False, restart=False):
+    '''
+    Prepares the staging copy of the cities collection. While a rain update is unfinished, the
+    staging copy holds the rainy days of every station in its checkpoint, so the copy is only
+    replaced once the checkpoint is discarded. The copy is only kept if the rain update is resumed
+    by this run, since swapping it in otherwise would serve a half-updated cities collection.
+
+        Parameters:
+            dbname (Database): The database of the cities collection.
+            rain (bool): A boolean indicating whether this run updates the rain data.
+            resume (bool): A boolean indicating whether an unfinished rain update will continue
+            from its checkpoint, in which case its staging copy is kept.
+            restart (bool): A boolean indicating whether the checkpoint of an unfinished rain
+            update should be discarded.
 
-# Set the logging level to INFO to write to console
-logging.basicConfig(level=logging.INFO)
+        Returns:
+            staging (Collection): The staging copy of the cities collection
 
-def update_database(temperature, safety, rain):
+        Raises:
+            UnfinishedJobError: If a rain update is unfinished and is neither resumed by this run
+            nor restarted, or its staging copy is missing so it cannot be resumed.
+    '''
+    rain_checkpoint = JobCheckpoint(RAIN_CHECKPOINT_PATH)
+
+    if rain_checkpoint.exists():
+        if restart:
+            rain_checkpoint.finish()
+        elif not (rain and resume):
+            raise UnfinishedJobError(
+                f"An unfinished rain update was checkpointed in {rain_checkpoint.path}. "
+                "Resume it with --rain --resume or discard it with --restart.")
+        elif "cities" + STAGING_SUFFIX not in dbname.list_collection_names():
+            raise UnfinishedJobError(
+                "The staging copy of the unfinished rain update is missing, so the stations in "
+                f"{rain_checkpoint.path} cannot be resumed. Start over with --restart.")
+
+    return prepare_staging(dbname, "cities", keep_existing=rain_checkpoint.exists())
+
+
+def update_database(temperature, safety, rain, batch_size=DEFAULT_BATCH_SIZE,
+                    full_rain_refresh=False, resume=False, restart=False):
     '''
     Updates the database with the temperature and safety data, if specified.
 
+    The updates are run as stages of a pipeline: safety and rain update the cities that the
+    temperature update creates, so they start once it has finished, and otherwise the stages run
+    concurrently. They write to staging copies of the cities collection and the country safety
+    table, which replace them only once every stage has succeeded.
+
         Parameters:
             temperature (bool): A boolean indicating whether to update the temperature data in the 
             database.
             safety (bool): A boolean indicating whether to update the safety data in the database.
             rain (bool): A boolean indicating whether to update the rain data in the database.
+            batch_size (int): The maximum number of cities to write to the database per bulk write.
+            full_rain_refresh (bool): A boolean indicating whether every year of rain data should
+            be requested again, rather than only the years not summed by a previous run.
+            resume (bool): A boolean indicating whether an unfinished rain update should continue
+            from its checkpoint. The staging collection of the unfinished update is kept. Only
+            allowed together with rain.
+            restart (bool): A boolean indicating whether an unfinished rain update should be
+            discarded and started over.
+            Without resume or restart, nothing is changed while a rain update is unfinished, see
+            prepare_cities_staging.
 
         Returns:
-            None
+            timings (dict): The seconds each stage took
+
+        Raises:
+            PipelineError: If any stage failed. The cities collection is left unchanged.
+            UnfinishedJobError: If a rain update is unfinished and is neither resumed by this run
+            nor restarted.
+            ValueError: If resume is set without rain.
     '''
-    if temperature:
-        logging.info('Updating temperature data')
-        add_temperature_to_db()
+    if resume and not rain:
+        raise ValueError("Only a rain update can be resumed, use resume together with rain.")
 
-    if safety:
-        logging.info('Updating safety data')
-        add_safety_to_db()
+    if not (temperature or safety or rain):
+        return {}
+
+    dbname = get_database()
+    # Check for an unfinished rain update before the staging copy holding its writes is replaced
+    staging = prepare_cities_staging(dbname, rain, resume, restart)
+
+    # Indexes are needed by the upserts below, creating them is a no-op if they already exist
+    logging.info('Checking indexes')
+    ensure_indexes(staging)
 
+    stages, staged = [], [(staging, "cities")]
+    if temperature:
+        stages.append(Stage('temperature', lambda: add_temperature_to_db(batch_size, staging)))
+    if safety:
+        # The index prefers the country safety table, so it is swapped in along with the cities
+        country_safety = prepare_staging(dbname, COUNTRY_SAFETY_COLLECTION)
+        staged.insert(0, (country_safety, COUNTRY_SAFETY_COLLECTION))
+        stages.append(Stage('safety', lambda: add_safety_to_db(staging, country_safety),
+                            ['temperature']))
     if rain:
-        logging.info('Updating rain data')
-        add_rain_to_db()
+        stages.append(Stage('rain', lambda: add_rain_to_db(
+            incremental=not full_rain_refresh, resume=resume, restart=restart,
+            cities_collection=staging), ['temperature']))
+
+    timings = run_stages(stages)
+
+    # The country safety table is swapped in before the cities, so the cities are replaced last.
+    # The two renames are not one transaction, but a running API only reloads its index once the
+    # data version is bumped below, after both have been replaced.
+    for staged_copy, name in staged:
+        logging.info('Replacing the %s collection with the updated copy', name)
+        swap_in_staging(staged_copy, name)
+
+    # Let the API know that its in-memory copy of the cities is out of date
+    version = bump_data_version(dbname)
+    logging.info('Data version is now %s', version)
+
+    # Precompute the sorted month tables the API answers queries from
+    logging.info('Building month tables')
+    start = time.perf_counter()
+    write_month_tables(dbname, version)
+    timings['month_tables'] = time.perf_counter() - start
+
+    logging.info('get_cities query plan: %s', explain_get_cities(dbname, 'jan'))
+    logging.info('Stage timings: %s',
+                 ', '.join(f'{name} {seconds:.1f} s' for name, seconds in timings.items()))
+
+    return timings
 
 
 if __name__ == "__main__":
+    # Set the logging level to INFO to write to console
+    logging.basicConfig(level=logging.INFO)
+
     # Default value for boolean argument is False
     # Command line call example: yarn update-data --temperature --safety
     parser = argparse.ArgumentParser(description='Update data')
@@ -66,6 +204,24 @@ if __name__ == "__main__":
                         help='If safety data should be updated')
     parser.add_argument('--rain', action='store_true',
                         help='If rain data should be updated')
+    parser.add_argument('--full-rain-refresh', action='store_true',
+                        help='Request every year of rain data again instead of only new years')
+    checkpoint_group = parser.add_mutually_exclusive_group()
+    checkpoint_group.add_argument('--resume', action='store_true',
+                                  help='Continue an unfinished rain update from its checkpoint')
+    checkpoint_group.add_argument('--restart', action='store_true',
+                                  help='Discard the checkpoint of an unfinished rain update')
+    parser.add_argument('--offline', action='store_true',
+                        help='Only use API responses stored in the API cache')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help='Maximum number of cities to write to the database per bulk write')
     args = parser.parse_args(sys.argv[1:])
 
-    update_database(args.temperature, args.safety, args.rain)
+    if args.resume and not args.rain:
+        parser.error('--resume continues an unfinished rain update, use it together with --rain')
+
+    if args.offline:
+        get_api_cache().offline = True
+
+    update_database(args.temperature, args.safety, args.rain, args.batch_size,
+                    args.full_rain_refresh, args.resume, args.restart)
@@ -0,0 +1,59 @@
+'''
+Keeps track of a version marker for the data stored in the database. The marker is bumped every
+time the update-data script changes the cities collection, which lets anything that holds a copy of
+the data in memory know when that copy is out of date.
+
+Functions:
+    get_data_version(dbname: Database) -> int
+        Returns the current data version, or 0 if the data has never been versioned.
+
+    bump_data_version(dbname: Database) -> int
+        Increments the data version and returns the new value.
+'''
+
+from pymongo import ReturnDocument
+from pymongo.database import Database
+
+METADATA_COLLECTION = "metadata"
+DATA_VERSION_ID = "data_version"
+
+
+def get_data_version(dbname: Database) -> int:
+    '''
+    Returns the current version of the data in the database.
+
+        Parameters:
+            dbname (Database): The database to read the version from
+
+        Returns:
+            version (int): The current data version, or 0 if no version has been written yet
+    '''
+
+    document = dbname[METADATA_COLLECTION].find_one({"_id": DATA_VERSION_ID})
+
+    if not document:
+        return 0
+
+    return document.get("version", 0)
+
+
+def bump_data_version(dbname: Database) -> int:
+    '''
+    Increments the version of the data in the database. Should be called after any update to the
+    cities collection.
+
+        Parameters:
+            dbname (Database): The database to bump the version in
+
+        Returns:
+            version (int): The new data version
+    '''
+
+    document = dbname[METADATA_COLLECTION].find_one_and_update(
+        {"_id": DATA_VERSION_ID},
+        {"$inc": {"version": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+
+    return document["version"]
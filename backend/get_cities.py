@@ -3,58 +3,103 @@ This module defines a function to retrieve cities based on temperature and rainy
 a database.
 
 Functions:
-    get_cities(min_temp: str, max_temp: str, month: str, rainy_days: str, dbname: Database) -> dict
+    parse_conditions(min_temp: str, max_temp: str, rainy_days: str) -> tuple
+        Validates the temperature range and rainy days of a cities query.
+
+    parse_query(min_temp: str, max_temp: str, month: str, rainy_days: str) -> tuple
+        Validates the parameters of a cities query and converts them to the types used for
+        filtering.
+
+    parse_months(months: Optional[str], start_date: Optional[str], end_date: Optional[str]) -> list
+        Validates the months of a multi-month query, given as month names or as a date range.
+
+    parse_mode(mode: Optional[str]) -> str
+        Validates whether a multi-month query needs all or any of its months to match.
+
+    parse_max_safety(max_safety: Optional[str]) -> int
+        Validates the highest travel advisory level a query accepts.
+
+    build_cities_filter(min_temp: float, max_temp: float, month: str, rainy_days: float,
+                        max_safety: int) -> dict
+        Returns the MongoDB filter for cities matching a validated query.
+
+    get_cities(min_temp: str, max_temp: str, month: str, rainy_days: str, dbname: Database,
+               max_safety: Optional[str]) -> dict
         Retrieves all cities where the temperature is within a specified range and the average
         number of rainy days is less than or equal to a provided value.
+
+    build_months_filter(min_temp: float, max_temp: float, months: list, rainy_days: float,
+                        mode: str, max_safety: int) -> dict
+        Returns the MongoDB filter for cities matching a validated multi-month query.
+
+    get_cities_for_months(min_temp: str, max_temp: str, months: list, rainy_days: str,
+                          dbname: Database, mode: Optional[str],
+                          max_safety: Optional[str]) -> dict
+        Retrieves the cities matching the temperature and rainy days criteria in all or any of
+        several months, along with the months they match in.
 """
 
+import math
 from collections import defaultdict
+from datetime import date
+from numbers import Number
+from typing import Optional
 
 from mongomock import Database
 
-def get_cities(min_temp: str, max_temp: str, month: str, rainy_days: str, dbname: Database) -> dict:
-    '''
-    Returns all cities where the temperature is in between a provided range.
+VALID_MONTHS = [
+    'January',
+    'February',
+    'March',
+    'April',
+    'May',
+    'June',
+    'July',
+    'August',
+    'September',
+    'October',
+    'November',
+    'December',
+]
 
-        Preconditions:
-            min_temp: str with value <= max_temp
-            max_temp: str with value >= max_temp
-            month: str with value that is a valid month of the year, starting with a capital letter
+# Keys used for each month in the database, e.g. 'jan' for 'January'
+MONTH_KEYS = [month[:3].lower() for month in VALID_MONTHS]
+
+# The values for safety in the database have the following meaning:
+# 'Take normal security precautions': 1,
+# 'Exercise a high degree of caution': 2,
+# 'Avoid non-essential travel': 3,
+# 'Avoid all travel': 4
+SAFETY_LEVELS = [1, 2, 3, 4]
+
+# Queries only return countries up to this level unless they ask for another one
+DEFAULT_MAX_SAFETY = 2
+
+# Safety values of countries that are considered safe enough to travel to by default
+SAFE_SAFETY_VALUES = SAFETY_LEVELS[:DEFAULT_MAX_SAFETY]
+
+# A multi-month query matches cities that satisfy it in all of its months, or in any of them
+MATCH_MODES = ['all', 'any']
+DEFAULT_MATCH_MODE = 'all'
+
+
+def parse_conditions(min_temp: str, max_temp: str, rainy_days: str) -> tuple:
+    '''
+    Validates the temperature range and rainy days of a cities query and converts them to floats.
 
         Parameters:
             min_temp (str): A string representing the minimum temperature
             max_temp (str): A string representing the maximum temperature
-            month (str): A string representing the month (e.g., 'January', 'February', etc.)
             rainy_days (str): A string representing the maximum number of rainy days
-            dbname (Database): The name of the database to be used
 
         Returns:
-            cities (dict[list[dict[str: str, str: float]]]): All cities where the min_temp is less 
-            than or equal to the max_temp for the provided month an the average number of rainy days
-            is less than or equal to rainy_days. The return should be a dictionary where the key is
-            a country and the value is a list that contains all cities in this country that satisfy
-            the above condition. This list would contain a dictionary of the city and the
-            temperature for the provided month.
+            conditions (tuple[float, float, float]): The minimum temperature, maximum temperature
+            and maximum number of rainy days
 
+        Raises:
+            ValueError: If the temperatures or rainy days are not numbers or the minimum
+            temperature is greater than the maximum temperature
     '''
-    valid_months = [
-        'January',
-        'February',
-        'March',
-        'April',
-        'May',
-        'June',
-        'July',
-        'August',
-        'September',
-        'October',
-        'November',
-        'December',
-    ]
-
-    if month not in valid_months:
-        raise ValueError(
-            f"Invalid month: {month}. Please provide a valid month.")
 
     try:
         float_min_temp = float(min_temp)
@@ -62,31 +107,222 @@ def get_cities(min_temp: str, max_temp: str, month: str, rainy_days: str, dbname
     except ValueError as exc:
         raise ValueError("Invalid temperature values. Please provide numbers.") from exc
 
+    # NaN never matches a city, and cannot be rounded for the response cache
+    if math.isnan(float_min_temp) or math.isnan(float_max_temp):
+        raise ValueError("Invalid temperature values. Please provide numbers.")
+
     if float_min_temp > float_max_temp:
         raise ValueError(
             "Minimum temperature cannot be greater than maximum temperature.")
 
     float_rainy_days = float(rainy_days)
+    if math.isnan(float_rainy_days):
+        raise ValueError("Invalid number of rainy days. Please provide a number.")
+
+    return float_min_temp, float_max_temp, float_rainy_days
+
+
+def parse_query(min_temp: str, max_temp: str, month: str, rainy_days: str) -> tuple:
+    '''
+    Validates the parameters of a cities query and converts them to the types used for filtering.
+
+        Parameters:
+            min_temp (str): A string representing the minimum temperature
+            max_temp (str): A string representing the maximum temperature
+            month (str): A string representing the month (e.g., 'January', 'February', etc.)
+            rainy_days (str): A string representing the maximum number of rainy days
+
+        Returns:
+            query (tuple[float, float, str, float]): The minimum temperature, maximum temperature,
+            month key used in the database (e.g. 'jan') and maximum number of rainy days
+
+        Raises:
+            ValueError: If the month is not valid, the temperatures are not numbers or the minimum
+            temperature is greater than the maximum temperature
+    '''
+
+    if month not in VALID_MONTHS:
+        raise ValueError(
+            f"Invalid month: {month}. Please provide a valid month.")
+
+    float_min_temp, float_max_temp, float_rainy_days = parse_conditions(
+        min_temp, max_temp, rainy_days)
     shortened_month = month[:3].lower()
 
-    cities_collection = dbname["cities"]
+    return float_min_temp, float_max_temp, shortened_month, float_rainy_days
+
+
+def parse_months(months: Optional[str] = None, start_date: Optional[str] = None,
+                 end_date: Optional[str] = None) -> list:
+    '''
+    Validates the months of a multi-month query. The months are either listed by name or spanned by
+    a date range, e.g. 2024-12-20 to 2025-01-10 selects December and January.
+
+        Parameters:
+            months (Optional[str]): A comma separated string of months (e.g., 'June,July')
+            start_date (Optional[str]): The first day of the date range, in ISO format
+            end_date (Optional[str]): The last day of the date range, in ISO format
+
+        Returns:
+            months (list[str]): The month keys used in the database (e.g. 'jan'), in calendar order
+            and without duplicates
+
+        Raises:
+            ValueError: If a month is not valid, a date cannot be parsed, the range ends before it
+            starts or neither months nor a complete date range are given
+    '''
+
+    selected = set()
+
+    if months:
+        for month in months.split(','):
+            month = month.strip()
+            if month not in VALID_MONTHS:
+                raise ValueError(
+                    f"Invalid month: {month}. Please provide a valid month.")
+            selected.add(month[:3].lower())
+    elif start_date and end_date:
+        try:
+            start = date.fromisoformat(start_date)
+            end = date.fromisoformat(end_date)
+        except ValueError as exc:
+            raise ValueError("Invalid dates. Please provide dates as YYYY-MM-DD.") from exc
+
+        if start > end:
+            raise ValueError("Start date cannot be after end date.")
+
+        # Count months from the start of the range, a range of a year or more selects every month
+        span = (end.year - start.year) * 12 + end.month - start.month
+        for offset in range(min(span, len(MONTH_KEYS) - 1) + 1):
+            selected.add(MONTH_KEYS[(start.month - 1 + offset) % len(MONTH_KEYS)])
+    else:
+        raise ValueError("Please provide months or a start and end date.")
+
+    return [month for month in MONTH_KEYS if month in selected]
+
+
+def parse_mode(mode: Optional[str]) -> str:
+    '''
+    Validates whether a multi-month query needs all or any of its months to match.
+
+        Parameters:
+            mode (Optional[str]): 'all' or 'any', or None to use the default of 'all'
+
+        Returns:
+            mode (str): The match mode
+
+        Raises:
+            ValueError: If the mode is not one of the match modes
+    '''
+
+    if mode is None or mode == '':
+        return DEFAULT_MATCH_MODE
+
+    if mode not in MATCH_MODES:
+        raise ValueError(
+            f"Invalid mode: {mode}. Please provide one of {', '.join(MATCH_MODES)}.")
+
+    return mode
+
+
+def parse_max_safety(max_safety: Optional[str]) -> int:
+    '''
+    Validates the highest travel advisory level a query accepts.
+
+        Parameters:
+            max_safety (Optional[str]): A string representing the highest safety value, or None
+            to use the default
+
+        Returns:
+            max_safety (int): The highest safety value cities may have
 
-    # The values for safety in the database has the following meaning:
-    # 'Take normal security precautions': 1,
-    # 'Exercise a high degree of caution': 2,
-    # 'Avoid non-essential travel': 3,
-    # 'Avoid all travel': 4
-    # We want safe countries so safety value should be 1 or 2
-    cities = list(cities_collection.find({
-        f"months.{shortened_month}.temperature": {
-            "$lte": float_max_temp,
-            "$gte": float_min_temp
+        Raises:
+            ValueError: If the value is not one of the safety levels
+    '''
+
+    if max_safety is None or max_safety == '':
+        return DEFAULT_MAX_SAFETY
+
+    try:
+        int_max_safety = int(max_safety)
+    except ValueError as exc:
+        raise ValueError("Invalid maximum safety level. Please provide a number.") from exc
+
+    if int_max_safety not in SAFETY_LEVELS:
+        raise ValueError(
+            f"Invalid maximum safety level: {max_safety}. Please provide a value from "
+            f"{SAFETY_LEVELS[0]} to {SAFETY_LEVELS[-1]}.")
+
+    return int_max_safety
+
+
+def build_cities_filter(min_temp: float, max_temp: float, month: str, rainy_days: float,
+                        max_safety: int = DEFAULT_MAX_SAFETY) -> dict:
+    '''
+    Returns the MongoDB filter for cities matching a query that has already been validated by
+    parse_query.
+
+        Parameters:
+            min_temp (float): The minimum temperature
+            max_temp (float): The maximum temperature
+            month (str): The month key used in the database (e.g. 'jan')
+            rainy_days (float): The maximum number of rainy days
+            max_safety (int): The highest safety value cities may have
+
+        Returns:
+            filter (dict): A filter for the cities collection
+    '''
+
+    # Safety is matched with $in rather than a range so the index can use it as an equality
+    return {
+        f"months.{month}.temperature": {
+            "$lte": max_temp,
+            "$gte": min_temp
         },
-        f"months.{shortened_month}.rain": {
-            "$lte": float_rainy_days
+        f"months.{month}.rain": {
+            "$lte": rainy_days
         },
-        "safety": {"$in": [1, 2]}
-    }, {
+        "safety": {"$in": SAFETY_LEVELS[:max_safety]}
+    }
+
+
+def get_cities(min_temp: str, max_temp: str, month: str, rainy_days: str, dbname: Database,
+               max_safety: Optional[str] = None) -> dict:
+    '''
+    Returns all cities where the temperature is in between a provided range.
+
+        Preconditions:
+            min_temp: str with value <= max_temp
+            max_temp: str with value >= max_temp
+            month: str with value that is a valid month of the year, starting with a capital letter
+
+        Parameters:
+            min_temp (str): A string representing the minimum temperature
+            max_temp (str): A string representing the maximum temperature
+            month (str): A string representing the month (e.g., 'January', 'February', etc.)
+            rainy_days (str): A string representing the maximum number of rainy days
+            dbname (Database): The name of the database to be used
+            max_safety (Optional[str]): A string representing the highest safety value, by
+            default only countries with a safety of 1 or 2 are returned
+
+        Returns:
+            cities (dict[list[dict[str: str, str: float]]]): All cities where the min_temp is less 
+            than or equal to the max_temp for the provided month an the average number of rainy days
+            is less than or equal to rainy_days. The return should be a dictionary where the key is
+            a country and the value is a list that contains all cities in this country that satisfy
+            the above condition. This list would contain a dictionary of the city and the
+            temperature for the provided month.
+
+    '''
+    float_min_temp, float_max_temp, shortened_month, float_rainy_days = parse_query(
+        min_temp, max_temp, month, rainy_days)
+    int_max_safety = parse_max_safety(max_safety)
+
+    cities_collection = dbname["cities"]
+
+    cities = list(cities_collection.find(build_cities_filter(
+        float_min_temp, float_max_temp, shortened_month, float_rainy_days, int_max_safety
+    ), {
         '_id': 0,
         'city': 1,
         'country': 1,
@@ -105,3 +341,101 @@ def get_cities(min_temp: str, max_temp: str, month: str, rainy_days: str, dbname
         cities_by_country[country].append(city_data)
 
     return dict(cities_by_country)
+
+
+def _month_matches(month_data, min_temp: float, max_temp: float, rainy_days: float) -> bool:
+    if not isinstance(month_data, dict):
+        return False
+
+    temperature = month_data.get('temperature')
+    rain = month_data.get('rain')
+
+    return (isinstance(temperature, Number) and isinstance(rain, Number)
+            and min_temp <= temperature <= max_temp and rain <= rainy_days)
+
+
+def build_months_filter(min_temp: float, max_temp: float, months: list, rainy_days: float,
+                        mode: str = DEFAULT_MATCH_MODE,
+                        max_safety: int = DEFAULT_MAX_SAFETY) -> dict:
+    '''
+    Returns the MongoDB filter for cities matching a multi-month query that has already been
+    validated.
+
+        Parameters:
+            min_temp (float): The minimum temperature
+            max_temp (float): The maximum temperature
+            months (list[str]): The month keys used in the database (e.g. 'jan')
+            rainy_days (float): The maximum number of rainy days
+            mode (str): 'all' if every month has to match, 'any' if one month is enough
+            max_safety (int): The highest safety value cities may have
+
+        Returns:
+            filter (dict): A filter for the cities collection
+    '''
+
+    month_filters = []
+    for month in months:
+        month_filter = build_cities_filter(min_temp, max_temp, month, rainy_days, max_safety)
+        month_filter.pop("safety")
+        month_filters.append(month_filter)
+
+    return {
+        "$and" if mode == 'all' else "$or": month_filters,
+        "safety": {"$in": SAFETY_LEVELS[:max_safety]}
+    }
+
+
+def get_cities_for_months(min_temp: str, max_temp: str, months: list, rainy_days: str,
+                          dbname: Database, mode: Optional[str] = None,
+                          max_safety: Optional[str] = None) -> dict:
+    '''
+    Returns the cities where the temperature is in between a provided range and the average number
+    of rainy days is at most a provided value, in all or in any of several months.
+
+        Parameters:
+            min_temp (str): A string representing the minimum temperature
+            max_temp (str): A string representing the maximum temperature
+            months (list[str]): The month keys used in the database (e.g. 'jan'), see parse_months
+            rainy_days (str): A string representing the maximum number of rainy days
+            dbname (Database): The name of the database to be used
+            mode (Optional[str]): 'all' if every month has to match, 'any' if one month is enough.
+            Defaults to 'all'.
+            max_safety (Optional[str]): A string representing the highest safety value, by
+            default only countries with a safety of 1 or 2 are returned
+
+        Returns:
+            cities (dict[list[dict]]): The matching cities grouped by country. Each city has its
+            name and the temperature and rain of every month it matches in, keyed by month.
+
+        Raises:
+            ValueError: If the query is not valid
+    '''
+    float_min_temp, float_max_temp, float_rainy_days = parse_conditions(
+        min_temp, max_temp, rainy_days)
+    match_mode = parse_mode(mode)
+    int_max_safety = parse_max_safety(max_safety)
+
+    cities = dbname["cities"].find(build_months_filter(
+        float_min_temp, float_max_temp, months, float_rainy_days, match_mode, int_max_safety
+    ), {
+        '_id': 0,
+        'city': 1,
+        'country': 1,
+        **{f"months.{month}": 1 for month in months}
+    })
+
+    cities_by_country = defaultdict(list)
+
+    for city in cities:
+        city_months = {}
+        for month in months:
+            month_data = city['months'].get(month)
+            if _month_matches(month_data, float_min_temp, float_max_temp, float_rainy_days):
+                city_months[month] = {
+                    'temperature': month_data['temperature'],
+                    'rain': month_data['rain']
+                }
+
+        cities_by_country[city['country']].append({'city': city['city'], 'months': city_months})
+
+    return dict(cities_by_country)
@@ -1,14 +1,160 @@
 '''
 Gets the database where data for this project is being stored.
 
+A single MongoClient is created per process and shared by every caller, so that requests reuse
+pooled connections instead of paying for a new connection pool each time. The pool can be tuned
+with the following optional variables in .env:
+    MONGODB_MAX_POOL_SIZE, MONGODB_MIN_POOL_SIZE, MONGODB_MAX_IDLE_TIME_MS,
+    MONGODB_CONNECT_TIMEOUT_MS, MONGODB_SOCKET_TIMEOUT_MS, MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+    MONGODB_WAIT_QUEUE_TIMEOUT_MS
+
 Functions:
+    get_client() -> MongoClient
+        Returns the MongoClient shared by the whole process, creating it on first use.
+
     get_database() -> Database
+        Returns the database used for this project.
+
+    close_client() -> None
+        Closes the shared MongoClient. Called automatically when the process exits.
+
+    get_pool_stats() -> dict
+        Returns statistics about the connection pool, for use in health checks.
 '''
 
+import atexit
 import os
-from pymongo import MongoClient
+import threading
+
+from pymongo import MongoClient, monitoring
 from dotenv import load_dotenv
 
+# Maps variables in .env to the MongoClient option they configure
+POOL_OPTIONS = {
+    'MONGODB_MAX_POOL_SIZE': 'maxPoolSize',
+    'MONGODB_MIN_POOL_SIZE': 'minPoolSize',
+    'MONGODB_MAX_IDLE_TIME_MS': 'maxIdleTimeMS',
+    'MONGODB_CONNECT_TIMEOUT_MS': 'connectTimeoutMS',
+    'MONGODB_SOCKET_TIMEOUT_MS': 'socketTimeoutMS',
+    'MONGODB_SERVER_SELECTION_TIMEOUT_MS': 'serverSelectionTimeoutMS',
+    'MONGODB_WAIT_QUEUE_TIMEOUT_MS': 'waitQueueTimeoutMS',
+}
+
+
+class PoolStatistics(monitoring.ConnectionPoolListener):
+    '''
+    Listens to connection pool events of the shared MongoClient and keeps running counts of them.
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {
+            'pools': 0,
+            'connections_open': 0,
+            'connections_created': 0,
+            'connections_closed': 0,
+            'connections_checked_out': 0,
+            'check_out_failures': 0,
+            'pool_clears': 0,
+        }
+
+    def _add(self, **changes):
+        with self._lock:
+            for key, change in changes.items():
+                self._counts[key] += change
+
+    def snapshot(self) -> dict:
+        '''
+        Returns a copy of the current counts.
+        '''
+
+        with self._lock:
+            return dict(self._counts)
+
+    def pool_created(self, event):
+        self._add(pools=1)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._add(pool_clears=1)
+
+    def pool_closed(self, event):
+        self._add(pools=-1)
+
+    def connection_created(self, event):
+        self._add(connections_open=1, connections_created=1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._add(connections_open=-1, connections_closed=1)
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._add(check_out_failures=1)
+
+    def connection_checked_out(self, event):
+        self._add(connections_checked_out=1)
+
+    def connection_checked_in(self, event):
+        self._add(connections_checked_out=-1)
+
+
+_client = None
+_client_lock = threading.Lock()
+_pool_statistics = PoolStatistics()
+
+
+def get_pool_options() -> dict:
+    '''
+    Returns the connection pool options that are set in the environment.
+
+        Returns:
+            options (dict): Keyword arguments for MongoClient
+    '''
+
+    options = {}
+
+    for variable, option in POOL_OPTIONS.items():
+        value = os.getenv(variable)
+        if value:
+            options[option] = int(value)
+
+    return options
+
+
+def get_client() -> MongoClient:
+    '''
+    Returns the MongoClient shared by the whole process, creating it on first use.
+
+        Returns:
+            client (MongoClient): A MongoDB client for this project
+    '''
+
+    global _client
+
+    if _client is not None:
+        return _client
+
+    with _client_lock:
+        if _client is None:
+            load_dotenv()
+
+            MONGODB_URI = os.getenv('MONGODB_URI')
+
+            if not MONGODB_URI:
+                raise NameError('Please define MONGODB_URI in .env')
+
+            _client = MongoClient(MONGODB_URI, event_listeners=[_pool_statistics],
+                                  **get_pool_options())
+
+    return _client
+
 
 def get_database():
     '''
@@ -18,19 +164,49 @@ def get_database():
             dbname (Database): A MongoDB database for this project
     '''
 
-    load_dotenv()
+    client = get_client()
 
-    MONGODB_URI = os.getenv('MONGODB_URI')
     MONGODB_DB = os.getenv('MONGODB_DB')
 
-    if not MONGODB_URI:
-        raise NameError('Please define MONGODB_URI in .env')
-
     if not MONGODB_DB:
         raise NameError('Please define MONGODB_DB in .env')
 
-    client = MongoClient(MONGODB_URI)
-
     dbname = client[MONGODB_DB]
 
     return dbname
+
+
+def close_client() -> None:
+    '''
+    Closes the shared MongoClient, if one has been created. The next call to get_client creates a
+    new one.
+
+        Returns:
+            None
+    '''
+
+    global _client
+
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+def get_pool_stats() -> dict:
+    '''
+    Returns statistics about the connection pool of the shared MongoClient.
+
+        Returns:
+            stats (dict): Whether a client has been created, the pool options in use and counts of
+            open, created, closed and checked out connections
+    '''
+
+    stats = _pool_statistics.snapshot()
+    stats['client_created'] = _client is not None
+    stats['options'] = get_pool_options()
+
+    return stats
+
+
+atexit.register(close_client)
@@ -0,0 +1,41 @@
+'''
+Production settings for serving the ASGI app in asgi with gunicorn and uvicorn workers:
+
+    gunicorn -c gunicorn.conf.py asgi:app
+
+Each worker is a separate process with its own event loop, MongoDB client and in-memory city
+index, so the number of workers is limited by memory rather than by the number of connections.
+
+Environment variables:
+    PORT
+        The port to listen on, 8000 by default.
+
+    WEB_CONCURRENCY
+        The number of worker processes, two per CPU plus one by default.
+
+Notes:
+    The app is not preloaded in the master process. A MongoClient must not be shared across a
+    fork, so each worker connects and loads the index itself when it starts.
+'''
+
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'uvicorn.workers.UvicornWorker'
+preload_app = False
+
+# Loading the index reads every city from the database, give the workers time to start
+timeout = 120
+graceful_timeout = 30
+keepalive = 5
+
+# Restart workers now and then, at different times, to return memory left by old index snapshots
+max_requests = 10000
+max_requests_jitter = 1000
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.environ.get('LOG_LEVEL', 'info')
@@ -0,0 +1,147 @@
+'''
+This module manages the indexes of the cities collection.
+
+Every month gets a compound index that covers the get_cities filter, and a unique index on city and
+country covers the upserts done by the update-data script. The indexes are created by the
+update-data script and on API startup. Creating them is idempotent, so it is safe to do every time.
+
+Functions:
+    get_city_indexes() -> list
+        Returns the indexes the cities collection should have.
+
+    ensure_indexes(collection: Collection) -> dict
+        Creates any missing indexes on the cities collection and recreates indexes whose
+        definition has changed.
+
+    explain_get_cities(dbname: Database, month: str) -> dict
+        Reports whether the query plan of get_cities for a month uses an index.
+'''
+
+import logging
+from typing import Optional
+
+from pymongo import ASCENDING
+from pymongo.collection import Collection
+from pymongo.database import Database
+from pymongo.errors import OperationFailure
+
+from get_cities import MONTH_KEYS, build_cities_filter
+
+
+def get_city_indexes() -> list:
+    '''
+    Returns the indexes the cities collection should have.
+
+        Returns:
+            indexes (list[tuple[str, list[tuple[str, int]], bool]]): The name, keys and whether the
+            index is unique for each index
+    '''
+
+    # Safety is matched against a short list of values so it goes before the range filters on
+    # temperature and rain, following the equality, sort, range rule for compound indexes
+    indexes = [
+        (
+            f"months_{month}_safety_temperature_rain",
+            [
+                ("safety", ASCENDING),
+                (f"months.{month}.temperature", ASCENDING),
+                (f"months.{month}.rain", ASCENDING),
+            ],
+            False,
+        )
+        for month in MONTH_KEYS
+    ]
+
+    indexes.append(("city_country_unique", [("city", ASCENDING), ("country", ASCENDING)], True))
+
+    return indexes
+
+
+def ensure_indexes(collection: Collection) -> dict:
+    '''
+    Creates any missing indexes on the cities collection and recreates indexes whose keys or
+    uniqueness have changed. Indexes that already exist with the right definition are left alone.
+
+        Parameters:
+            collection (Collection): The cities collection
+
+        Returns:
+            report (dict[str, str]): For each index name, one of 'exists', 'created', 'recreated'
+            or 'failed'
+    '''
+
+    existing = collection.index_information()
+    report = {}
+
+    for name, keys, unique in get_city_indexes():
+        current = existing.get(name)
+
+        if current is not None:
+            if list(current['key']) == keys and bool(current.get('unique')) == unique:
+                report[name] = 'exists'
+                continue
+            collection.drop_index(name)
+
+        try:
+            collection.create_index(keys, name=name, unique=unique)
+        except OperationFailure as error:
+            # e.g. the unique index cannot be built while duplicate cities exist
+            logging.error("Could not create index %s: %s", name, error)
+            report[name] = 'failed'
+            continue
+
+        report[name] = 'recreated' if current is not None else 'created'
+        logging.info("Index %s %s", name, report[name])
+
+    return report
+
+
+def _find_index_scan(plan: dict) -> Optional[str]:
+    '''
+    Returns the name of the index used by an index scan in the plan, or None if there is no index
+    scan.
+    '''
+
+    if plan.get('stage') == 'IXSCAN':
+        return plan.get('indexName')
+
+    children = plan.get('inputStages', [])
+    if 'inputStage' in plan:
+        children = [plan['inputStage'], *children]
+
+    for child in children:
+        index_name = _find_index_scan(child)
+        if index_name:
+            return index_name
+
+    return None
+
+
+def explain_get_cities(dbname: Database, month: str) -> dict:
+    '''
+    Reports whether the query plan of get_cities for a month uses an index.
+
+        Parameters:
+            dbname (Database): The database containing the cities collection
+            month (str): The month key used in the database (e.g. 'jan')
+
+        Returns:
+            report (dict): 'uses_index' is True if the winning plan scans an index, False if it
+            does not and None if the server could not explain the query. 'index_name' is the name
+            of the index used, if any.
+    '''
+
+    query_filter = build_cities_filter(0.0, 30.0, month, 10.0)
+
+    try:
+        explanation = dbname["cities"].find(query_filter).explain()
+    except (AttributeError, NotImplementedError, OperationFailure):
+        # Not every server, e.g. mongomock, can explain queries
+        return {'uses_index': None, 'index_name': None}
+
+    winning_plan = explanation.get('queryPlanner', {}).get('winningPlan', {})
+    # Newer servers nest the plan of the classic query engine
+    winning_plan = winning_plan.get('queryPlan', winning_plan)
+    index_name = _find_index_scan(winning_plan)
+
+    return {'uses_index': index_name is not None, 'index_name': index_name}
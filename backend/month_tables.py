@@ -0,0 +1,232 @@
+'''
+This module builds, stores and loads precomputed month tables of the cities collection.
+
+A month table holds every city that has temperature, rain and safety data for the month. The table
+is partitioned by the safety value of the city's country, and each partition is sorted by
+temperature. A query only looks at the partitions of the safety values it accepts, so cities in
+unsafe countries are skipped without being read, and a temperature range is answered with two
+binary searches per partition followed by a rain filter on the small slice in between, instead of
+scanning every city.
+
+The safety value of a country is read from the country_safety collection written by the safety
+update, falling back to the value copied onto each city document.
+
+The tables are written to the month_tables collection by the update-data script, tagged with the
+data version they were built from, and loaded by the API's city index. Each month's table is split
+into chunks of at most MONTH_TABLE_CHUNK_SIZE cities, one document per chunk, so that the tables
+stay below MongoDB's document size limit however many cities there are.
+
+Functions:
+    load_country_safety(dbname: Database) -> dict
+        Loads the safety value of every country with a travel advisory.
+
+    build_month_tables(documents: list, country_safety: Optional[dict]) -> dict
+        Builds a table for every month from a list of city documents.
+
+    write_month_tables(dbname: Database, version: int, chunk_size: int) -> None
+        Builds the month tables from the cities collection and stores them in the database.
+
+    load_month_tables(dbname: Database, version: int) -> Optional[dict]
+        Loads the month tables built from the given data version, if they exist.
+'''
+
+import math
+from bisect import bisect_right
+from typing import Optional
+
+from pymongo import ReplaceOne
+from pymongo.database import Database
+
+from bulk_writes import write_in_batches
+from get_cities import MONTH_KEYS, SAFETY_LEVELS
+
+MONTH_TABLES_COLLECTION = "month_tables"
+COUNTRY_SAFETY_COLLECTION = "country_safety"
+
+# The number of cities per month table document. A city takes about 110 bytes, so a chunk stays
+# far below the 16 MB document limit of MongoDB
+MONTH_TABLE_CHUNK_SIZE = 10000
+
+# The parallel lists of a month table, which are split between its chunks
+TABLE_COLUMNS = ['cities', 'countries', 'temperatures', 'rains', 'safety', 'positions']
+
+# Fields of the cities collection needed to build the tables
+CITY_PROJECTION = {
+    '_id': 0,
+    'city': 1,
+    'country': 1,
+    'months': 1,
+    'safety': 1
+}
+
+
+def _to_number(value) -> Optional[float]:
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+
+    return None if math.isnan(number) else number
+
+
+def load_country_safety(dbname: Database) -> dict:
+    '''
+    Loads the safety value of every country with a travel advisory.
+
+        Parameters:
+            dbname (Database): The database to read the country safety values from
+
+        Returns:
+            country_safety (dict[str, int]): The safety value of each country
+    '''
+
+    return {document['_id']: document['safety']
+            for document in dbname[COUNTRY_SAFETY_COLLECTION].find()}
+
+
+def build_month_tables(documents: list, country_safety: Optional[dict] = None) -> dict:
+    '''
+    Builds a table for every month from a list of city documents. Cities missing the temperature,
+    rain or safety value for a month are left out of that month's table since they can never match
+    a query.
+
+        Parameters:
+            documents (list[dict]): City documents in the format of the cities collection
+            country_safety (Optional[dict[str, int]]): The safety value of each country, which
+            takes precedence over the safety value of the city documents
+
+        Returns:
+            tables (dict[str, dict[str, list]]): A table for each month key (e.g. 'jan'). Each table
+            has the parallel lists 'cities', 'countries', 'temperatures', 'rains', 'safety' and
+            'positions', sorted by safety and then by temperature. 'positions' is the index of
+            each city in documents, which can be used to return matches in the same order as the
+            cities collection. 'safety_starts' has the index of the first city with a safety value
+            above each level, starting from level 0, so the cities with a safety value of at most
+            level are the first safety_starts[level].
+    '''
+
+    country_safety = country_safety or {}
+    tables = {}
+
+    for month in MONTH_KEYS:
+        rows = []
+
+        for position, document in enumerate(documents):
+            month_data = (document.get('months') or {}).get(month) or {}
+            temperature = _to_number(month_data.get('temperature'))
+            rain = _to_number(month_data.get('rain'))
+            safety = _to_number(country_safety.get(document.get('country'),
+                                                   document.get('safety')))
+
+            if temperature is None or rain is None or safety is None:
+                continue
+
+            rows.append((safety, temperature, position, document['city'], document['country'],
+                         rain))
+
+        # Sorting on position last keeps cities with equal temperatures in order
+        rows.sort(key=lambda row: (row[0], row[1], row[2]))
+        safety_values = [row[0] for row in rows]
+
+        tables[month] = {
+            'cities': [row[3] for row in rows],
+            'countries': [row[4] for row in rows],
+            'temperatures': [row[1] for row in rows],
+            'rains': [row[5] for row in rows],
+            'safety': safety_values,
+            'positions': [row[2] for row in rows],
+            'safety_starts': [bisect_right(safety_values, level)
+                              for level in [0] + SAFETY_LEVELS],
+        }
+
+    return tables
+
+
+def _chunk_table(month: str, table: dict, version: int, chunk_size: int) -> list:
+    row_count = len(table['cities'])
+    # A month without any cities still gets a chunk, so that its table is found when loading
+    chunk_count = max(1, math.ceil(row_count / chunk_size))
+
+    return [
+        {
+            '_id': f'{month}:{chunk}',
+            'month': month,
+            'chunk': chunk,
+            'chunks': chunk_count,
+            'version': version,
+            'safety_starts': table['safety_starts'],
+            **{column: table[column][chunk * chunk_size:(chunk + 1) * chunk_size]
+               for column in TABLE_COLUMNS}
+        }
+        for chunk in range(chunk_count)
+    ]
+
+
+def write_month_tables(dbname: Database, version: int,
+                       chunk_size: int = MONTH_TABLE_CHUNK_SIZE) -> None:
+    '''
+    Builds the month tables from the cities collection and stores them in the database, replacing
+    the tables of any previous version.
+
+        Parameters:
+            dbname (Database): The database to read the cities from and write the tables to
+            version (int): The data version of the cities collection
+            chunk_size (int): The maximum number of cities per document of a month's table
+
+        Returns:
+            None
+    '''
+
+    documents = list(dbname["cities"].find({}, CITY_PROJECTION))
+    tables = build_month_tables(documents, load_country_safety(dbname))
+    collection = dbname[MONTH_TABLES_COLLECTION]
+
+    chunks = [chunk for month, table in tables.items()
+              for chunk in _chunk_table(month, table, version, chunk_size)]
+    write_in_batches(collection,
+                     (ReplaceOne({'_id': chunk['_id']}, chunk, upsert=True) for chunk in chunks),
+                     label='month table chunks')
+
+    # Remove the chunks of previous versions that had more chunks, and tables in older formats
+    collection.delete_many({'_id': {'$nin': [chunk['_id'] for chunk in chunks]}})
+
+
+def load_month_tables(dbname: Database, version: int) -> Optional[dict]:
+    '''
+    Loads the month tables built from the given data version, joining the chunks of each month.
+
+        Parameters:
+            dbname (Database): The database to load the tables from
+            version (int): The data version the tables should have been built from
+
+        Returns:
+            tables (Optional[dict]): The tables in the format returned by build_month_tables, or
+            None if the tables for this version have not been written for every month, are missing
+            chunks, or were written in an older format
+    '''
+
+    chunks = {}
+
+    for document in dbname[MONTH_TABLES_COLLECTION].find({'version': version}):
+        # Tables written before they were partitioned by safety or split into chunks have to be
+        # rebuilt
+        if 'safety_starts' not in document or 'chunk' not in document:
+            return None
+        chunks.setdefault(document['month'], {})[document['chunk']] = document
+
+    if set(chunks) != set(MONTH_KEYS):
+        return None
+
+    tables = {}
+
+    for month, month_chunks in chunks.items():
+        # The tables are being rewritten if chunks are missing
+        if set(month_chunks) != set(range(month_chunks[min(month_chunks)]['chunks'])):
+            return None
+
+        ordered = [month_chunks[chunk] for chunk in sorted(month_chunks)]
+        tables[month] = {column: [value for chunk in ordered for value in chunk[column]]
+                         for column in TABLE_COLUMNS}
+        tables[month]['safety_starts'] = ordered[0]['safety_starts']
+
+    return tables
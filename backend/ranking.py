@@ -0,0 +1,197 @@
+'''
+This module ranks cities by how well they match a search, for the ranked search of the API.
+
+Instead of returning every city that passes the temperature and rain thresholds, each city gets a
+score from its distance to the middle of the temperature range, its rainy days and the safety value
+of its country. Lower scores are better. Only the best cities are returned, selected with a partial
+sort, and the next page is requested with a cursor that holds the score and position of the last
+city returned, so pages stay stable while the client pages through them. The cursor also holds the
+data version the page was ranked from, so it is rejected once the data has changed instead of
+skipping or repeating cities.
+
+Functions:
+    score_cities(temperatures: np.ndarray, rains: np.ndarray, safety: np.ndarray, min_temp: float,
+                 max_temp: float, rainy_days: float) -> np.ndarray
+        Scores cities by how well they match a search.
+
+    select_top_k(scores: np.ndarray, positions: np.ndarray, limit: int,
+                 after: Optional[tuple]) -> np.ndarray
+        Returns the indices of the best scores, after a cursor if one is given.
+
+    parse_limit(limit: Optional[str]) -> int
+        Validates the number of cities a page of ranked results holds.
+
+    encode_cursor(version: int, score: float, position: int) -> str
+        Encodes the data version and the score and position of the last city of a page as a
+        cursor.
+
+    decode_cursor(cursor: Optional[str], version: int) -> Optional[tuple]
+        Decodes a cursor returned by encode_cursor for the same data version.
+'''
+
+import base64
+import binascii
+import json
+import math
+from typing import Optional
+
+import numpy as np
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+# How much a rainy day and each step of the travel advisory scale count against a city, relative
+# to a temperature at the edge of the searched range
+RAIN_WEIGHT = 1.0
+SAFETY_WEIGHT = 0.5
+
+# Temperature ranges narrower than this are scored as if they were this wide, so a search for a
+# single temperature does not make every other temperature infinitely bad
+MIN_TEMPERATURE_TOLERANCE = 1.0
+
+
+def score_cities(temperatures: np.ndarray, rains: np.ndarray, safety: np.ndarray,
+                 min_temp: float, max_temp: float, rainy_days: float) -> np.ndarray:
+    '''
+    Scores cities by how well they match a search. A city in the middle of the temperature range
+    without rain in the safest country scores 0. A city at the edge of the range, or with as many
+    rainy days as the maximum, scores 1 more, and each step up the travel advisory scale adds
+    SAFETY_WEIGHT.
+
+        Parameters:
+            temperatures (np.ndarray): The temperature of each city for the month
+            rains (np.ndarray): The average number of rainy days of each city for the month
+            safety (np.ndarray): The safety value of the country of each city
+            min_temp (float): The minimum temperature of the search
+            max_temp (float): The maximum temperature of the search
+            rainy_days (float): The maximum number of rainy days of the search
+
+        Returns:
+            scores (np.ndarray): The score of each city, lower is better
+    '''
+
+    if math.isinf(min_temp) or math.isinf(max_temp):
+        # A range that is open on one side has no middle, so every temperature in it fits as well
+        temperature_scores = np.zeros(len(temperatures))
+    else:
+        target = (min_temp + max_temp) / 2
+        tolerance = max((max_temp - min_temp) / 2, MIN_TEMPERATURE_TOLERANCE)
+        temperature_scores = np.abs(temperatures - target) / tolerance
+
+    return (temperature_scores
+            + RAIN_WEIGHT * rains / max(rainy_days, 1.0)
+            + SAFETY_WEIGHT * (safety - 1))
+
+
+def select_top_k(scores: np.ndarray, positions: np.ndarray, limit: int,
+                 after: Optional[tuple] = None) -> np.ndarray:
+    '''
+    Returns the indices of the best scores, ordered by score and then by position so that ties are
+    always broken the same way. Only the candidates for the top scores are sorted.
+
+        Parameters:
+            scores (np.ndarray): The score of each city, lower is better
+            positions (np.ndarray): The position of each city in the cities collection
+            limit (int): The maximum number of indices to return
+            after (Optional[tuple[float, int]]): The score and position of the last city of the
+            previous page, only cities ranked after it are returned
+
+        Returns:
+            indices (np.ndarray): The indices of the best cities, best first
+    '''
+
+    candidates = np.arange(len(scores))
+    if after is not None:
+        after_score, after_position = after
+        candidates = candidates[(scores > after_score)
+                                | ((scores == after_score) & (positions > after_position))]
+
+    if len(candidates) > limit:
+        # Every city with a score up to the limit-th smallest is a candidate, including all cities
+        # tied with it, so that ties are broken by position rather than by argpartition
+        kth_score = scores[candidates[np.argpartition(scores[candidates], limit - 1)[limit - 1]]]
+        candidates = candidates[scores[candidates] <= kth_score]
+
+    order = np.lexsort((positions[candidates], scores[candidates]))
+
+    return candidates[order[:limit]]
+
+
+def parse_limit(limit: Optional[str]) -> int:
+    '''
+    Validates the number of cities a page of ranked results holds.
+
+        Parameters:
+            limit (Optional[str]): A string representing the number of cities, or None to use the
+            default
+
+        Returns:
+            limit (int): The number of cities
+
+        Raises:
+            ValueError: If the limit is not a number from 1 to MAX_LIMIT
+    '''
+
+    if limit is None or limit == '':
+        return DEFAULT_LIMIT
+
+    try:
+        int_limit = int(limit)
+    except ValueError as exc:
+        raise ValueError("Invalid limit. Please provide a number.") from exc
+
+    if not 1 <= int_limit <= MAX_LIMIT:
+        raise ValueError(f"Invalid limit: {limit}. Please provide a value from 1 to {MAX_LIMIT}.")
+
+    return int_limit
+
+
+def encode_cursor(version: int, score: float, position: int) -> str:
+    '''
+    Encodes the data version and the score and position of the last city of a page as an opaque,
+    URL safe cursor.
+
+        Parameters:
+            version (int): The data version the page was ranked from
+            score (float): The score of the city
+            position (int): The position of the city in the cities collection
+
+        Returns:
+            cursor (str): The cursor
+    '''
+
+    data = json.dumps([int(version), float(score), int(position)]).encode('utf-8')
+    return base64.urlsafe_b64encode(data).decode('ascii')
+
+
+def decode_cursor(cursor: Optional[str], version: int) -> Optional[tuple]:
+    '''
+    Decodes a cursor returned by encode_cursor.
+
+        Parameters:
+            cursor (Optional[str]): The cursor, or None for the first page
+            version (int): The data version the next page is ranked from
+
+        Returns:
+            after (Optional[tuple[float, int]]): The score and position in the cursor, or None
+
+        Raises:
+            ValueError: If the cursor was not returned by encode_cursor, or was returned for
+            another data version, since the positions of the cities may have changed
+    '''
+
+    if not cursor:
+        return None
+
+    try:
+        cursor_version, score, position = json.loads(
+            base64.urlsafe_b64decode(cursor.encode('ascii')))
+        cursor_version, after = int(cursor_version), (float(score), int(position))
+    except (binascii.Error, UnicodeError, TypeError, ValueError) as exc:
+        raise ValueError("Invalid cursor. Please use the cursor of the previous page.") from exc
+
+    if cursor_version != version:
+        raise ValueError("The cities have been updated since this cursor was returned. Please "
+                         "start again from the first page.")
+
+    return after
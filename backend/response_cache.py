@@ -0,0 +1,187 @@
+'''
+This module defines a bounded in-memory cache for /cities responses.
+
+The query space of /cities is small, so identical searches are very common. Queries are normalized
+before being used as cache keys: temperatures and rainy days are rounded to the precision the data
+is stored with, in the direction that does not change which cities match. Cached responses are
+tied to the data version they were computed from and the whole cache is cleared when the version
+changes.
+
+Functions:
+    normalize_query(min_temp: str, max_temp: str, month: str, rainy_days: str) -> tuple
+        Validates a cities query and rounds it to the precision of the stored data.
+
+    normalize_conditions(min_temp: str, max_temp: str, rainy_days: str) -> tuple
+        Validates the temperature range and rainy days of a query and rounds them to the precision
+        of the stored data.
+
+Classes:
+    ResponseCache
+        Least recently used cache with a time to live for each entry.
+'''
+
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from get_cities import parse_conditions, parse_query
+
+# Number of decimals temperatures and rainy days are stored with in the database
+TEMPERATURE_PRECISION = 1
+RAIN_PRECISION = 2
+
+DEFAULT_MAX_SIZE = 1024
+DEFAULT_TTL = 300
+
+
+def _round_up(value: float, decimals: int) -> float:
+    # Infinite bounds, e.g. rainyDays=inf or 1e400, match the same cities at any precision
+    if math.isinf(value):
+        return value
+
+    scale = 10 ** decimals
+    # Round first to remove floating point noise, e.g. 20.1 * 10 = 201.00000000000003
+    return math.ceil(round(value * scale, 6)) / scale
+
+
+def _round_down(value: float, decimals: int) -> float:
+    if math.isinf(value):
+        return value
+
+    scale = 10 ** decimals
+    return math.floor(round(value * scale, 6)) / scale
+
+
+def normalize_query(min_temp: str, max_temp: str, month: str, rainy_days: str) -> tuple:
+    '''
+    Validates a cities query and rounds it to the precision of the stored data, so that queries
+    that match the same cities share a cache key. The minimum temperature is rounded up and the
+    maximum temperature and rainy days are rounded down, e.g. a range of 19.95 to 30.04 matches the
+    same stored values as a range of 20.0 to 30.0.
+
+        Parameters:
+            min_temp (str): A string representing the minimum temperature
+            max_temp (str): A string representing the maximum temperature
+            month (str): A string representing the month (e.g., 'January', 'February', etc.)
+            rainy_days (str): A string representing the maximum number of rainy days
+
+        Returns:
+            query (tuple[float, float, str, float]): The normalized minimum temperature, maximum
+            temperature, month key used in the database (e.g. 'jan') and maximum number of rainy
+            days
+
+        Raises:
+            ValueError: If the query is not valid, see parse_query
+    '''
+
+    float_min_temp, float_max_temp, shortened_month, float_rainy_days = parse_query(
+        min_temp, max_temp, month, rainy_days)
+
+    return (
+        _round_up(float_min_temp, TEMPERATURE_PRECISION),
+        _round_down(float_max_temp, TEMPERATURE_PRECISION),
+        shortened_month,
+        _round_down(float_rainy_days, RAIN_PRECISION),
+    )
+
+
+def normalize_conditions(min_temp: str, max_temp: str, rainy_days: str) -> tuple:
+    '''
+    Validates the temperature range and rainy days of a query and rounds them like normalize_query,
+    e.g. for queries over several months.
+
+        Parameters:
+            min_temp (str): A string representing the minimum temperature
+            max_temp (str): A string representing the maximum temperature
+            rainy_days (str): A string representing the maximum number of rainy days
+
+        Returns:
+            conditions (tuple[float, float, float]): The normalized minimum temperature, maximum
+            temperature and maximum number of rainy days
+
+        Raises:
+            ValueError: If the conditions are not valid, see parse_conditions
+    '''
+
+    float_min_temp, float_max_temp, float_rainy_days = parse_conditions(
+        min_temp, max_temp, rainy_days)
+
+    return (
+        _round_up(float_min_temp, TEMPERATURE_PRECISION),
+        _round_down(float_max_temp, TEMPERATURE_PRECISION),
+        _round_down(float_rainy_days, RAIN_PRECISION),
+    )
+
+
+class ResponseCache:
+    '''
+    Least recently used cache with a time to live for each entry. Entries belong to a data version
+    and the cache is cleared as soon as it is used with a different version.
+
+        Parameters:
+            max_size (int): The maximum number of entries to keep
+            ttl (float): The number of seconds an entry is kept for
+            clock (Callable[[], float]): Returns the current time in seconds
+    '''
+
+    def __init__(self, max_size: int = DEFAULT_MAX_SIZE, ttl: float = DEFAULT_TTL,
+                 clock=time.monotonic):
+        self._max_size = max_size
+        self._ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._version = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        '''
+        Removes all entries from the cache.
+
+            Returns:
+                None
+        '''
+
+        with self._lock:
+            self._entries.clear()
+
+    def get_or_compute(self, key, version, compute):
+        '''
+        Returns the cached value for the key, or computes, caches and returns it if there is no
+        entry for the key or the entry has expired.
+
+            Parameters:
+                key (Hashable): The cache key, e.g. a query returned by normalize_query
+                version (int): The data version the value is computed from
+                compute (Callable[[], Any]): Computes the value on a cache miss
+
+            Returns:
+                value (Any): The cached or computed value
+        '''
+
+        now = self._clock()
+
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                return entry[1]
+
+        # Compute outside of the lock so that a slow miss does not block hits
+        value = compute()
+
+        with self._lock:
+            if version == self._version:
+                self._entries[key] = (now + self._ttl, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self._max_size:
+                    self._entries.popitem(last=False)
+
+        return value
@@ -0,0 +1,184 @@
+'''
+This module encodes the responses of the /cities endpoints as compactly as the client allows.
+
+Three things are negotiated for every response:
+    - The shape. Clients that accept COLUMNAR_MIMETYPE, or pass format=columnar, get the cities of
+      each country as parallel arrays, e.g. {"Canada": {"city": [...], "temperature": [...],
+      "rain": [...]}}, instead of repeating the key names for every city.
+    - The compression. The body is compressed with brotli or gzip if the client accepts it.
+    - Whether a body is needed at all. Responses get a strong ETag derived from the data version,
+      the normalized query, the shape and the compression, so a client repeating a search gets a
+      304 Not Modified without the query being run.
+
+Functions:
+    to_columns(rows: list) -> dict
+        Converts a list of objects with the same keys into a dict of parallel lists.
+
+    columnar_cities(cities_by_country: dict) -> dict
+        Converts cities grouped by country into parallel lists per country.
+
+    choose_shape(accept: MIMEAccept, format_param: Optional[str]) -> str
+        Returns the response shape the client asked for.
+
+    choose_encoding(accept_encodings: Accept) -> str
+        Returns the best content coding supported by both the client and the server.
+
+    make_etag(version: int, key: tuple, shape: str, coding: str) -> str
+        Returns a strong entity tag for a response.
+
+    encode_body(payload: Any, coding: str) -> tuple
+        Serializes a payload as compact JSON and compresses it.
+
+Notes:
+    Brotli compression requires the Brotli package. Without it, responses are compressed with gzip.
+'''
+
+import gzip
+import hashlib
+import json
+from typing import Any, Optional
+
+from werkzeug.datastructures import Accept, MIMEAccept
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+JSON_MIMETYPE = 'application/json'
+COLUMNAR_MIMETYPE = 'application/vnd.vacation-finder.columnar+json'
+
+ROWS_SHAPE = 'rows'
+COLUMNAR_SHAPE = 'columnar'
+
+IDENTITY_CODING = 'identity'
+
+# Bodies smaller than this are sent uncompressed, the headers would cost more than the savings
+MIN_COMPRESS_SIZE = 512
+
+# Compression levels chosen for speed, the bodies are cached so each one is only compressed once
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def to_columns(rows: list) -> dict:
+    '''
+    Converts a list of objects with the same keys into a dict of parallel lists.
+
+        Parameters:
+            rows (list[dict]): The objects, e.g. the cities of a country
+
+        Returns:
+            columns (dict[str, list]): The values of each key, in the order of the rows
+    '''
+
+    if not rows:
+        return {}
+
+    return {key: [row[key] for row in rows] for key in rows[0]}
+
+
+def columnar_cities(cities_by_country: dict) -> dict:
+    '''
+    Converts cities grouped by country, as returned by get_cities, into parallel lists per country.
+
+        Parameters:
+            cities_by_country (dict[str, list[dict]]): The cities of each country
+
+        Returns:
+            columns (dict[str, dict[str, list]]): The parallel lists of each country
+    '''
+
+    return {country: to_columns(cities) for country, cities in cities_by_country.items()}
+
+
+def choose_shape(accept: MIMEAccept, format_param: Optional[str] = None) -> str:
+    '''
+    Returns the response shape the client asked for, either with the format query parameter or
+    with the Accept header.
+
+        Parameters:
+            accept (MIMEAccept): The parsed Accept header of the request
+            format_param (Optional[str]): The format query parameter of the request
+
+        Returns:
+            shape (str): COLUMNAR_SHAPE or ROWS_SHAPE
+
+        Raises:
+            ValueError: If the format parameter is not a known shape
+    '''
+
+    if format_param:
+        if format_param not in (ROWS_SHAPE, COLUMNAR_SHAPE):
+            raise ValueError(
+                f"Invalid format: {format_param}. Please provide {ROWS_SHAPE} or "
+                f"{COLUMNAR_SHAPE}.")
+        return format_param
+
+    # Columnar is only used when the client prefers it, plain JSON stays the default
+    if accept.best_match([JSON_MIMETYPE, COLUMNAR_MIMETYPE]) == COLUMNAR_MIMETYPE:
+        return COLUMNAR_SHAPE
+
+    return ROWS_SHAPE
+
+
+def choose_encoding(accept_encodings: Accept) -> str:
+    '''
+    Returns the best content coding supported by both the client and the server. Brotli is
+    preferred over gzip when the client accepts both equally.
+
+        Parameters:
+            accept_encodings (Accept): The parsed Accept-Encoding header of the request
+
+        Returns:
+            coding (str): 'br', 'gzip' or 'identity'
+    '''
+
+    supported = ['br', 'gzip'] if brotli is not None else ['gzip']
+
+    return accept_encodings.best_match(supported) or IDENTITY_CODING
+
+
+def make_etag(version: int, key: tuple, shape: str, coding: str) -> str:
+    '''
+    Returns a strong entity tag for a response. The tag only depends on what determines the bytes
+    of the body, so it can be checked before the query is run.
+
+        Parameters:
+            version (int): The data version the response is computed from
+            key (tuple): The normalized query
+            shape (str): The response shape
+            coding (str): The content coding of the body
+
+        Returns:
+            etag (str): The entity tag, without quotes
+    '''
+
+    digest = hashlib.sha256(repr((version, key, shape)).encode('utf-8')).hexdigest()[:32]
+
+    # Each content coding is a different representation, so it needs its own strong tag
+    return f"{digest}-{coding}"
+
+
+def encode_body(payload: Any, coding: str) -> tuple:
+    '''
+    Serializes a payload as compact JSON and compresses it with the given content coding.
+
+        Parameters:
+            payload (Any): The JSON serializable payload
+            coding (str): 'br', 'gzip' or 'identity'
+
+        Returns:
+            body (tuple[bytes, str]): The body and the content coding actually used, which is
+            identity for small bodies
+    '''
+
+    body = json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+    if coding == IDENTITY_CODING or len(body) < MIN_COMPRESS_SIZE:
+        return body, IDENTITY_CODING
+
+    if coding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY), coding
+
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0), coding
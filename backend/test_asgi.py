@@ -0,0 +1,115 @@
+'''
+Test cases for the ASGI app
+'''
+
+import asyncio
+import json
+
+from asgi import CitiesAsgiApp
+from test_cities_api import QUERY, make_api
+
+
+def request(app, method, path, query_string=b'', headers=()):
+    '''
+    Sends one request to an ASGI app and returns the status, headers and body of the response.
+    '''
+
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    async def run():
+        await app({'type': 'http', 'method': method, 'path': path, 'query_string': query_string,
+                   'headers': list(headers)}, receive, send)
+        await app.shutdown()
+
+    asyncio.run(run())
+
+    start, body = messages
+    return (start['status'], {name.decode(): value.decode() for name, value in start['headers']},
+            body['body'])
+
+
+def test_lifespan():
+    '''
+    Tests that the API is created on startup, once, and that shutdown completes.
+    '''
+
+    created = []
+
+    def create_api():
+        created.append(make_api())
+        return created[-1]
+
+    app = CitiesAsgiApp(create_api)
+    events = iter([{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}])
+    sent = []
+
+    async def receive():
+        return next(events)
+
+    async def send(message):
+        sent.append(message['type'])
+
+    async def run():
+        await app({'type': 'lifespan'}, receive, send)
+        await app.startup()
+
+    asyncio.run(run())
+
+    assert sent == ['lifespan.startup.complete', 'lifespan.shutdown.complete']
+    assert len(created) == 1
+
+
+def test_cities():
+    '''
+    Tests that /cities is answered the same as by the API, with the CORS header.
+    '''
+
+    app = CitiesAsgiApp(make_api)
+    query_string = '&'.join(f'{name}={value}' for name, value in QUERY.items()).encode()
+
+    status, headers, body = request(app, 'GET', '/cities', query_string)
+
+    assert status == 200
+    assert headers['access-control-allow-origin'] == '*'
+    assert headers['content-length'] == str(len(body))
+    assert json.loads(body) == json.loads(make_api().handle('/cities', QUERY, {})[2])
+
+
+def test_invalid_query():
+    '''
+    Tests that validation errors are answered with a 400.
+    '''
+
+    status, _, body = request(CitiesAsgiApp(make_api), 'GET', '/cities', b'minTemp=a')
+
+    assert status == 400
+    assert json.loads(body)['error']
+
+
+def test_head_and_preflight():
+    '''
+    Tests that HEAD requests get the headers without the body and that CORS preflight requests
+    are allowed.
+    '''
+
+    app = CitiesAsgiApp(make_api)
+    query_string = '&'.join(f'{name}={value}' for name, value in QUERY.items()).encode()
+
+    status, headers, body = request(app, 'HEAD', '/cities', query_string)
+    assert status == 200
+    assert body == b''
+    assert int(headers['content-length']) > 0
+
+    status, headers, _ = request(app, 'OPTIONS', '/cities',
+                                 headers=[(b'access-control-request-method', b'GET')])
+    assert status == 204
+    assert 'GET' in headers['access-control-allow-methods']
+
+    status, _, _ = request(app, 'POST', '/cities')
+    assert status == 405
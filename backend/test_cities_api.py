@@ -0,0 +1,169 @@
+'''
+Test cases for the CitiesApi class
+'''
+
+import json
+
+from cities_api import CitiesApi
+from city_index import CityIndex
+from data_version import bump_data_version
+from response_cache import ResponseCache
+from response_encoding import COLUMNAR_MIMETYPE
+from test_city_index import make_database
+
+QUERY = {'minTemp': '0', 'maxTemp': '40', 'month': 'August', 'rainyDays': '30'}
+
+
+def make_api():
+    '''
+    Returns an API answering from the cities of the get_cities tests.
+    '''
+
+    return CitiesApi(CityIndex(make_database()))
+
+
+def test_cities():
+    '''
+    Tests that /cities returns the same cities as the index, as JSON.
+    '''
+
+    api = make_api()
+
+    status, headers, body = api.handle('/cities', QUERY, {})
+
+    assert status == 200
+    assert headers['Content-Type'] == 'application/json'
+    assert 'Content-Encoding' not in headers
+    assert json.loads(body) == api.city_index.get_cities('0', '40', 'August', '30')
+
+
+def test_columnar_cities():
+    '''
+    Tests that the columnar shape is returned when the client asks for it.
+    '''
+
+    status, headers, body = make_api().handle('/cities', QUERY, {'accept': COLUMNAR_MIMETYPE})
+
+    assert status == 200
+    assert headers['Content-Type'] == COLUMNAR_MIMETYPE
+    assert all(isinstance(columns['city'], list) for columns in json.loads(body).values())
+
+
+def test_invalid_query():
+    '''
+    Tests that invalid queries are answered with a 400 holding the validation error.
+    '''
+
+    api = make_api()
+
+    for args in [{**QUERY, 'minTemp': 'a'}, {**QUERY, 'month': 'Augst'},
+                 {**QUERY, 'maxSafety': '9'}, {**QUERY, 'format': 'xml'}]:
+        status, _, body = api.handle('/cities', args, {})
+        assert status == 400
+        assert json.loads(body)['error']
+
+    status, _, _ = api.handle('/cities/ranked', {**QUERY, 'cursor': 'not a cursor'}, {})
+    assert status == 400
+
+
+def test_infinite_and_nan_values():
+    '''
+    Tests that infinite values are answered like any other bound and that NaN gets a 400.
+    '''
+
+    api = make_api()
+    unbounded = {**QUERY, 'maxTemp': '1e400', 'rainyDays': 'inf'}
+
+    for path in ['/cities', '/cities/ranked']:
+        status, _, _ = api.handle(path, unbounded, {})
+        assert status == 200
+
+    status, _, _ = api.handle('/cities/months', {**unbounded, 'months': 'June,July'}, {})
+    assert status == 200
+
+    for args in [{**QUERY, 'maxTemp': 'nan'}, {**QUERY, 'rainyDays': 'nan'}]:
+        status, _, body = api.handle('/cities', args, {})
+        assert status == 400
+        assert 'Please provide' in json.loads(body)['error']
+
+
+def test_ranked_cursor_expires_with_data_version():
+    '''
+    Tests that the cursor of a ranked page is answered with a 400 once the data has been updated,
+    instead of skipping or repeating cities.
+    '''
+
+    database = make_database()
+    api = CitiesApi(CityIndex(database))
+    query = {**QUERY, 'limit': '1'}
+
+    status, _, body = api.handle('/cities/ranked', query, {})
+    assert status == 200
+    cursor = json.loads(body)['cursor']
+
+    status, _, _ = api.handle('/cities/ranked', {**query, 'cursor': cursor}, {})
+    assert status == 200
+
+    bump_data_version(database)
+    api.city_index.refresh()
+
+    status, _, body = api.handle('/cities/ranked', {**query, 'cursor': cursor}, {})
+    assert status == 400
+    assert 'first page' in json.loads(body)['error']
+
+
+def test_unknown_path():
+    '''
+    Tests that paths other than the /cities endpoints are not found.
+    '''
+
+    status, _, _ = make_api().handle('/countries', QUERY, {})
+
+    assert status == 404
+
+
+def test_not_modified():
+    '''
+    Tests that a request repeating the ETag of a previous response gets a 304 without a body.
+    '''
+
+    api = make_api()
+    _, headers, _ = api.handle('/cities/months', {**QUERY, 'months': 'July,August'}, {})
+
+    status, not_modified_headers, body = api.handle(
+        '/cities/months', {**QUERY, 'months': 'July,August'}, {'if-none-match': headers['ETag']})
+
+    assert status == 304
+    assert body == b''
+    assert not_modified_headers['ETag'] == headers['ETag']
+
+
+def test_body_matches_etag_version():
+    '''
+    Tests that a response is computed from the data version its ETag and cache entry are labelled
+    with, even if the index is reloaded while the response is computed.
+    '''
+
+    database = make_database()
+    api = CitiesApi(CityIndex(database, refresh_interval=0))
+    expected = api.city_index.get_cities('0', '40', 'August', '30')
+
+    class ReloadingCache(ResponseCache):
+        def get_or_compute(self, key, version, compute):
+            # New data arrives after the ETag was computed but before the body is
+            database["cities"].update_many({}, {"$set": {"months.aug.temperature": 50}})
+            bump_data_version(database)
+            return super().get_or_compute(key, version, compute)
+
+    api.response_cache = ReloadingCache()
+    status, headers, body = api.handle('/cities', QUERY, {})
+
+    assert status == 200
+    assert json.loads(body) == expected
+
+    # The new data is served under a new ETag
+    api.response_cache = ResponseCache()
+    _, new_headers, new_body = api.handle('/cities', QUERY, {})
+
+    assert new_headers['ETag'] != headers['ETag']
+    assert json.loads(new_body) != expected
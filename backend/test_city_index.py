@@ -0,0 +1,310 @@
+'''
+Test cases for the CityIndex class
+'''
+
+import copy
+import math
+
+import pytest
+import mongomock
+
+from city_index import CityIndex
+from data_version import bump_data_version
+from get_cities import get_cities, get_cities_for_months, MONTH_KEYS, VALID_MONTHS
+from month_tables import (COUNTRY_SAFETY_COLLECTION, CITY_PROJECTION, build_month_tables,
+                          load_country_safety, load_month_tables, write_month_tables)
+from test_get_cities import toronto, ottawa, mexico_city, kabul
+
+
+def make_database():
+    '''
+    Returns a new database containing the same cities as the get_cities tests.
+    '''
+
+    database = mongomock.MongoClient().db
+
+    cities = [copy.deepcopy(city) for city in [toronto, ottawa, mexico_city, kabul]]
+    for city in cities:
+        city.pop('_id', None)
+    database["cities"].insert_many(cities)
+
+    return database
+
+
+def test_invalid_query():
+    '''
+    Tests that the index raises the same errors as get_cities for invalid queries.
+    '''
+
+    index = CityIndex(make_database())
+
+    with pytest.raises(ValueError):
+        index.get_cities('1', '0', 'January', '2')
+
+    with pytest.raises(ValueError):
+        index.get_cities('1', '5', 'january', '2')
+
+    with pytest.raises(ValueError):
+        index.get_cities('a', '5', 'January', '2')
+
+
+@pytest.mark.parametrize('month', VALID_MONTHS)
+@pytest.mark.parametrize('min_temp, max_temp, rainy_days', [
+    ('-10', '0', '10'),
+    ('0', '20', '5'),
+    ('20', '25', '8'),
+    ('20', '30', '1.2'),
+    ('-50', '50', '31'),
+])
+def test_matches_get_cities(month, min_temp, max_temp, rainy_days):
+    '''
+    Tests that the index returns the same cities as get_cities.
+    '''
+
+    database = make_database()
+    index = CityIndex(database)
+
+    assert index.get_cities(min_temp, max_temp, month, rainy_days) == get_cities(
+        min_temp, max_temp, month, rainy_days, database)
+
+
+@pytest.mark.parametrize('max_safety', ['1', '2', '3', '4'])
+def test_matches_get_cities_for_max_safety(max_safety):
+    '''
+    Tests that the index returns the same cities as get_cities for every maximum safety value.
+    '''
+
+    database = make_database()
+    index = CityIndex(database)
+
+    for month in VALID_MONTHS:
+        assert index.get_cities('-50', '50', month, '31', max_safety) == get_cities(
+            '-50', '50', month, '31', database, max_safety)
+
+
+@pytest.mark.parametrize('mode', ['all', 'any'])
+@pytest.mark.parametrize('months', [['jan'], ['jun', 'jul', 'aug'], ['jan', 'dec'], MONTH_KEYS])
+@pytest.mark.parametrize('min_temp, max_temp, rainy_days, max_safety', [
+    ('-10', '0', '10', '2'),
+    ('20', '25', '8', '4'),
+    ('-50', '50', '31', '1'),
+])
+def test_months_match_get_cities_for_months(mode, months, min_temp, max_temp, rainy_days,
+                                            max_safety):
+    '''
+    Tests that the index returns the same cities as get_cities_for_months.
+    '''
+
+    database = make_database()
+    index = CityIndex(database)
+
+    assert index.get_cities_for_months(
+        min_temp, max_temp, months, rainy_days, mode, max_safety) == get_cities_for_months(
+            min_temp, max_temp, months, rainy_days, database, mode, max_safety)
+
+
+def test_country_safety_takes_precedence():
+    '''
+    Tests that the safety values of the country safety table are used over the values copied onto
+    the city documents.
+    '''
+
+    database = make_database()
+    database[COUNTRY_SAFETY_COLLECTION].insert_many([
+        {'_id': 'Canada', 'safety': 3}, {'_id': 'Afghanistan', 'safety': 2}])
+    write_month_tables(database, bump_data_version(database))
+
+    index = CityIndex(database)
+
+    assert list(index.get_cities('20', '25', 'August', '8')) == ['Mexico', 'Afghanistan']
+    assert 'Canada' in index.get_cities('20', '25', 'August', '8', '3')
+
+
+def test_missing_data_not_returned():
+    '''
+    Tests that cities with missing temperature, rain or safety values are not returned.
+    '''
+
+    database = make_database()
+    database["cities"].insert_many([
+        {"city": "No Rain", "country": "Canada", "months": {"may": {"temperature": 11}},
+         "safety": 1},
+        {"city": "No Safety", "country": "Canada",
+         "months": {"may": {"temperature": 11, "rain": 1}}},
+    ])
+    index = CityIndex(database)
+
+    assert index.get_cities('10', '12', 'May', '8') == {
+        'Canada': [{'city': 'Toronto', 'temperature': 10, 'rain': 6.6}]
+    }
+
+
+def test_reload_on_new_data_version(clock):
+    '''
+    Tests that the index only reloads once the refresh interval has passed and the data version in
+    the database has changed.
+    '''
+
+    database = make_database()
+    index = CityIndex(database, refresh_interval=60, clock=clock)
+
+    database["cities"].update_one({"city": "Ottawa"}, {"$set": {"months.may.temperature": 11}})
+    bump_data_version(database)
+
+    # The refresh interval has not passed yet so the old data is still used
+    assert index.get_cities('10', '12', 'May', '8') == {
+        'Canada': [{'city': 'Toronto', 'temperature': 10, 'rain': 6.6}]
+    }
+
+    clock.now = 61
+
+    assert index.get_cities('10', '12', 'May', '8') == {
+        'Canada': [{'city': 'Toronto', 'temperature': 10, 'rain': 6.6},
+                   {'city': 'Ottawa', 'temperature': 11, 'rain': 2.6}]
+    }
+    assert index.version == 1
+
+
+def test_no_reload_without_new_data_version(clock):
+    '''
+    Tests that the index is not reloaded if the data version has not changed.
+    '''
+
+    index = CityIndex(make_database(), refresh_interval=60, clock=clock)
+
+    clock.now = 61
+
+    assert not index.refresh_if_stale()
+
+
+def test_refresh_ignores_refresh_interval():
+    '''
+    Tests that an explicit refresh checks the data version even if the index never refreshes
+    itself.
+    '''
+
+    database = make_database()
+    index = CityIndex(database, refresh_interval=float('inf'))
+
+    assert not index.refresh()
+
+    bump_data_version(database)
+
+    assert not index.refresh_if_stale()
+    assert index.refresh()
+    assert index.version == 1
+
+
+def test_uses_precomputed_month_tables():
+    '''
+    Tests that the index is loaded from the month tables written for the current data version.
+    '''
+
+    database = make_database()
+    version = bump_data_version(database)
+    write_month_tables(database, version)
+
+    # Changes made after the tables were written are not seen until the tables are rebuilt
+    database["cities"].update_one({"city": "Ottawa"}, {"$set": {"months.may.temperature": 11}})
+
+    index = CityIndex(database)
+
+    assert index.get_cities('10', '12', 'May', '8') == {
+        'Canada': [{'city': 'Toronto', 'temperature': 10, 'rain': 6.6}]
+    }
+
+
+def test_ignores_outdated_month_tables():
+    '''
+    Tests that the index is built from the cities collection if the month tables were written for
+    an older data version.
+    '''
+
+    database = make_database()
+    write_month_tables(database, bump_data_version(database))
+
+    database["cities"].update_one({"city": "Ottawa"}, {"$set": {"months.may.temperature": 11}})
+    bump_data_version(database)
+
+    index = CityIndex(database)
+
+    assert index.get_cities('10', '12', 'May', '8') == {
+        'Canada': [{'city': 'Toronto', 'temperature': 10, 'rain': 6.6},
+                   {'city': 'Ottawa', 'temperature': 11, 'rain': 2.6}]
+    }
+
+
+def test_ignores_month_tables_without_safety_partitions():
+    '''
+    Tests that month tables written before they were partitioned by safety are rebuilt.
+    '''
+
+    database = make_database()
+    version = bump_data_version(database)
+    write_month_tables(database, version)
+    database['month_tables'].update_many({}, {'$unset': {'safety_starts': ''}})
+
+    index = CityIndex(database)
+
+    assert index.get_cities('10', '12', 'May', '8') == {
+        'Canada': [{'city': 'Toronto', 'temperature': 10, 'rain': 6.6}]
+    }
+
+
+def test_month_tables_span_several_chunks():
+    '''
+    Tests that month tables split into several documents are put back together in order, and that
+    tables missing a chunk are rebuilt.
+    '''
+
+    database = make_database()
+    version = bump_data_version(database)
+    write_month_tables(database, version, chunk_size=1)
+
+    documents = list(database["cities"].find({}, CITY_PROJECTION))
+    expected = build_month_tables(documents, load_country_safety(database))
+
+    assert database['month_tables'].count_documents({'month': 'may'}) == len(
+        expected['may']['cities'])
+    assert load_month_tables(database, version) == expected
+
+    # Writing the tables again with bigger chunks removes the chunks that are no longer used
+    write_month_tables(database, version, chunk_size=2)
+    assert load_month_tables(database, version) == expected
+    assert database['month_tables'].count_documents({'month': 'may'}) == math.ceil(
+        len(expected['may']['cities']) / 2)
+
+    database['month_tables'].delete_one({'month': 'may', 'chunk': 1})
+    assert load_month_tables(database, version) is None
+
+
+def test_rank_pages_through_cities_best_first():
+    '''
+    Tests that ranked pages return every city of the accepted countries once, best first, and that
+    the last page has no cursor.
+    '''
+
+    index = CityIndex(make_database())
+
+    first = index.get_ranked_cities('20', '25', 'August', '8', '4', '2')
+    second = index.get_ranked_cities('20', '25', 'August', '8', '4', '2', first['cursor'])
+
+    assert [city['city'] for city in first['cities']] == ['Ottawa', 'Toronto']
+    assert [city['city'] for city in second['cities']] == ['Mexico City', 'Kabul']
+    assert second['cursor'] is None
+
+    scores = [city['score'] for city in first['cities'] + second['cities']]
+    assert scores == sorted(scores)
+
+
+def test_rank_excludes_unsafe_countries():
+    '''
+    Tests that ranked searches only return cities in countries up to the maximum safety value.
+    '''
+
+    index = CityIndex(make_database())
+
+    page = index.get_ranked_cities('20', '25', 'August', '8', limit='10')
+
+    assert {city['country'] for city in page['cities']} == {'Canada', 'Mexico'}
+    assert page['cursor'] is None
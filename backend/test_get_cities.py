@@ -5,7 +5,7 @@ Test cases for the get_cities function
 import pytest
 import mongomock
 
-from get_cities import get_cities
+from get_cities import get_cities, get_cities_for_months, parse_mode, parse_months
 
 
 database = mongomock.MongoClient().db
@@ -225,3 +225,107 @@ def test_multiple_countries_valid():
                    {'city': 'Ottawa', 'temperature': 23, 'rain': 6.56}],
         'Mexico': [{'city': 'Mexico City', 'temperature': 25, 'rain': 1.6}]
         }
+
+
+def test_max_safety_includes_less_safe_countries():
+    '''
+    Tests that cities in countries with a higher safety value are returned when the maximum safety
+    value allows them, and that a lower maximum excludes them.
+    '''
+
+    cities = get_cities('20', '25', 'August', '8', database, '4')
+
+    assert cities == {
+        'Canada': [{'city': 'Toronto', 'temperature': 20.1, 'rain': 2.3},
+                   {'city': 'Ottawa', 'temperature': 23, 'rain': 6.56}],
+        'Mexico': [{'city': 'Mexico City', 'temperature': 25, 'rain': 1.6}],
+        'Afghanistan': [{'city': 'Kabul', 'temperature': 25, 'rain': 1}]
+        }
+
+    assert list(get_cities('20', '25', 'August', '8', database, '1')) == ['Canada']
+
+
+def test_invalid_max_safety():
+    '''
+    Tests that a ValueError is thrown if the maximum safety value is not a safety level.
+    '''
+
+    with pytest.raises(ValueError):
+        get_cities('20', '25', 'August', '8', database, '5')
+
+    with pytest.raises(ValueError):
+        get_cities('20', '25', 'August', '8', database, 'safe')
+
+
+def test_parse_months_by_name():
+    '''
+    Tests that months given by name are returned as month keys in calendar order.
+    '''
+
+    assert parse_months('August, June,June') == ['jun', 'aug']
+
+    with pytest.raises(ValueError):
+        parse_months('June,july')
+
+
+def test_parse_months_by_date_range():
+    '''
+    Tests that a date range selects every month it spans, including across the end of a year.
+    '''
+
+    assert parse_months(start_date='2024-06-20', end_date='2024-06-30') == ['jun']
+    assert parse_months(start_date='2024-12-20', end_date='2025-02-01') == ['jan', 'feb', 'dec']
+    assert len(parse_months(start_date='2024-03-01', end_date='2025-03-01')) == 12
+
+    with pytest.raises(ValueError):
+        parse_months(start_date='2024-07-01', end_date='2024-06-01')
+
+    with pytest.raises(ValueError):
+        parse_months(start_date='2024-07-01')
+
+
+def test_parse_mode():
+    '''
+    Tests that the match mode defaults to all and only accepts all or any.
+    '''
+
+    assert parse_mode(None) == 'all'
+    assert parse_mode('any') == 'any'
+
+    with pytest.raises(ValueError):
+        parse_mode('some')
+
+
+def test_all_months_must_match():
+    '''
+    Tests that in the all mode cities are only returned if they match in every month, along with
+    the data of every month.
+    '''
+
+    assert not get_cities_for_months('20', '25', ['jun', 'aug'], '8', database)
+
+    cities = get_cities_for_months('20', '25', ['jul', 'aug'], '8', database, 'all')
+
+    assert cities['Canada'] == [
+        {'city': 'Toronto', 'months': {'jul': {'temperature': 22.6, 'rain': 3.1},
+                                       'aug': {'temperature': 20.1, 'rain': 2.3}}},
+        {'city': 'Ottawa', 'months': {'jul': {'temperature': 22.6, 'rain': 4.54},
+                                      'aug': {'temperature': 23, 'rain': 6.56}}},
+    ]
+    assert list(cities) == ['Canada', 'Mexico']
+
+
+def test_any_month_can_match():
+    '''
+    Tests that in the any mode cities are returned if they match in one month, with only the data
+    of the months they match in.
+    '''
+
+    cities = get_cities_for_months('20', '25', ['jun', 'aug'], '8', database, 'any', '4')
+
+    assert cities == {
+        'Canada': [{'city': 'Toronto', 'months': {'aug': {'temperature': 20.1, 'rain': 2.3}}},
+                   {'city': 'Ottawa', 'months': {'aug': {'temperature': 23, 'rain': 6.56}}}],
+        'Mexico': [{'city': 'Mexico City', 'months': {'aug': {'temperature': 25, 'rain': 1.6}}}],
+        'Afghanistan': [{'city': 'Kabul', 'months': {'aug': {'temperature': 25, 'rain': 1}}}]
+        }
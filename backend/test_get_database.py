@@ -0,0 +1,68 @@
+'''
+Test cases for the shared MongoClient in get_database
+'''
+
+import pytest
+
+import get_database
+
+
+@pytest.fixture(autouse=True)
+def environment(monkeypatch):
+    '''
+    Points the client at a local server and closes it after each test.
+    '''
+
+    monkeypatch.setenv('MONGODB_URI', 'mongodb://localhost:27017')
+    monkeypatch.setenv('MONGODB_DB', 'vacation_finder_test')
+    yield
+    get_database.close_client()
+
+
+def test_client_is_shared():
+    '''
+    Tests that the same client is returned on every call.
+    '''
+
+    assert get_database.get_client() is get_database.get_client()
+    assert get_database.get_database().client is get_database.get_client()
+
+
+def test_close_client():
+    '''
+    Tests that a new client is created after the shared client is closed.
+    '''
+
+    client = get_database.get_client()
+    get_database.close_client()
+
+    assert get_database.get_client() is not client
+
+
+def test_pool_options(monkeypatch):
+    '''
+    Tests that the pool options set in the environment are passed to the client.
+    '''
+
+    monkeypatch.setenv('MONGODB_MAX_POOL_SIZE', '25')
+    monkeypatch.setenv('MONGODB_SERVER_SELECTION_TIMEOUT_MS', '500')
+
+    client = get_database.get_client()
+
+    assert client.options.pool_options.max_pool_size == 25
+    assert get_database.get_pool_stats()['options'] == {
+        'maxPoolSize': 25,
+        'serverSelectionTimeoutMS': 500
+    }
+
+
+def test_missing_uri(monkeypatch):
+    '''
+    Tests that a NameError is thrown if MONGODB_URI is not defined.
+    '''
+
+    monkeypatch.setattr(get_database, 'load_dotenv', lambda: None)
+    monkeypatch.delenv('MONGODB_URI')
+
+    with pytest.raises(NameError):
+        get_database.get_client()
@@ -0,0 +1,62 @@
+'''
+Test cases for the index management of the cities collection
+'''
+
+import mongomock
+
+from indexes import ensure_indexes, explain_get_cities, get_city_indexes
+
+
+def test_creates_indexes_once():
+    '''
+    Tests that all indexes are created on the first call and left alone on the next one.
+    '''
+
+    collection = mongomock.MongoClient().db["cities"]
+
+    report = ensure_indexes(collection)
+
+    assert len(report) == 13
+    assert set(report.values()) == {'created'}
+    assert set(ensure_indexes(collection).values()) == {'exists'}
+
+    information = collection.index_information()
+    assert information['city_country_unique']['unique']
+    assert information['months_jun_safety_temperature_rain']['key'] == [
+        ('safety', 1), ('months.jun.temperature', 1), ('months.jun.rain', 1)]
+
+
+def test_recreates_changed_index():
+    '''
+    Tests that an index with the expected name but a different definition is recreated.
+    '''
+
+    collection = mongomock.MongoClient().db["cities"]
+    collection.create_index([("city", 1)], name='city_country_unique')
+
+    report = ensure_indexes(collection)
+
+    assert report['city_country_unique'] == 'recreated'
+    assert collection.index_information()['city_country_unique']['key'] == [
+        ('city', 1), ('country', 1)]
+
+
+def test_every_month_indexed():
+    '''
+    Tests that there is one compound index for each month plus the unique city index.
+    '''
+
+    names = [name for name, _, _ in get_city_indexes()]
+
+    assert len(set(names)) == 13
+    assert 'months_dec_safety_temperature_rain' in names
+
+
+def test_explain_unsupported():
+    '''
+    Tests that the query plan report does not fail on servers that cannot explain queries.
+    '''
+
+    database = mongomock.MongoClient().db
+
+    assert explain_get_cities(database, 'jan') == {'uses_index': None, 'index_name': None}
@@ -0,0 +1,114 @@
+'''
+Test cases for ranking cities
+'''
+
+import numpy as np
+import pytest
+
+from ranking import (MAX_LIMIT, decode_cursor, encode_cursor, parse_limit, score_cities,
+                     select_top_k)
+
+
+def full_sort(scores, positions):
+    '''
+    Returns the indices of the scores sorted by score and then by position.
+    '''
+
+    return sorted(range(len(scores)), key=lambda index: (scores[index], positions[index]))
+
+
+def test_score_prefers_target_temperature_dry_and_safe():
+    '''
+    Tests that cities score better the closer they are to the middle of the temperature range, the
+    fewer rainy days they have and the safer their country is.
+    '''
+
+    scores = score_cities(np.array([25.0, 21.0, 25.0, 25.0]), np.array([0.0, 0.0, 5.0, 0.0]),
+                          np.array([1.0, 1.0, 1.0, 3.0]), 20, 30, 10)
+
+    assert scores[0] == 0
+    assert scores[1] == pytest.approx(0.8)
+    assert scores[2] == pytest.approx(0.5)
+    assert scores[3] == pytest.approx(1.0)
+
+
+def test_score_open_ended_range():
+    '''
+    Tests that every temperature in a range open on one side fits equally well, and that an
+    infinite number of rainy days does not count rain against any city.
+    '''
+
+    scores = score_cities(np.array([21.0, 35.0]), np.array([0.0, 5.0]), np.array([1.0, 1.0]),
+                          20, np.inf, np.inf)
+
+    np.testing.assert_array_equal(scores, [0.0, 0.0])
+
+
+@pytest.mark.parametrize('limit', [1, 3, 7, 50])
+def test_select_top_k_matches_full_sort(limit):
+    '''
+    Tests that the partial sort returns the same cities as a full sort, including ties.
+    '''
+
+    rng = np.random.default_rng(0)
+    scores = rng.integers(0, 5, 40).astype(float)
+    positions = rng.permutation(40)
+
+    expected = full_sort(scores, positions)[:limit]
+
+    assert list(select_top_k(scores, positions, limit)) == expected
+
+
+def test_pages_cover_every_city_once():
+    '''
+    Tests that following the cursor of each page returns every city exactly once, in order.
+    '''
+
+    rng = np.random.default_rng(1)
+    scores = rng.integers(0, 3, 25).astype(float)
+    positions = np.arange(25)
+
+    seen, after = [], None
+    while True:
+        page = list(select_top_k(scores, positions, 4, after))
+        if not page:
+            break
+        seen.extend(page)
+        after = decode_cursor(encode_cursor(3, scores[page[-1]], positions[page[-1]]), 3)
+
+    assert seen == full_sort(scores, positions)
+
+
+def test_cursor_round_trip():
+    '''
+    Tests that a cursor decodes to the exact score and position it was made from, and that cursors
+    that were not made by encode_cursor are rejected.
+    '''
+
+    assert decode_cursor(encode_cursor(3, 0.1 + 0.2, 7), 3) == (0.1 + 0.2, 7)
+    assert decode_cursor(None, 3) is None
+
+    with pytest.raises(ValueError, match='Invalid cursor'):
+        decode_cursor('not a cursor', 3)
+
+
+def test_cursor_of_another_data_version_is_rejected():
+    '''
+    Tests that a cursor returned before the data was updated is rejected.
+    '''
+
+    with pytest.raises(ValueError, match='first page'):
+        decode_cursor(encode_cursor(3, 0.5, 7), 4)
+
+
+def test_parse_limit():
+    '''
+    Tests that the limit defaults when missing and must be between 1 and the maximum.
+    '''
+
+    assert parse_limit(None) == 20
+    assert parse_limit('5') == 5
+
+    for limit in ['0', str(MAX_LIMIT + 1), 'ten']:
+        with pytest.raises(ValueError):
+            parse_limit(limit)
@@ -0,0 +1,124 @@
+'''
+Test cases for the response cache and query normalization
+'''
+
+import math
+
+import pytest
+
+from response_cache import ResponseCache, normalize_conditions, normalize_query
+
+
+def test_normalize_equivalent_queries():
+    '''
+    Tests that queries that only differ in formatting or below the stored precision share a key.
+    '''
+
+    assert normalize_query('20', '30', 'June', '5') == (20.0, 30.0, 'jun', 5.0)
+    assert normalize_query('20.0', '30.00', 'June', '5.0') == (20.0, 30.0, 'jun', 5.0)
+    assert normalize_query('19.95', '30.04', 'June', '5.009') == (20.0, 30.0, 'jun', 5.0)
+
+
+def test_normalize_conditions():
+    '''
+    Tests that the conditions of multi-month queries are rounded like single month queries.
+    '''
+
+    assert normalize_conditions('19.95', '30.04', '5.009') == (20.0, 30.0, 5.0)
+
+
+def test_normalize_keeps_stored_values():
+    '''
+    Tests that values already at the stored precision are not changed by rounding.
+    '''
+
+    assert normalize_query('20.1', '22.9', 'August', '6.56') == (20.1, 22.9, 'aug', 6.56)
+    assert normalize_query('-5.2', '-0.1', 'January', '0.01') == (-5.2, -0.1, 'jan', 0.01)
+
+
+def test_normalize_invalid_query():
+    '''
+    Tests that invalid queries raise a ValueError.
+    '''
+
+    with pytest.raises(ValueError):
+        normalize_query('1', '0', 'June', '5')
+
+    with pytest.raises(ValueError):
+        normalize_query('1', '5', 'june', '5')
+
+
+def test_normalize_infinite_and_nan_values():
+    '''
+    Tests that infinite values are kept as they are and that NaN is rejected with a ValueError.
+    '''
+
+    assert normalize_query('-inf', '1e400', 'June', 'inf') == (
+        -math.inf, math.inf, 'jun', math.inf)
+    assert normalize_conditions('20', 'inf', '5') == (20.0, math.inf, 5.0)
+
+    for args in [('nan', '30', '5'), ('20', 'nan', '5'), ('20', '30', 'nan')]:
+        with pytest.raises(ValueError, match='Please provide'):
+            normalize_conditions(*args)
+
+
+def test_hit_does_not_recompute():
+    '''
+    Tests that a cached value is returned without computing it again.
+    '''
+
+    cache = ResponseCache()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return {'Canada': []}
+
+    assert cache.get_or_compute('key', 1, compute) == {'Canada': []}
+    assert cache.get_or_compute('key', 1, compute) == {'Canada': []}
+    assert len(calls) == 1
+
+
+def test_lru_eviction():
+    '''
+    Tests that the least recently used entry is evicted when the cache is full.
+    '''
+
+    cache = ResponseCache(max_size=2)
+
+    cache.get_or_compute('a', 1, lambda: 'a')
+    cache.get_or_compute('b', 1, lambda: 'b')
+    cache.get_or_compute('a', 1, lambda: 'new a')
+    cache.get_or_compute('c', 1, lambda: 'c')
+
+    assert len(cache) == 2
+    assert cache.get_or_compute('a', 1, lambda: 'new a') == 'a'
+    assert cache.get_or_compute('b', 1, lambda: 'new b') == 'new b'
+
+
+def test_ttl_expiry(clock):
+    '''
+    Tests that an entry is computed again once it has expired.
+    '''
+
+    cache = ResponseCache(ttl=10, clock=clock)
+
+    cache.get_or_compute('key', 1, lambda: 'old')
+    clock.now = 9
+    assert cache.get_or_compute('key', 1, lambda: 'new') == 'old'
+    clock.now = 11
+    assert cache.get_or_compute('key', 1, lambda: 'new') == 'new'
+
+
+def test_new_version_clears_cache():
+    '''
+    Tests that all entries are dropped when the data version changes.
+    '''
+
+    cache = ResponseCache()
+
+    cache.get_or_compute('a', 1, lambda: 'a')
+    cache.get_or_compute('b', 1, lambda: 'b')
+
+    assert cache.get_or_compute('a', 2, lambda: 'new a') == 'new a'
+    assert len(cache) == 1
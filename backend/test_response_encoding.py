@@ -0,0 +1,91 @@
+'''
+Test cases for encoding the responses of the /cities endpoints
+'''
+
+import gzip
+import json
+
+import pytest
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_accept_header
+
+from response_encoding import (COLUMNAR_MIMETYPE, MIN_COMPRESS_SIZE, choose_encoding,
+                               choose_shape, columnar_cities, encode_body, make_etag)
+
+
+def test_columnar_cities():
+    '''
+    Tests that the cities of each country are converted to parallel lists.
+    '''
+
+    assert columnar_cities({
+        'Canada': [{'city': 'Toronto', 'temperature': 20.1, 'rain': 2.3},
+                   {'city': 'Ottawa', 'temperature': 23, 'rain': 6.56}],
+    }) == {
+        'Canada': {'city': ['Toronto', 'Ottawa'], 'temperature': [20.1, 23],
+                   'rain': [2.3, 6.56]},
+    }
+
+
+def test_choose_shape():
+    '''
+    Tests that the columnar shape is used when the client prefers it or asks for it with the format
+    parameter, and that plain JSON is the default.
+    '''
+
+    def accept(header):
+        return parse_accept_header(header, MIMEAccept)
+
+    assert choose_shape(accept('*/*')) == 'rows'
+    assert choose_shape(accept('application/json')) == 'rows'
+    assert choose_shape(accept(COLUMNAR_MIMETYPE + ', application/json;q=0.5')) == 'columnar'
+    assert choose_shape(accept('application/json'), 'columnar') == 'columnar'
+
+    with pytest.raises(ValueError):
+        choose_shape(accept('*/*'), 'xml')
+
+
+def test_choose_encoding():
+    '''
+    Tests that gzip is used when the client accepts it and identity otherwise.
+    '''
+
+    assert choose_encoding(parse_accept_header('gzip, deflate')) == 'gzip'
+    assert choose_encoding(parse_accept_header('deflate')) == 'identity'
+    assert choose_encoding(parse_accept_header('')) == 'identity'
+
+
+def test_etag_depends_on_everything_that_changes_the_body():
+    '''
+    Tests that the entity tag changes with the data version, query, shape and coding.
+    '''
+
+    etag = make_etag(1, (20.0, 30.0, 'jun', 5.0, 2), 'rows', 'gzip')
+
+    assert etag == make_etag(1, (20.0, 30.0, 'jun', 5.0, 2), 'rows', 'gzip')
+    assert len({etag,
+                make_etag(2, (20.0, 30.0, 'jun', 5.0, 2), 'rows', 'gzip'),
+                make_etag(1, (20.0, 30.0, 'jul', 5.0, 2), 'rows', 'gzip'),
+                make_etag(1, (20.0, 30.0, 'jun', 5.0, 2), 'columnar', 'gzip'),
+                make_etag(1, (20.0, 30.0, 'jun', 5.0, 2), 'rows', 'identity')}) == 5
+
+
+def test_encode_body():
+    '''
+    Tests that large bodies are compressed deterministically and small bodies are sent as is.
+    '''
+
+    payload = {'Canada': [{'city': f'City {i}', 'temperature': 20.0, 'rain': 1.5}
+                          for i in range(50)]}
+
+    body, coding = encode_body(payload, 'gzip')
+
+    assert coding == 'gzip'
+    assert json.loads(gzip.decompress(body)) == payload
+    assert encode_body(payload, 'gzip')[0] == body
+
+    small, coding = encode_body({'Canada': []}, 'gzip')
+
+    assert coding == 'identity'
+    assert len(small) < MIN_COMPRESS_SIZE
+    assert json.loads(small) == {'Canada': []}